@@ -5,33 +5,87 @@ This module provides the application factory pattern for creating Flask app inst
 Routes are organized in separate blueprint modules in the routes package.
 """
 
+import argparse
+import os
+from typing import Dict, Optional
 from flask import Flask
-from .database import init_database, add_sample_data
+from jinja2 import FileSystemBytecodeCache
+from .config import load_config
+from .database import init_database, add_sample_data, init_app as init_db_app, configure as configure_db
 from .routes import register_blueprints
+from .instrumentation import init_app as init_instrumentation
+from .commands import register_commands
+from .models import RecordJSONProvider
 
 
-def create_app():
+def create_app(profile: Optional[str] = None, config: Optional[Dict] = None):
     """
     Application factory function to create and configure Flask app.
     
+    Args:
+        profile: Storage profile (development, test, production); defaults
+            to $LIBRARY_PROFILE or development
+        config: Extra app config; storage keys (DATABASE, JOURNAL_MODE, ...)
+            override the profile and LIBRARY_* environment variables
+    
     Returns:
         Flask: Configured Flask application instance
     """
     app = Flask(__name__)
     app.secret_key = "super secret key"
+    # Book/Loan records from the database serialize like the dicts they replace
+    app.json = RecordJSONProvider(app)
+    app.config.update(config or {})
+    app.config.update(load_config(profile, config))
+    
+    # Initialize the database and bind pooled connections to requests
+    configure_db(app.config)
+    init_database(migrate=app.config['MIGRATE_ON_START'])
+    init_db_app(app)
     
-    # Initialize the database
-    init_database()
+    # Add sample data for testing and demonstration (opt-in: SAMPLE_DATA)
+    if app.config['SAMPLE_DATA']:
+        add_sample_data()
     
-    # Add sample data for testing and demonstration
-    add_sample_data()
+    # Reuse compiled templates across processes instead of compiling on first render
+    if app.config['TEMPLATE_CACHE_DIR']:
+        os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_DIR'])
+    
+    # Time requests and SQL statements for /metrics
+    init_instrumentation(app)
     
     # Register all route blueprints
     register_blueprints(app)
     
+    # Register CLI commands
+    register_commands(app)
+    
     return app
 
 
+def main(argv=None):
+    """Run the web server: Flask's development server or, with SERVER=gunicorn, a pre-fork master."""
+    parser = argparse.ArgumentParser(description='Run the Library Management System web server.')
+    parser.add_argument('--profile', help='Storage profile (default: $LIBRARY_PROFILE or development)')
+    parser.add_argument('--server', choices=('development', 'gunicorn'),
+                        help='Server to run (default: SERVER from the profile / $LIBRARY_SERVER)')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, help='gunicorn worker processes; 0 = one per CPU')
+    parser.add_argument('--threads', type=int, help='Request threads per gunicorn worker')
+    args = parser.parse_args(argv)
+    overrides = {key: value for key, value in
+                 (('SERVER', args.server), ('WORKERS', args.workers), ('THREADS', args.threads))
+                 if value is not None}
+
+    app = create_app(args.profile, overrides)
+    if app.config['SERVER'] == 'gunicorn':
+        from .server import serve
+        serve(app, f'{args.host}:{args.port}')
+    else:
+        app.run(debug=True, host=args.host, port=args.port)
+
+
 if __name__ == '__main__':
-    app = create_app()
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    main()
@@ -0,0 +1,122 @@
+"""
+Cache module for Library Management System
+Bounded, thread-safe in-process caches for hot database rows and results
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+# Sentinel returned by LRUCache.get() on a miss (None is a valid cached value)
+MISSING = object()
+
+
+class LRUCache:
+    """
+    A bounded least-recently-used cache with hit/miss counters.
+
+    Every invalidation bumps a generation number. A reader that takes the
+    generation before loading a value and stores it with set_if_current()
+    can never re-insert a row that was invalidated while it was loading.
+    """
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key: Hashable) -> Any:
+        """Get a cached value (marking it recently used) or MISSING."""
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self._stats['misses'] += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entry when full."""
+        with self._lock:
+            self._store(key, value)
+
+    def set_if_current(self, key: Hashable, value: Any, generation: int) -> bool:
+        """Store a value only if nothing was invalidated since generation was read."""
+        with self._lock:
+            if generation != self._generation:
+                return False
+            self._store(key, value)
+            return True
+
+    def _store(self, key: Hashable, value: Any):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def invalidate(self, key: Hashable):
+        """Drop one entry."""
+        with self._lock:
+            self._generation += 1
+            self._stats['invalidations'] += 1
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def stats(self) -> Dict:
+        """Return a snapshot of the cache counters."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._data)
+        stats['max_size'] = self.max_size
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+class TTLCache(LRUCache):
+    """
+    An LRUCache whose entries also expire ttl seconds after they are stored.
+
+    Expired entries count as misses and are dropped when next looked up
+    (or evicted by size like any other entry).
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 300.0,
+                 clock: Callable[[], float] = time.monotonic):
+        super().__init__(max_size)
+        self.ttl = ttl
+        self._clock = clock
+        self._stats['expirations'] = 0
+
+    def get(self, key: Hashable) -> Any:
+        """Get a live cached value (marking it recently used) or MISSING."""
+        with self._lock:
+            entry = self._data.get(key, MISSING)
+            if entry is not MISSING and entry[0] <= self._clock():
+                del self._data[key]
+                self._stats['expirations'] += 1
+                entry = MISSING
+            if entry is MISSING:
+                self._stats['misses'] += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[1]
+
+    def _store(self, key: Hashable, value: Any):
+        super()._store(key, (self._clock() + self.ttl, value))
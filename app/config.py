@@ -0,0 +1,142 @@
+"""
+Configuration for Library Management System
+Named profiles (development, test, production) for the database path,
+connection pools, read snapshot, SQLite PRAGMAs, startup work and server,
+overridable by environment variables and app config.
+"""
+
+import os
+from typing import Dict, Optional
+
+# Settings every profile defines
+DEFAULTS = {
+    'DATABASE': 'library.db',     # Relative paths resolve against the working directory
+    'POOL_SIZE': 8,
+    'POOL_TIMEOUT': 5.0,
+    'JOURNAL_MODE': 'wal',        # Readers no longer block on (or block) a writer
+    'SYNCHRONOUS': 'normal',      # With WAL: durable across app crashes, fsync at checkpoints
+    'MMAP_SIZE': 0,               # Bytes of the file read through memory mapping
+    'CACHE_SIZE': -16000,         # Page cache per connection; negative = KiB
+    'BUSY_TIMEOUT_MS': 5000,      # Wait this long for a lock before SQLITE_BUSY
+    'TEMP_STORE': 'memory',       # Sorts and temp indexes stay off disk
+    'READ_POOL_SIZE': 8,          # Read-only connections for catalog, search and reports
+    'SNAPSHOT_INTERVAL': 0.0,     # Seconds between snapshot refreshes; 0 reads the live file
+    'SNAPSHOT_PATH': '',          # Snapshot file; empty means "<DATABASE>.snapshot"
+    'MIGRATE_ON_START': True,     # Apply pending migrations at startup; off = version check only
+    'SAMPLE_DATA': False,         # Seed the demo books into an empty database at startup
+    'TEMPLATE_CACHE_DIR': '',     # Compiled templates shared across processes; empty = in memory
+    'SERVER': 'development',      # `python -m app` server: Flask's dev server or a gunicorn pre-fork master
+    'WORKERS': 0,                 # gunicorn worker processes; 0 = one per CPU
+    'THREADS': 4,                 # Request threads per worker
+    'GRACEFUL_TIMEOUT': 30.0,     # Seconds a worker may finish in-flight requests on reload/shutdown
+    'MAX_REQUESTS': 0,            # Recycle a worker after this many requests; 0 = never
+}
+
+PROFILES: Dict[str, Dict] = {
+    'development': {
+        'SAMPLE_DATA': True,
+    },
+    'test': {
+        'SYNCHRONOUS': 'off',
+        'BUSY_TIMEOUT_MS': 2000,
+    },
+    'production': {
+        'POOL_SIZE': 16,
+        'READ_POOL_SIZE': 16,
+        'MMAP_SIZE': 268435456,   # 256 MiB
+        'CACHE_SIZE': -65536,     # 64 MiB
+        'MIGRATE_ON_START': False, # Deploys run `python -m app.migrations` once instead of every worker
+        'SERVER': 'gunicorn',
+    },
+}
+
+DEFAULT_PROFILE = 'development'
+
+# Environment variable for each setting; LIBRARY_PROFILE picks the profile
+ENV_VARS = {
+    'DATABASE': 'LIBRARY_DB_PATH',
+    'POOL_SIZE': 'LIBRARY_POOL_SIZE',
+    'POOL_TIMEOUT': 'LIBRARY_POOL_TIMEOUT',
+    'JOURNAL_MODE': 'LIBRARY_JOURNAL_MODE',
+    'SYNCHRONOUS': 'LIBRARY_SYNCHRONOUS',
+    'MMAP_SIZE': 'LIBRARY_MMAP_SIZE',
+    'CACHE_SIZE': 'LIBRARY_CACHE_SIZE',
+    'BUSY_TIMEOUT_MS': 'LIBRARY_BUSY_TIMEOUT_MS',
+    'TEMP_STORE': 'LIBRARY_TEMP_STORE',
+    'READ_POOL_SIZE': 'LIBRARY_READ_POOL_SIZE',
+    'SNAPSHOT_INTERVAL': 'LIBRARY_SNAPSHOT_INTERVAL',
+    'SNAPSHOT_PATH': 'LIBRARY_SNAPSHOT_PATH',
+    'MIGRATE_ON_START': 'LIBRARY_MIGRATE_ON_START',
+    'SAMPLE_DATA': 'LIBRARY_SAMPLE_DATA',
+    'TEMPLATE_CACHE_DIR': 'LIBRARY_TEMPLATE_CACHE_DIR',
+    'SERVER': 'LIBRARY_SERVER',
+    'WORKERS': 'LIBRARY_WORKERS',
+    'THREADS': 'LIBRARY_THREADS',
+    'GRACEFUL_TIMEOUT': 'LIBRARY_GRACEFUL_TIMEOUT',
+    'MAX_REQUESTS': 'LIBRARY_MAX_REQUESTS',
+}
+
+_CHOICES = {
+    'JOURNAL_MODE': {'delete', 'truncate', 'persist', 'memory', 'wal', 'off'},
+    'SYNCHRONOUS': {'off', 'normal', 'full', 'extra'},
+    'TEMP_STORE': {'default', 'file', 'memory'},
+    'SERVER': {'development', 'gunicorn'},
+}
+
+_FLAGS = {'true': True, '1': True, 'yes': True, 'on': True,
+          'false': False, '0': False, 'no': False, 'off': False}
+
+def _coerce(key: str, value):
+    # Normalizes a setting from a profile, app config or environment string.
+    if key in ('DATABASE', 'SNAPSHOT_PATH', 'TEMPLATE_CACHE_DIR'):
+        return str(value)
+    if isinstance(DEFAULTS[key], bool):
+        flag = _FLAGS.get(str(value).strip().lower())
+        if flag is None:
+            raise ValueError(f"{key} must be true or false, got {value!r}")
+        return flag
+    if key in _CHOICES:
+        value = str(value).strip().lower()
+        if value not in _CHOICES[key]:
+            raise ValueError(f"{key} must be one of {sorted(_CHOICES[key])}, got {value!r}")
+        return value
+    try:
+        return float(value) if isinstance(DEFAULTS[key], float) else int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} must be a number, got {value!r}")
+
+def load_config(profile: Optional[str] = None, overrides: Optional[Dict] = None,
+                environ: Optional[Dict[str, str]] = None) -> Dict:
+    """
+    Build the storage settings for a profile.
+
+    Precedence, lowest first: DEFAULTS, the profile, LIBRARY_* environment
+    variables, then overrides (e.g. app config). The profile is the
+    argument, else LIBRARY_PROFILE, else development. Raises ValueError for
+    an unknown profile or an invalid value.
+    """
+    environ = os.environ if environ is None else environ
+    name = profile or environ.get('LIBRARY_PROFILE') or DEFAULT_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"Unknown profile {name!r} (expected one of {sorted(PROFILES)})")
+    settings = dict(DEFAULTS, **PROFILES[name])
+    for key, var in ENV_VARS.items():
+        if environ.get(var):
+            settings[key] = environ[var]
+    for key, value in (overrides or {}).items():
+        if key in DEFAULTS:
+            settings[key] = value
+    settings = {key: _coerce(key, value) for key, value in settings.items()}
+    settings['PROFILE'] = name
+    return settings
+
+def connection_pragmas(settings: Dict) -> Dict[str, object]:
+    """The PRAGMAs to run on each new connection, in order."""
+    return {
+        'busy_timeout': settings['BUSY_TIMEOUT_MS'],
+        'journal_mode': settings['JOURNAL_MODE'],
+        'synchronous': settings['SYNCHRONOUS'],
+        'mmap_size': settings['MMAP_SIZE'],
+        'cache_size': settings['CACHE_SIZE'],
+        'temp_store': settings['TEMP_STORE'],
+    }
@@ -3,200 +3,1269 @@ Database module for Library Management System
 Handles all database operations and connections
 """
 
+import calendar
+import logging
+import os
+import queue
 import sqlite3
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+import threading
+import time
+import urllib.parse
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
 
-# Database configuration
-DATABASE = 'library.db'
+from flask import current_app, g, has_app_context
+
+from .cache import LRUCache, MISSING
+from .config import DEFAULTS, connection_pragmas
+from .instrumentation import InstrumentedConnection, record_connection_checkout, record_connection_opened
+from .migrations import (LATEST_VERSION, apply_migrations, get_schema_version, ACTIVE_LOAN_COUNT_SQL,
+                         PATRON_LOANS_SQL, RETURN_LOAN_SQL, PATRON_HISTORY_SQL, PATRON_HISTORY_BEFORE_SQL,
+                         OVERDUE_LOANS_SQL, PATRON_OVERDUE_LOANS_SQL)
+from .models import Book, BorrowRecord, Loan
+
+# Database configuration (see configure() and app/config.py)
+DATABASE = DEFAULTS['DATABASE']
+
+# Connection pool configuration
+POOL_SIZE = DEFAULTS['POOL_SIZE']         # Maximum open connections per database file
+POOL_TIMEOUT = DEFAULTS['POOL_TIMEOUT']   # Seconds to wait for a free connection before giving up
+
+# Read-only pool configuration: reads go to the live file, or to a snapshot
+# copy refreshed every SNAPSHOT_INTERVAL seconds when that is > 0
+READ_POOL_SIZE = DEFAULTS['READ_POOL_SIZE']
+SNAPSHOT_INTERVAL = DEFAULTS['SNAPSHOT_INTERVAL']
+SNAPSHOT_PATH = DEFAULTS['SNAPSHOT_PATH']   # Empty: "<DATABASE>.snapshot"
+
+# Schema check on a file's first connection: migrate it, or refuse it when off
+MIGRATE_ON_START = DEFAULTS['MIGRATE_ON_START']
+
+logger = logging.getLogger(__name__)
+
+# PRAGMAs applied once to every new pooled connection
+_connection_pragmas: Dict[str, object] = connection_pragmas(DEFAULTS)
+
+_EXTENSION_KEY = 'library_db'
+
+# Book row cache configuration
+BOOK_CACHE_SIZE = 4096  # Maximum cached book rows per process
+
+# Streaming export configuration
+EXPORT_CHUNK_SIZE = 1000  # Rows fetched per query when streaming a table out
+
+
+class PoolTimeoutError(sqlite3.OperationalError):
+    """Raised when no pooled connection becomes free within the pool timeout."""
+
+
+class ConnectionPool:
+    """
+    A bounded, thread-safe pool of reusable SQLite connections for one database file.
+
+    A read_only pool opens file:...?mode=ro URIs with PRAGMA query_only, so
+    its connections can never take the write lock; immutable=True is for
+    snapshot files that are replaced, never modified, and skips locking.
+    """
+
+    def __init__(self, database: str, max_size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT,
+                 read_only: bool = False, immutable: bool = False):
+        self.database = database
+        self.max_size = max_size
+        self.timeout = timeout
+        self.read_only = read_only
+        self.immutable = immutable
+        # LIFO so the most recently used (warmest) connection is handed out first
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._size = 0
+        self._stats = {'created': 0, 'acquired': 0, 'released': 0,
+                       'waits': 0, 'timeouts': 0, 'discarded': 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        # Instrumented connections time every statement for /metrics
+        if self.read_only:
+            uri = f"file:{urllib.parse.quote(os.path.abspath(self.database))}?mode=ro"
+            if self.immutable:
+                uri += '&immutable=1'
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False, factory=InstrumentedConnection)
+        else:
+            conn = sqlite3.connect(self.database, check_same_thread=False, factory=InstrumentedConnection)
+        conn.row_factory = sqlite3.Row  # This enables column access by name
+        # Setup statements bypass the instrumentation so that a pool opening
+        # lazily inside a request does not count them as that request's queries
+        setup = sqlite3.Connection.execute
+        for name, value in _connection_pragmas.items():
+            if self.read_only and name == 'journal_mode':
+                continue  # Set by the writers; a read-only connection cannot change it
+            setup(conn, f'PRAGMA {name} = {value}')
+        if self.read_only:
+            setup(conn, 'PRAGMA query_only = 1')
+        record_connection_opened()
+        return conn
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def acquire(self) -> sqlite3.Connection:
+        """Check a connection out of the pool, opening a new one while below max_size."""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._size < self.max_size
+                if can_create:
+                    self._size += 1
+            if can_create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._size -= 1
+                    raise
+                self._count('created')
+            else:
+                self._count('waits')
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    self._count('timeouts')
+                    raise PoolTimeoutError(
+                        f"No database connection available after {self.timeout}s "
+                        f"(pool size {self.max_size})."
+                    )
+        self._count('acquired')
+        record_connection_checkout()
+        return conn
+
+    def release(self, conn: sqlite3.Connection):
+        """Return a connection to the pool, discarding any uncommitted work."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = sqlite3.Row
+        except sqlite3.Error:
+            # Broken or closed connection: drop it and free its slot
+            with self._lock:
+                self._size -= 1
+                self._stats['discarded'] += 1
+            return
+        self._count('released')
+        self._idle.put(conn)
+
+    def close_all(self):
+        """Close every idle connection (checked-out connections are closed on release)."""
+        closed = 0
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            closed += 1
+        with self._lock:
+            self._size -= closed
+
+    def stats(self) -> Dict:
+        """Return a snapshot of pool usage counters."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = self._size
+        stats['idle'] = self._idle.qsize()
+        stats['in_use'] = stats['size'] - stats['idle']
+        stats['max_size'] = self.max_size
+        stats['database'] = self.database
+        stats['read_only'] = self.read_only
+        return stats
+
+
+class PooledConnection:
+    """
+    Connection handed out by get_db_connection().
+
+    Behaves like a sqlite3.Connection, but close() hands the underlying
+    connection back to its pool instead of closing it. Request-bound
+    connections stay checked out until the Flask app context is torn down.
+    """
+
+    __slots__ = ('_conn', '_pool')
+
+    def __init__(self, conn: sqlite3.Connection, pool: Optional[ConnectionPool]):
+        object.__setattr__(self, '_conn', conn)
+        object.__setattr__(self, '_pool', pool)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self._conn.__exit__(*exc_info)
+
+    def close(self):
+        conn = self._conn
+        if conn is None:
+            return
+        object.__setattr__(self, '_conn', None)
+        if self._pool is not None:
+            self._pool.release(conn)
+        elif conn.in_transaction:
+            # Request-bound: mirror sqlite3 close() by dropping uncommitted work
+            conn.rollback()
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+def _schema_behind(version: int) -> RuntimeError:
+    return RuntimeError(f"Database schema is at version {version}, expected {LATEST_VERSION}; "
+                        f"run `python -m app.migrations` to upgrade {DATABASE}")
+
+def _ensure_schema(pool: ConnectionPool, migrate: bool):
+    """
+    Bring a new pool's database up to LATEST_VERSION on its first connection.
+
+    Callers that never ran init_database() (library use, CLI scripts) would
+    otherwise hit "no such column" deep inside a query. With migrate off
+    the file is refused with RuntimeError instead.
+    """
+    conn = pool.acquire()
+    try:
+        version = get_schema_version(conn)
+        if version < LATEST_VERSION:
+            if not migrate:
+                raise _schema_behind(version)
+            apply_migrations(conn)
+            _fts_available.pop(pool.database, None)
+    finally:
+        pool.release(conn)
+
+def get_pool(migrate: Optional[bool] = None) -> ConnectionPool:
+    """
+    Get the connection pool for the current DATABASE path, creating it on first use.
+
+    A new pool checks the file's schema first: an old one is migrated if
+    migrate (default MIGRATE_ON_START) is on and refused otherwise.
+    """
+    pool = _pools.get(DATABASE)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(DATABASE)
+            if pool is None:
+                pool = ConnectionPool(DATABASE, POOL_SIZE, POOL_TIMEOUT)
+                try:
+                    _ensure_schema(pool, MIGRATE_ON_START if migrate is None else migrate)
+                except BaseException:
+                    pool.close_all()
+                    raise
+                _pools[DATABASE] = pool
+    return pool
+
+def configure(settings: Dict):
+    """
+    Apply storage settings from config.load_config(): database path, pool
+    limits and connection PRAGMAs. Existing pools are closed so that every
+    connection opened from now on uses the new settings.
+    """
+    global DATABASE, POOL_SIZE, POOL_TIMEOUT, READ_POOL_SIZE, SNAPSHOT_INTERVAL, SNAPSHOT_PATH
+    global MIGRATE_ON_START, _connection_pragmas
+    DATABASE = settings['DATABASE']
+    POOL_SIZE = settings['POOL_SIZE']
+    POOL_TIMEOUT = settings['POOL_TIMEOUT']
+    READ_POOL_SIZE = settings['READ_POOL_SIZE']
+    SNAPSHOT_INTERVAL = settings['SNAPSHOT_INTERVAL']
+    SNAPSHOT_PATH = settings['SNAPSHOT_PATH']
+    MIGRATE_ON_START = settings['MIGRATE_ON_START']
+    _connection_pragmas = connection_pragmas(settings)
+    close_pools()
+
+def get_connection_pragmas() -> Dict[str, object]:
+    """Get the PRAGMA values in effect on a connection to the current database."""
+    with db_session() as conn:
+        return {name: conn.execute(f'PRAGMA {name}').fetchone()[0] for name in _connection_pragmas}
+
+def get_pool_stats() -> Dict:
+    """Get usage statistics for the current database's connection pool."""
+    return get_pool().stats()
+
+# Read-only pools keyed by (file read, snapshot generation). The generation
+# is a one-element list, or shared memory after share_catalog_state(), so
+# that forked workers follow the master's refreshes; _shared_lock guards it
+_read_pools: Dict[Tuple[str, int], ConnectionPool] = {}
+_snapshot_generation = [0]
+_shared_lock = threading.Lock()
+_snapshot_lock = threading.Lock()
+
+def get_snapshot_path() -> str:
+    """Get the snapshot file path for the current database."""
+    return SNAPSHOT_PATH or f'{DATABASE}.snapshot'
+
+def _read_target() -> Tuple[str, bool]:
+    # (file, is_snapshot): the snapshot once one exists, else the live database
+    if SNAPSHOT_INTERVAL > 0:
+        snapshot = get_snapshot_path()
+        if os.path.exists(snapshot):
+            return snapshot, True
+    return DATABASE, False
+
+def get_read_pool(snapshot: bool = True) -> ConnectionPool:
+    """
+    Get the read-only connection pool for the current read target.
+
+    snapshot=False always reads the live database, for reads whose results
+    feed fees, payments or loan limits.
+    """
+    path, is_snapshot = _read_target() if snapshot else (DATABASE, False)
+    key = (path, int(_snapshot_generation[0]) if is_snapshot else 0)
+    pool = _read_pools.get(key)
+    if pool is None:
+        if not is_snapshot:
+            # Read-only connections cannot migrate: let the write pool check the live file
+            get_pool()
+        stale_pools = []
+        with _pools_lock:
+            pool = _read_pools.get(key)
+            if pool is None:
+                pool = _read_pools[key] = ConnectionPool(path, READ_POOL_SIZE, POOL_TIMEOUT,
+                                                         read_only=True, immutable=is_snapshot)
+                if is_snapshot:
+                    # Pools on an older snapshot, refreshed by another process
+                    stale_pools = [_read_pools.pop(old) for old in list(_read_pools)
+                                   if old[0] == path and old != key]
+        for stale in stale_pools:
+            stale.close_all()
+    return pool
+
+def get_read_pool_stats() -> Dict:
+    """Get usage statistics for the current read-only pool."""
+    return get_read_pool().stats()
+
+def close_pools():
+    """Close idle connections in every pool and forget the pools."""
+    with _pools_lock:
+        pools = list(_pools.values()) + list(_read_pools.values())
+        _pools.clear()
+        _read_pools.clear()
+    for pool in pools:
+        pool.close_all()
+
+def _reset_after_fork():
+    # In a forked worker, connections opened and locks held by the parent's
+    # threads must not be reused: start with no pools and fresh locks
+    global _pools_lock, _snapshot_lock, _shared_lock, _book_cache, _invalidations_seen
+    _pools.clear()
+    _read_pools.clear()
+    _pools_lock = threading.Lock()
+    _snapshot_lock = threading.Lock()
+    _book_cache = LRUCache(BOOK_CACHE_SIZE)
+    if _invalidations is None:
+        _shared_lock = threading.Lock()
+    else:
+        _invalidations_seen = _invalidations[0]
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def refresh_snapshot() -> str:
+    """
+    Copy the live database to the snapshot file with the SQLite backup API.
+
+    The copy is written beside the snapshot and renamed over it, so readers
+    never see a partial file: connections still open on the old snapshot
+    finish on it, and new read connections open the new one. Returns the
+    snapshot path.
+    """
+    path = get_snapshot_path()
+    with _snapshot_lock:
+        partial = f'{path}.partial'
+        source = sqlite3.connect(DATABASE)
+        try:
+            target = sqlite3.connect(partial)
+            try:
+                source.backup(target)
+                # Rollback journal: the immutable snapshot needs no -wal/-shm files
+                target.execute('PRAGMA journal_mode = DELETE')
+            finally:
+                target.close()
+        finally:
+            source.close()
+        os.replace(partial, path)
+        with _pools_lock:
+            with _shared_lock:
+                _snapshot_generation[0] += 1
+                generation = int(_snapshot_generation[0])
+            stale = [key for key in _read_pools if key[0] == path and key[1] != generation]
+            stale_pools = [_read_pools.pop(key) for key in stale]
+    for pool in stale_pools:
+        pool.close_all()
+    return path
+
+def start_snapshot_refresher(interval: Optional[float] = None) -> threading.Thread:
+    """
+    Refresh the snapshot every interval seconds on a daemon thread.
+
+    The first refresh happens right away unless the snapshot on disk is
+    younger than one interval (e.g. made by another worker), so starting
+    a process does not copy the whole database each time.
+    """
+    interval = interval or SNAPSHOT_INTERVAL
+    database = DATABASE
+    try:
+        age = time.time() - os.path.getmtime(get_snapshot_path())
+    except OSError:
+        age = None
+    if age is None or age >= interval:
+        refresh_snapshot()
+
+    def run():
+        while True:
+            time.sleep(interval)
+            if DATABASE != database:
+                return  # Reconfigured to another database
+            try:
+                refresh_snapshot()
+            except (OSError, sqlite3.Error):
+                logger.exception('Snapshot refresh failed; readers keep the previous copy')
+
+    thread = threading.Thread(target=run, name='snapshot-refresher', daemon=True)
+    thread.start()
+    return thread
 
 def get_db_connection():
-    """Get a database connection."""
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row  # This enables column access by name
-    return conn
+    """
+    Get a database connection.
+
+    Inside a request of an app set up with init_app(), every call returns the
+    same pooled connection, which is released at app context teardown.
+    Elsewhere (CLI, tests) a connection is checked out of the pool and
+    returned to it when closed.
+    """
+    if has_app_context() and _EXTENSION_KEY in current_app.extensions:
+        bound = g.get('_library_db')
+        if bound is None:
+            pool = get_pool()
+            bound = g._library_db = (pool, pool.acquire())
+        return PooledConnection(bound[1], None)
+    pool = get_pool()
+    return PooledConnection(pool.acquire(), pool)
+
+def get_read_connection(snapshot: bool = True):
+    """
+    Get a read-only connection for queries that never write.
 
-def init_database():
-    """Initialize the database with required tables."""
+    Works like get_db_connection() (request-bound inside an init_app()
+    request, pooled elsewhere) but comes from the read-only pool, so
+    catalog, search and report reads never contend for the write lock.
+    """
+    pool = get_read_pool(snapshot)
+    if has_app_context() and _EXTENSION_KEY in current_app.extensions:
+        # One connection per pool: without a snapshot both kinds of read share it
+        bound = g.setdefault('_library_db_ro', {})
+        if pool not in bound:
+            bound[pool] = pool.acquire()
+        return PooledConnection(bound[pool], None)
+    return PooledConnection(pool.acquire(), pool)
+
+@contextmanager
+def read_session(snapshot: bool = True):
+    """Context manager yielding a read-only connection that is always closed afterwards."""
+    conn = get_read_connection(snapshot)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+@contextmanager
+def db_session():
+    """Context manager yielding a connection that is always closed afterwards."""
     conn = get_db_connection()
-    
-    # Create books table
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS books (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            author TEXT NOT NULL,
-            isbn TEXT UNIQUE NOT NULL,
-            total_copies INTEGER NOT NULL,
-            available_copies INTEGER NOT NULL
-        )
-    ''')
-    
-    # Create borrow_records table
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS borrow_records (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            patron_id TEXT NOT NULL,
-            book_id INTEGER NOT NULL,
-            borrow_date TEXT NOT NULL,
-            due_date TEXT NOT NULL,
-            return_date TEXT,
-            FOREIGN KEY (book_id) REFERENCES books (id)
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+@contextmanager
+def transaction(immediate: bool = True):
+    """
+    Context manager running a block as one transaction on one connection.
+
+    BEGIN IMMEDIATE takes the write lock up front, so read-then-write steps
+    inside the block cannot interleave with another writer. Commits on
+    success and rolls back if the block raises.
+    """
+    with db_session() as conn:
+        conn.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+def close_request_connection(exception=None):
+    """Release the request-bound connections back to their pools (teardown handler)."""
+    bound = g.pop('_library_db', None)
+    if bound is not None:
+        pool, conn = bound
+        pool.release(conn)
+    for pool, conn in g.pop('_library_db_ro', {}).items():
+        pool.release(conn)
+
+def init_app(app):
+    """Bind pooled connections to the app's request lifecycle and start snapshot refreshes."""
+    app.extensions[_EXTENSION_KEY] = True
+    app.teardown_appcontext(close_request_connection)
+    if SNAPSHOT_INTERVAL > 0:
+        start_snapshot_refresher()
+
+def init_database(migrate: bool = True):
+    """
+    Initialize the database by applying any pending schema migrations.
+
+    With migrate=False only the schema version is read, and a database
+    behind the code raises RuntimeError instead of being migrated.
+    """
+    get_pool(migrate)
+    with db_session() as conn:
+        if migrate:
+            apply_migrations(conn)
+        else:
+            version = get_schema_version(conn)
+            if version < LATEST_VERSION:
+                raise _schema_behind(version)
+    _fts_available.pop(DATABASE, None)
 
 def add_sample_data():
     """Add sample data to the database if it's empty."""
-    conn = get_db_connection()
-    book_count = conn.execute('SELECT COUNT(*) as count FROM books').fetchone()['count']
-    
-    if book_count == 0:
-        # Add sample books
-        sample_books = [
-            ('The Great Gatsby', 'F. Scott Fitzgerald', '9780743273565', 3),
-            ('To Kill a Mockingbird', 'Harper Lee', '9780061120084', 2),
-            ('1984', 'George Orwell', '9780451524935', 1)
-        ]
+    with db_session() as conn:
+        # Stops at the first row instead of counting the whole catalog
+        has_books = conn.execute('SELECT 1 FROM books LIMIT 1').fetchone() is not None
         
-        for title, author, isbn, copies in sample_books:
+        if not has_books:
+            # Add sample books
+            sample_books = [
+                ('The Great Gatsby', 'F. Scott Fitzgerald', '9780743273565', 3),
+                ('To Kill a Mockingbird', 'Harper Lee', '9780061120084', 2),
+                ('1984', 'George Orwell', '9780451524935', 1)
+            ]
+            
+            for title, author, isbn, copies in sample_books:
+                conn.execute('''
+                    INSERT INTO books (title, author, isbn, total_copies, available_copies)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (title, author, isbn, copies, copies))
+            
+            # Make 1984 unavailable by adding a borrow record
             conn.execute('''
-                INSERT INTO books (title, author, isbn, total_copies, available_copies)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (title, author, isbn, copies, copies))
-        
-        # Make 1984 unavailable by adding a borrow record
-        conn.execute('''
-            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
-            VALUES (?, ?, ?, ?)
-        ''', ('123456', 3, 
-              (datetime.now() - timedelta(days=5)).isoformat(),
-              (datetime.now() + timedelta(days=9)).isoformat()))
-        
-        # Update available copies for 1984
-        conn.execute('UPDATE books SET available_copies = 0 WHERE id = 3')
-        
-        conn.commit()
-    
-    conn.close()
+                INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+                VALUES (?, ?, ?, ?)
+            ''', ('123456', 3, 
+                  (datetime.now() - timedelta(days=5)).isoformat(),
+                  (datetime.now() + timedelta(days=9)).isoformat()))
+            
+            # Update available copies for 1984
+            conn.execute('UPDATE books SET available_copies = 0 WHERE id = 3')
+            
+            conn.commit()
+            clear_book_cache()
 
 # Helper Functions for Database Operations
 
-def get_all_books() -> List[Dict]:
+BOOK_COLUMNS = Book.columns()
+
+def _fetch_records(conn, model, sql: str, params: Tuple = ()) -> List:
+    """Run a query whose columns match model._fields and build one record per row."""
+    cursor = conn.cursor()
+    cursor.row_factory = model.from_row
+    return cursor.execute(sql, params).fetchall()
+
+def _fetch_record(conn, model, sql: str, params: Tuple = ()):
+    """Like _fetch_records() for at most one row; None when there is none."""
+    cursor = conn.cursor()
+    cursor.row_factory = model.from_row
+    return cursor.execute(sql, params).fetchone()
+
+def get_all_books() -> List[Book]:
     """Get all books from the database."""
-    conn = get_db_connection()
-    books = conn.execute('SELECT * FROM books ORDER BY title').fetchall()
-    conn.close()
-    return [dict(book) for book in books]
+    with read_session() as conn:
+        return _fetch_records(conn, Book, f'SELECT {BOOK_COLUMNS} FROM books ORDER BY title')
+
+def get_books_page(after: Optional[Tuple[str, int]] = None,
+                   before: Optional[Tuple[str, int]] = None,
+                   limit: int = 50) -> List[Book]:
+    """
+    Get up to limit books in (title, id) order using keyset pagination.
 
-def get_book_by_id(book_id: int) -> Optional[Dict]:
+    after/before are the (title, id) of the row the page starts after or ends
+    before, so each page is an index seek rather than an OFFSET scan.
+    """
+    with read_session() as conn:
+        if before is not None:
+            books = _fetch_records(conn, Book, f'''
+                SELECT {BOOK_COLUMNS} FROM books WHERE (title, id) < (?, ?)
+                ORDER BY title DESC, id DESC LIMIT ?
+            ''', (before[0], before[1], limit))
+            books.reverse()
+        elif after is not None:
+            books = _fetch_records(conn, Book, f'''
+                SELECT {BOOK_COLUMNS} FROM books WHERE (title, id) > (?, ?)
+                ORDER BY title, id LIMIT ?
+            ''', (after[0], after[1], limit))
+        else:
+            books = _fetch_records(
+                conn, Book, f'SELECT {BOOK_COLUMNS} FROM books ORDER BY title, id LIMIT ?', (limit,)
+            )
+    return books
+
+def get_catalog_version_info(snapshot: bool = True) -> Tuple[str, float]:
+    """
+    Get (version, modified) for the catalog as reads see it.
+
+    version is an opaque token that changes on every committed write to
+    books or borrow_records, by this or any other process (triggers keep the
+    catalog_version row current); modified is the epoch time of that write.
+    Read from the same file as read_session(snapshot), so with a snapshot
+    the version changes when a refresh makes new data visible.
+    """
+    with read_session(snapshot) as conn:
+        row = conn.execute('SELECT tag, version, modified FROM catalog_version').fetchone()
+    return f"{row['tag']}-{row['version']}", row['modified']
+
+def get_catalog_version() -> str:
+    """Get an opaque token that changes whenever books or loans are written."""
+    return get_catalog_version_info()[0]
+
+def get_catalog_modified() -> float:
+    """Get the time (epoch seconds) of the last write to books or loans."""
+    return get_catalog_version_info()[1]
+
+# Once shared, book ids invalidated by any process: slot 0 counts the ids
+# ever written, the rest is a ring of the latest ones (-1 = clear everything)
+_INVALIDATION_RING = 4096
+_invalidations = None
+_invalidations_seen = 0
+
+def share_catalog_state():
+    """
+    Move the snapshot generation and book invalidations into shared memory.
+
+    A pre-fork server calls this in its master before forking workers, so
+    each worker's book cache and snapshot pools follow the writes and
+    snapshot refreshes of every other process. (Catalog versions need no
+    sharing: they are read from the database.)
+    """
+    global _snapshot_generation, _shared_lock, _invalidations, _invalidations_seen
+    if _invalidations is not None:
+        return
+    import multiprocessing
+
+    generation = multiprocessing.RawArray('q', 1)
+    generation[0] = _snapshot_generation[0]
+    _shared_lock = multiprocessing.Lock()
+    _snapshot_generation = generation
+    _invalidations_seen = 0
+    _invalidations = multiprocessing.RawArray('q', _INVALIDATION_RING + 1)
+
+def _publish_invalidation(book_id: int):
+    with _shared_lock:
+        written = _invalidations[0]
+        _invalidations[1 + written % _INVALIDATION_RING] = book_id
+        _invalidations[0] = written + 1
+
+def _sync_book_cache():
+    """Drop cached rows invalidated by other processes since the last call."""
+    global _invalidations_seen
+    seen = _invalidations_seen
+    written = _invalidations[0]
+    if written == seen:
+        return
+    ids = [_invalidations[1 + n % _INVALIDATION_RING]
+           for n in range(max(seen, written - _INVALIDATION_RING), written)]
+    # Entries overwritten before this process read them count as a clear
+    if _invalidations[0] - seen > _INVALIDATION_RING or -1 in ids:
+        _book_cache.clear()
+    else:
+        for book_id in ids:
+            _book_cache.invalidate((DATABASE, 'id', book_id))
+    _invalidations_seen = written
+
+# Book rows keyed by (database, 'id', id) and ISBN -> id keyed by (database, 'isbn', isbn).
+# Only found books are cached, so inserts never leave a stale "not found" behind.
+_book_cache = LRUCache(BOOK_CACHE_SIZE)
+
+def get_book_cache_stats() -> Dict:
+    """Get hit/miss statistics for the book row cache."""
+    return _book_cache.stats()
+
+def invalidate_book(book_id: int):
+    """Drop a book's cached row; call after committing any change to it."""
+    _book_cache.invalidate((DATABASE, 'id', book_id))
+    if _invalidations is not None:
+        _publish_invalidation(book_id)
+
+def clear_book_cache():
+    """Drop every cached book row (e.g. after bulk writes outside these helpers)."""
+    _book_cache.clear()
+    if _invalidations is not None:
+        _publish_invalidation(-1)
+
+def get_book_by_id(book_id: int) -> Optional[Book]:
     """Get a specific book by ID."""
-    conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
-    conn.close()
-    return dict(book) if book else None
+    if _invalidations is not None:
+        _sync_book_cache()
+    key = (DATABASE, 'id', book_id)
+    book = _book_cache.get(key)
+    if book is MISSING:
+        generation = _book_cache.generation
+        with db_session() as conn:
+            book = _fetch_record(conn, Book, f'SELECT {BOOK_COLUMNS} FROM books WHERE id = ?', (book_id,))
+        if not book:
+            return None
+        _book_cache.set_if_current(key, book, generation)
+    # Callers get their own copy; the cached record is never handed out
+    return book.copy()
 
-def get_book_by_isbn(isbn: str) -> Optional[Dict]:
+def get_book_by_isbn(isbn: str) -> Optional[Book]:
     """Get a specific book by ISBN."""
-    conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE isbn = ?', (isbn,)).fetchone()
-    conn.close()
-    return dict(book) if book else None
+    # A book's ISBN never changes, so the ISBN -> id mapping needs no invalidation
+    if _invalidations is not None:
+        _sync_book_cache()
+    book_id = _book_cache.get((DATABASE, 'isbn', isbn))
+    if book_id is not MISSING:
+        book = get_book_by_id(book_id)
+        if book is not None:
+            return book
+    with db_session() as conn:
+        book = _fetch_record(conn, Book, f'SELECT {BOOK_COLUMNS} FROM books WHERE isbn = ?', (isbn,))
+    if not book:
+        return None
+    _book_cache.set((DATABASE, 'isbn', isbn), book['id'])
+    return book
+
+# Whether books_fts exists, cached per database path
+_fts_available: Dict[str, bool] = {}
+
+def fts_available() -> bool:
+    """Check whether the books_fts full-text index exists in the current database."""
+    available = _fts_available.get(DATABASE)
+    if available is None:
+        with db_session() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'books_fts'"
+            ).fetchone()
+        available = _fts_available[DATABASE] = row is not None
+    return available
+
+def search_books_fulltext(term: str, field: str, prefix: bool = False,
+                          limit: Optional[int] = None) -> Optional[List[Book]]:
+    """
+    Search book titles or authors through the books_fts index.
+
+    Matches the term anywhere in the field (case-insensitive), ranked by
+    bm25 relevance, or only at the start of the field when prefix is True.
+    Returns None when the index cannot answer the query (no FTS5 support,
+    or a substring term shorter than the 3-character trigram) so the caller
+    can fall back to a scan.
+    """
+    if field not in ('title', 'author') or not fts_available():
+        return None
+    query = _fulltext_query(term, field, prefix)
+    if query is None:
+        return None
+    sql, params = query
+    if limit is not None:
+        sql += ' LIMIT ?'
+        params += (limit,)
+    with read_session() as conn:
+        return _fetch_records(conn, Book, sql, params)
+
+def _fulltext_query(term: str, field: str, prefix: bool) -> Optional[Tuple[str, Tuple]]:
+    """The (sql, params) search_books_fulltext() runs, or None if the index cannot answer."""
+    if prefix:
+        # The trigram index only serves a LIKE without ESCAPE, so only terms
+        # holding a wildcard character pay for escaping it (with a full scan)
+        if any(char in term for char in '%_\\'):
+            escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            pattern, escape = escaped + '%', " ESCAPE '\\'"
+        else:
+            pattern, escape = term + '%', ''
+        sql = f'''
+            SELECT {Book.columns('b')} FROM books_fts f JOIN books b ON b.id = f.rowid
+            WHERE f.{field} LIKE ?{escape}
+            ORDER BY b.title, b.id
+        '''
+        params: Tuple = (pattern,)
+    else:
+        if len(term) < 3:
+            return None
+        phrase = '"' + term.replace('"', '""') + '"'
+        sql = f'''
+            SELECT {Book.columns('b')} FROM books_fts f JOIN books b ON b.id = f.rowid
+            WHERE books_fts MATCH ?
+            ORDER BY f.rank, b.title, b.id
+        '''
+        params = (f'{field} : {phrase}',)
+    return sql, params
 
-def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
+def to_epoch(value) -> int:
+    """
+    Convert a datetime, date or ISO string to the epoch seconds stored in
+    borrow_ts/due_ts/return_ts.
+
+    Naive values are read as UTC, like SQLite's strftime('%s', ...), so
+    comparisons against the generated columns line up with the ISO text.
+    """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    elif not isinstance(value, datetime):
+        value = datetime.combine(value, datetime.min.time())
+    return calendar.timegm(value.timetuple())
+
+def get_patron_borrowed_books(patron_id: str) -> List[Loan]:
     """Get currently borrowed books for a patron."""
-    conn = get_db_connection()
-    records = conn.execute('''
-        SELECT br.*, b.title, b.author 
-        FROM borrow_records br 
-        JOIN books b ON br.book_id = b.id 
-        WHERE br.patron_id = ? AND br.return_date IS NULL
-        ORDER BY br.borrow_date
-    ''', (patron_id,)).fetchall()
-    conn.close()
-    
-    borrowed_books = []
-    for record in records:
-        borrowed_books.append({
-            'book_id': record['book_id'],
-            'title': record['title'],
-            'author': record['author'],
-            'borrow_date': datetime.fromisoformat(record['borrow_date']),
-            'due_date': datetime.fromisoformat(record['due_date']),
-            'is_overdue': datetime.now() > datetime.fromisoformat(record['due_date'])
-        })
-    
-    return borrowed_books
+    with read_session(snapshot=False) as conn:
+        return _fetch_records(conn, Loan, PATRON_LOANS_SQL, (to_epoch(datetime.now()), patron_id))
+
+def get_patron_borrow_history(patron_id: str, limit: int = 50,
+                              before: Optional[Tuple[str, int]] = None) -> List[BorrowRecord]:
+    """
+    Get one page of a patron's borrow records, newest first.
+
+    before is the (borrow_date, id) of the last record on the previous page.
+    """
+    with read_session() as conn:
+        if before is not None:
+            records = _fetch_records(conn, BorrowRecord, PATRON_HISTORY_BEFORE_SQL,
+                                     (patron_id, before[0], before[1], limit))
+        else:
+            records = _fetch_records(conn, BorrowRecord, PATRON_HISTORY_SQL, (patron_id, limit))
+    return records
 
 def get_patron_borrow_count(patron_id: str) -> int:
     """Get the number of books currently borrowed by a patron."""
-    conn = get_db_connection()
-    count = conn.execute('''
-        SELECT COUNT(*) as count FROM borrow_records 
-        WHERE patron_id = ? AND return_date IS NULL
-    ''', (patron_id,)).fetchone()['count']
-    conn.close()
+    with read_session(snapshot=False) as conn:
+        count = conn.execute(ACTIVE_LOAN_COUNT_SQL, (patron_id,)).fetchone()['count']
     return count
 
+def iter_overdue_loans(today: str, patron_id: Optional[str] = None, chunk_size: int = 10000,
+                       patron_ids: Optional[Iterable[str]] = None) -> Iterator[List[sqlite3.Row]]:
+    """
+    Yield active overdue loans in chunks, with days_overdue computed in SQL.
+
+    today is an ISO date (YYYY-MM-DD); a loan is overdue when the date part
+    of its due_date is before today. Each row has id, patron_id, book_id,
+    due_date and days_overdue. A library-wide sweep range-scans the due_ts
+    index, so only overdue active loans are read; patron_id or patron_ids
+    instead look up those patrons' active loans, in batched IN lookups.
+    """
+    midnight = to_epoch(date.fromisoformat(today))
+    params: Tuple = (midnight // 86400, midnight)
+    queries: List[Tuple[str, Tuple]] = [(OVERDUE_LOANS_SQL, ())]
+    if patron_id is not None:
+        patron_ids = [patron_id]
+    if patron_ids is not None:
+        wanted = sorted(set(patron_ids))
+        queries = [(f'{PATRON_OVERDUE_LOANS_SQL}({",".join("?" * len(batch))})', tuple(batch))
+                   for batch in (wanted[start:start + 500] for start in range(0, len(wanted), 500))]
+    with read_session(snapshot=False) as conn:
+        for sql, patrons in queries:
+            cursor = conn.execute(sql, params + patrons)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+
+def _iter_id_chunks(table: str, columns: str, where: List[str], params: Tuple,
+                    chunk_size: int) -> Iterator[List[sqlite3.Row]]:
+    """
+    Yield rows of a table in id order, one keyset page per chunk.
+
+    Each chunk is a short query on a connection checked out of the read pool
+    and returned before the chunk is yielded, so a slow consumer never holds
+    a connection or a read snapshot open between chunks, and memory stays at
+    one chunk however large the table is. The connection is never bound to
+    the request like read_session()'s: a streamed response is still being
+    sent after the view returns, and request connections are only released
+    at teardown, once the whole body has gone out.
+    """
+    last_id = 0
+    conditions = ' AND '.join(['id > ?'] + where)
+    sql = f'SELECT {columns} FROM {table} WHERE {conditions} ORDER BY id LIMIT ?'
+    while True:
+        pool = get_read_pool()
+        conn = pool.acquire()
+        try:
+            rows = conn.execute(sql, (last_id,) + params + (chunk_size,)).fetchall()
+        finally:
+            pool.release(conn)
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1]['id']
+
+def iter_books_chunks(chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[List[sqlite3.Row]]:
+    """Yield every book in id order, chunk_size rows at a time."""
+    return _iter_id_chunks('books', 'id, title, author, isbn, total_copies, available_copies',
+                           [], (), chunk_size)
+
+def iter_borrow_records_chunks(patron_id: Optional[str] = None, since: Optional[str] = None,
+                               until: Optional[str] = None,
+                               chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[List[sqlite3.Row]]:
+    """
+    Yield borrow records in id order, chunk_size rows at a time.
+
+    since and until are ISO dates bounding borrow_date: since is inclusive,
+    until is exclusive.
+    """
+    where: List[str] = []
+    params: Tuple = ()
+    if patron_id is not None:
+        where.append('patron_id = ?')
+        params += (patron_id,)
+    if since is not None:
+        where.append('borrow_date >= ?')
+        params += (since,)
+    if until is not None:
+        where.append('borrow_date < ?')
+        params += (until,)
+    return _iter_id_chunks('borrow_records', 'id, patron_id, book_id, borrow_date, due_date, return_date',
+                           where, params, chunk_size)
+
 def insert_book(title: str, author: str, isbn: str, total_copies: int, available_copies: int) -> bool:
     """Insert a new book into the database."""
-    conn = get_db_connection()
-    try:
-        conn.execute('''
+    with db_session() as conn:
+        try:
+            conn.execute('''
+                INSERT INTO books (title, author, isbn, total_copies, available_copies)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (title, author, isbn, total_copies, available_copies))
+            conn.commit()
+            _book_cache.invalidate((DATABASE, 'isbn', isbn))
+            return True
+        except Exception as e:
+            return False
+
+def insert_new_books(books: Sequence[Tuple[str, str, str, int, int]]) -> Tuple[int, Set[str]]:
+    """
+    Insert many books in one IMMEDIATE transaction, skipping ISBNs already in the catalog.
+
+    books holds (title, author, isbn, total_copies, available_copies) tuples
+    with unique ISBNs. Existing ISBNs are found with batched IN lookups and
+    the rest inserted with executemany. Returns (inserted count, duplicate ISBNs).
+    """
+    isbns = [book[2] for book in books]
+    existing: Set[str] = set()
+    with transaction() as conn:
+        for start in range(0, len(isbns), 500):
+            batch = isbns[start:start + 500]
+            placeholders = ','.join('?' * len(batch))
+            existing.update(row['isbn'] for row in conn.execute(
+                f'SELECT isbn FROM books WHERE isbn IN ({placeholders})', batch))
+        new_books = [book for book in books if book[2] not in existing]
+        # Index the whole chunk with one INSERT ... SELECT instead of one trigger per row
+        bulk_fts = fts_available()
+        if bulk_fts:
+            last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM books').fetchone()[0]
+            conn.execute('INSERT INTO books_fts_pause (paused) VALUES (1)')
+        conn.executemany('''
             INSERT INTO books (title, author, isbn, total_copies, available_copies)
             VALUES (?, ?, ?, ?, ?)
-        ''', (title, author, isbn, total_copies, available_copies))
-        conn.commit()
-        conn.close()
-        return True
-    except Exception as e:
-        conn.close()
-        return False
+        ''', new_books)
+        if bulk_fts:
+            conn.execute('''
+                INSERT INTO books_fts (rowid, title, author)
+                SELECT id, title, author FROM books WHERE id > ?
+            ''', (last_id,))
+            conn.execute('DELETE FROM books_fts_pause')
+    return len(new_books), existing
 
 def insert_borrow_record(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime) -> bool:
     """Insert a new borrow record into the database."""
-    conn = get_db_connection()
-    try:
-        conn.execute('''
-            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
-            VALUES (?, ?, ?, ?)
-        ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()))
-        conn.commit()
-        conn.close()
-        return True
-    except Exception as e:
-        conn.close()
-        return False
+    with db_session() as conn:
+        try:
+            conn.execute('''
+                INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+                VALUES (?, ?, ?, ?)
+            ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()))
+            conn.commit()
+            return True
+        except Exception as e:
+            return False
 
 def update_book_availability(book_id: int, change: int) -> bool:
     """Update the available copies of a book by a given amount (+1 for return, -1 for borrow)."""
-    conn = get_db_connection()
+    with db_session() as conn:
+        try:
+            conn.execute('''
+                UPDATE books SET available_copies = available_copies + ? WHERE id = ?
+            ''', (change, book_id))
+            conn.commit()
+            invalidate_book(book_id)
+            return True
+        except Exception as e:
+            return False
+
+def update_borrow_record_return_date(patron_id: str, book_id: int, return_date: datetime) -> int:
+    """Update the return date for a borrow record. Returns the number of records updated."""
+    with db_session() as conn:
+        try:
+            cursor = conn.execute('''
+                UPDATE borrow_records 
+                SET return_date = ? 
+                WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+            ''', (return_date.isoformat(), patron_id, book_id))
+            conn.commit()
+            return cursor.rowcount
+        except Exception as e:
+            return 0
+
+def _after_circulation(book_ids: Iterable[int]):
+    """Drop cached rows for books whose availability changed."""
+    for book_id in book_ids:
+        invalidate_book(book_id)
+
+def _borrow_copy(conn, patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime,
+                 loans_held: int, max_loans: int) -> Tuple[str, Optional[Book]]:
+    """Borrow one copy inside an open transaction; see borrow_book_atomic() for outcomes."""
+    if loans_held >= max_loans:
+        # Failure path only: report a missing/unavailable book ahead of the limit
+        book = _fetch_record(conn, Book, f'SELECT {BOOK_COLUMNS} FROM books WHERE id = ?', (book_id,))
+        if book is None:
+            return 'not_found', None
+        if book['available_copies'] <= 0:
+            return 'unavailable', None
+        return 'limit', book
+    # Conditional decrement: never takes available_copies below zero
+    rows = _fetch_records(conn, Book, f'''
+        UPDATE books SET available_copies = available_copies - 1
+        WHERE id = ? AND available_copies > 0
+        RETURNING {BOOK_COLUMNS}
+    ''', (book_id,))
+    if not rows:
+        exists = conn.execute('SELECT 1 FROM books WHERE id = ?', (book_id,)).fetchone()
+        return ('unavailable' if exists else 'not_found'), None
+    conn.execute('''
+        INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+        VALUES (?, ?, ?, ?)
+    ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()))
+    return 'ok', rows[0]
+
+def borrow_book_atomic(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime,
+                       max_loans: int) -> Tuple[str, Optional[Book]]:
+    """
+    Borrow a copy of a book in a single IMMEDIATE transaction.
+
+    Counts the patron's active loans, decrements available_copies only if a
+    copy is left, and inserts the borrow record, with one commit. Returns
+    (outcome, book) where outcome is 'ok', 'not_found', 'unavailable',
+    'limit' or 'error'; book is the updated row when outcome is 'ok'.
+    """
     try:
-        conn.execute('''
-            UPDATE books SET available_copies = available_copies + ? WHERE id = ?
-        ''', (change, book_id))
-        conn.commit()
-        conn.close()
-        return True
-    except Exception as e:
-        conn.close()
-        return False
+        with transaction() as conn:
+            loans_held = conn.execute(ACTIVE_LOAN_COUNT_SQL, (patron_id,)).fetchone()['count']
+            outcome, book = _borrow_copy(conn, patron_id, book_id, borrow_date, due_date,
+                                         loans_held, max_loans)
+            if outcome != 'ok':
+                conn.rollback()
+    except sqlite3.Error:
+        return 'error', None
+    if outcome == 'ok':
+        _after_circulation((book_id,))
+    return outcome, book
 
-def update_borrow_record_return_date(patron_id: str, book_id: int, return_date: datetime) -> bool:
-    """Update the return date for a borrow record."""
-    conn = get_db_connection()
+def borrow_books_batch(patron_id: str, book_ids: Sequence[int], borrow_date: datetime,
+                       due_date: datetime, max_loans: int) -> List[Tuple[int, str, Optional[Book]]]:
+    """
+    Borrow several books for one patron in a single IMMEDIATE transaction.
+
+    The loan limit applies across the whole batch: each successful item
+    counts towards it for the items after it. Items that fail change
+    nothing, so the rest still commit together. Returns one
+    (book_id, outcome, book) per requested id, in order, with the
+    outcomes of borrow_book_atomic(); every item is 'error' if the
+    transaction fails.
+    """
+    results: List[Tuple[int, str, Optional[Book]]] = []
     try:
+        with transaction() as conn:
+            loans_held = conn.execute(ACTIVE_LOAN_COUNT_SQL, (patron_id,)).fetchone()['count']
+            for book_id in book_ids:
+                outcome, book = _borrow_copy(conn, patron_id, book_id, borrow_date, due_date,
+                                             loans_held, max_loans)
+                if outcome == 'ok':
+                    loans_held += 1
+                results.append((book_id, outcome, book))
+    except sqlite3.Error:
+        return [(book_id, 'error', None) for book_id in book_ids]
+    _after_circulation(book_id for book_id, outcome, _ in results if outcome == 'ok')
+    return results
+
+def _return_copy(conn, patron_id: str, book_id: int, return_date: datetime) -> Tuple[str, Optional[Dict]]:
+    """Return one copy inside an open transaction; see return_book_atomic() for outcomes."""
+    loans = conn.execute(RETURN_LOAN_SQL, (return_date.isoformat(), patron_id, book_id)).fetchall()
+    if not loans:
+        # Failure path only: tell a missing book apart from a missing loan
+        exists = conn.execute('SELECT 1 FROM books WHERE id = ?', (book_id,)).fetchone()
+        return ('not_borrowed' if exists else 'not_found'), None
+    conn.execute('''
+        UPDATE books SET available_copies = available_copies + 1
+        WHERE id = ? AND available_copies < total_copies
+    ''', (book_id,))
+    loan = dict(loans[0])
+    for key in ('borrow_date', 'due_date', 'return_date'):
+        loan[key] = datetime.fromisoformat(loan[key])
+    return 'ok', loan
+
+def return_book_atomic(patron_id: str, book_id: int, return_date: datetime) -> Tuple[str, Optional[Dict]]:
+    """
+    Return a borrowed copy of a book in a single IMMEDIATE transaction.
+
+    Stamps the return date on the patron's oldest active loan for the book
+    and gives the copy back (never above total_copies), with one commit.
+    Returns (outcome, loan) where outcome is 'ok', 'not_borrowed',
+    'not_found' or 'error'; loan is the returned borrow record when 'ok'.
+    """
+    try:
+        with transaction() as conn:
+            outcome, loan = _return_copy(conn, patron_id, book_id, return_date)
+    except sqlite3.Error:
+        return 'error', None
+    if outcome == 'ok':
+        _after_circulation((book_id,))
+    return outcome, loan
+
+def return_books_batch(patron_id: str, book_ids: Sequence[int],
+                       return_date: datetime) -> List[Tuple[int, str, Optional[Dict]]]:
+    """
+    Return several books for one patron in a single IMMEDIATE transaction.
+
+    Returns one (book_id, outcome, loan) per requested id, in order, with
+    the outcomes of return_book_atomic(). Listing an id twice returns two
+    copies if the patron holds two; every item is 'error' if the
+    transaction fails.
+    """
+    results: List[Tuple[int, str, Optional[Dict]]] = []
+    try:
+        with transaction() as conn:
+            for book_id in book_ids:
+                outcome, loan = _return_copy(conn, patron_id, book_id, return_date)
+                results.append((book_id, outcome, loan))
+    except sqlite3.Error:
+        return [(book_id, 'error', None) for book_id in book_ids]
+    _after_circulation(book_id for book_id, outcome, _ in results if outcome == 'ok')
+    return results
+
+def reserve_idempotency_key(key: str, operation: str, fingerprint: str, now: float,
+                            ttl: float, pending_timeout: float) -> Tuple[bool, Optional[Dict]]:
+    """
+    Claim an idempotency key for a new request.
+
+    Expired rows (older than ttl) and abandoned pending rows (older than
+    pending_timeout) are cleared first. Returns (True, None) if the key
+    was claimed as 'pending', otherwise (False, row) with the existing
+    row for the caller to replay or wait on.
+    """
+    with transaction() as conn:
         conn.execute('''
-            UPDATE borrow_records 
-            SET return_date = ? 
-            WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
-        ''', (return_date.isoformat(), patron_id, book_id))
-        conn.commit()
-        conn.close()
-        return True
-    except Exception as e:
-        conn.close()
-        return False
-    
\ No newline at end of file
+            DELETE FROM idempotency_keys
+            WHERE key = ? AND (created_at < ? OR (status = 'pending' AND created_at < ?))
+        ''', (key, now - ttl, now - pending_timeout))
+        claimed = conn.execute('''
+            INSERT OR IGNORE INTO idempotency_keys (key, operation, fingerprint, status, created_at)
+            VALUES (?, ?, ?, 'pending', ?)
+        ''', (key, operation, fingerprint, now)).rowcount
+        if claimed:
+            return True, None
+        row = conn.execute('SELECT * FROM idempotency_keys WHERE key = ?', (key,)).fetchone()
+        return False, dict(row)
+
+def get_idempotency_record(key: str) -> Optional[Dict]:
+    """Get the stored row for an idempotency key."""
+    with db_session() as conn:
+        row = conn.execute('SELECT * FROM idempotency_keys WHERE key = ?', (key,)).fetchone()
+        return dict(row) if row else None
+
+def complete_idempotency_key(key: str, response: str):
+    """Store the JSON response for a claimed key and mark it done."""
+    with transaction() as conn:
+        conn.execute('''
+            UPDATE idempotency_keys SET status = 'done', response = ?
+            WHERE key = ? AND status = 'pending'
+        ''', (response, key))
+
+def release_idempotency_key(key: str):
+    """Drop a pending claim so the request can be retried."""
+    with transaction() as conn:
+        conn.execute("DELETE FROM idempotency_keys WHERE key = ? AND status = 'pending'", (key,))
+
+def purge_idempotency_keys(before: float) -> int:
+    """Delete idempotency keys created before the given epoch time; returns the count."""
+    with transaction() as conn:
+        return conn.execute('DELETE FROM idempotency_keys WHERE created_at < ?', (before,)).rowcount
+
+def claim_fee_settlements(as_of: str, loan_fees: Sequence[Tuple[int, str, float]],
+                          now: float) -> List[Dict]:
+    """
+    Record a pending settlement per patron for the late fees nobody has claimed yet.
+
+    loan_fees holds (loan_id, patron_id, fee accrued up to as_of) tuples. A
+    loan's earlier settlements claim their amounts unless they failed, so
+    only the rest of each fee is charged again, and a fee that kept accruing
+    is only charged for the new days. Runs in one IMMEDIATE transaction, so
+    concurrent runs never claim the same fee twice. Returns
+    {'id', 'patron_id', 'amount'} dicts in patron order.
+    """
+    claimed: Dict[int, float] = {}
+    owed: Dict[str, List[Tuple[int, float]]] = {}
+    with transaction() as conn:
+        for start in range(0, len(loan_fees), 500):
+            batch = [loan[0] for loan in loan_fees[start:start + 500]]
+            placeholders = ','.join('?' * len(batch))
+            claimed.update(conn.execute(f'''
+                SELECT fsl.loan_id, SUM(fsl.amount)
+                FROM fee_settlement_loans fsl
+                JOIN fee_settlements fs ON fs.id = fsl.settlement_id
+                WHERE fsl.loan_id IN ({placeholders}) AND fs.status != 'failed'
+                GROUP BY fsl.loan_id
+            ''', batch).fetchall())
+        for loan_id, patron_id, fee in loan_fees:
+            amount = round(fee - claimed.get(loan_id, 0.0), 2)
+            if amount > 0:
+                owed.setdefault(patron_id, []).append((loan_id, amount))
+        settlements: List[Dict] = []
+        for patron_id in sorted(owed):
+            amount = round(sum(part for _, part in owed[patron_id]), 2)
+            settlement_id = conn.execute('''
+                INSERT INTO fee_settlements (patron_id, as_of, amount, status, created_at)
+                VALUES (?, ?, ?, 'pending', ?)
+            ''', (patron_id, as_of, amount, now)).lastrowid
+            conn.executemany(
+                'INSERT INTO fee_settlement_loans (loan_id, settlement_id, amount) VALUES (?, ?, ?)',
+                [(loan_id, settlement_id, part) for loan_id, part in owed[patron_id]])
+            settlements.append({'id': settlement_id, 'patron_id': patron_id, 'amount': amount})
+    return settlements
+
+def finish_fee_settlements(outcomes: Iterable[Tuple[int, str, Optional[str]]]):
+    """Store (settlement id, status, transaction id) for settlements the gateway answered."""
+    with transaction() as conn:
+        conn.executemany('''
+            UPDATE fee_settlements SET status = ?, transaction_id = ?
+            WHERE id = ? AND status = 'pending'
+        ''', [(status, transaction_id, settlement_id) for settlement_id, status, transaction_id in outcomes])
+
+def get_fee_settlements(patron_id: str) -> List[Dict]:
+    """Get a patron's settlements, newest first."""
+    with read_session(snapshot=False) as conn:
+        rows = conn.execute('''
+            SELECT id, patron_id, as_of, amount, status, transaction_id, created_at
+            FROM fee_settlements WHERE patron_id = ? ORDER BY id DESC
+        ''', (patron_id,)).fetchall()
+        return [dict(row) for row in rows]
@@ -0,0 +1,195 @@
+"""
+Instrumentation for Library Management System
+Per-request timing, SQL statement timing and connection counts, recorded
+into the metrics registry served at /metrics, plus a slow-query log.
+"""
+
+import logging
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from flask import request
+
+from .metrics import REGISTRY, Counter, LabeledHistogram
+
+SLOW_QUERY_MS = 100.0 # Statements slower than this are logged (SLOW_QUERY_MS config)
+QUERY_COUNT_WARNING = 50 # Requests running more statements than this are logged (possible N+1)
+
+logger = logging.getLogger('app.sql')
+
+# Small-count buckets for statements per request
+_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+
+REQUEST_DURATION = REGISTRY.register(LabeledHistogram(
+    'library_http_request_duration_seconds', 'Time spent handling a request, by endpoint.',
+    ('endpoint', 'method', 'status')))
+REQUEST_QUERIES = REGISTRY.register(LabeledHistogram(
+    'library_http_request_queries', 'SQL statements executed per request, by endpoint.',
+    ('endpoint',), buckets=_COUNT_BUCKETS))
+REQUEST_DB_TIME = REGISTRY.register(LabeledHistogram(
+    'library_http_request_db_seconds', 'Time spent in SQLite per request, by endpoint.',
+    ('endpoint',)))
+QUERY_DURATION = REGISTRY.register(LabeledHistogram(
+    'library_db_query_duration_seconds', 'SQL statement execution time (to the first row), by statement kind.',
+    ('statement',)))
+SLOW_QUERIES = REGISTRY.register(Counter(
+    'library_db_slow_queries_total', 'Statements slower than the slow-query threshold.', ('statement',)))
+CONNECTIONS_OPENED = REGISTRY.register(Counter(
+    'library_db_connections_opened_total', 'New SQLite connections opened by the pool.'))
+CONNECTIONS_CHECKED_OUT = REGISTRY.register(Counter(
+    'library_db_connection_checkouts_total', 'Connections checked out of the pool.'))
+
+_slow_query_seconds = SLOW_QUERY_MS / 1000
+_query_count_warning = QUERY_COUNT_WARNING
+
+class _RequestStats(threading.local):
+    # Counters for the request running on this thread (None outside requests).
+    def __init__(self):
+        self.active = False
+        self.started = 0.0
+        self.queries = 0
+        self.db_seconds = 0.0
+
+_current = _RequestStats()
+
+_KIND_PATTERNS = (
+    re.compile(r'^\s*(SELECT)\b.*?\bFROM\s+(\w+)', re.IGNORECASE | re.DOTALL),
+    re.compile(r'^\s*(INSERT)\b.*?\bINTO\s+(\w+)', re.IGNORECASE | re.DOTALL),
+    re.compile(r'^\s*(UPDATE)\s+(?:OR\s+\w+\s+)?(\w+)', re.IGNORECASE),
+    re.compile(r'^\s*(DELETE)\s+FROM\s+(\w+)', re.IGNORECASE),
+)
+_kind_cache = {}
+
+def statement_kind(sql: str) -> str:
+    """Label a statement by verb and main table ("select books"), keeping label cardinality low."""
+    kind = _kind_cache.get(sql)
+    if kind is None:
+        for pattern in _KIND_PATTERNS:
+            match = pattern.match(sql)
+            if match:
+                kind = f'{match.group(1)} {match.group(2)}'.lower()
+                break
+        else:
+            word = sql.split(None, 1)
+            kind = word[0].lower() if word else 'empty'
+        if len(_kind_cache) < 4096:
+            _kind_cache[sql] = kind
+    return kind
+
+def record_query(sql: str, seconds: float):
+    """Record one executed statement."""
+    kind = statement_kind(sql)
+    QUERY_DURATION.observe(seconds, kind)
+    if _current.active:
+        _current.queries += 1
+        _current.db_seconds += seconds
+    if seconds >= _slow_query_seconds:
+        SLOW_QUERIES.inc(kind)
+        # Only requests log: CLI imports, migrations and background refreshes
+        # run long bulk statements on purpose and would flood stderr
+        if _current.active:
+            logger.warning('Slow query (%.1f ms, endpoint %s): %s', seconds * 1000, request.endpoint,
+                           ' '.join(sql.split())[:500])
+
+def record_fetch(seconds: float):
+    """Add row-fetching time to the current request's database time."""
+    if _current.active:
+        _current.db_seconds += seconds
+
+def record_connection_opened():
+    CONNECTIONS_OPENED.inc()
+
+def record_connection_checkout():
+    CONNECTIONS_CHECKED_OUT.inc()
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that times its statements and row fetches."""
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record_query(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record_query(sql, time.perf_counter() - started)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            record_fetch(time.perf_counter() - started)
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        try:
+            return super().fetchmany(self.arraysize if size is None else size)
+        finally:
+            record_fetch(time.perf_counter() - started)
+
+    def fetchall(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            record_fetch(time.perf_counter() - started)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors, including the ones behind conn.execute(), are instrumented."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # sqlite3 builds the cursor for these shortcuts in C, bypassing cursor()
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def _before_request():
+    _current.active = True
+    _current.started = time.perf_counter()
+    _current.queries = 0
+    _current.db_seconds = 0.0
+
+def _after_request(response):
+    if _current.active:
+        endpoint = request.endpoint or 'unmatched'
+        REQUEST_DURATION.observe(time.perf_counter() - _current.started, endpoint,
+                                 request.method, str(response.status_code))
+        REQUEST_QUERIES.observe(_current.queries, endpoint)
+        REQUEST_DB_TIME.observe(_current.db_seconds, endpoint)
+        if _current.queries > _query_count_warning:
+            logger.warning('%s %s ran %d SQL statements (possible N+1)', request.method,
+                           request.path, _current.queries)
+        _current.active = False
+    return response
+
+def _teardown_request(exception=None):
+    # Requests that raised never reach after_request
+    if _current.active:
+        endpoint = request.endpoint or 'unmatched'
+        REQUEST_DURATION.observe(time.perf_counter() - _current.started, endpoint, request.method, '500')
+        _current.active = False
+
+def init_app(app):
+    """Time every request of the app and apply its SLOW_QUERY_MS / QUERY_COUNT_WARNING settings."""
+    global _slow_query_seconds, _query_count_warning
+    _slow_query_seconds = float(app.config.get('SLOW_QUERY_MS', SLOW_QUERY_MS)) / 1000
+    _query_count_warning = int(app.config.get('QUERY_COUNT_WARNING', QUERY_COUNT_WARNING))
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
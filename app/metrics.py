@@ -0,0 +1,223 @@
+"""
+Metrics module for Library Management System
+Thread-safe counters and latency histograms with cumulative (Prometheus-style)
+buckets, and a registry that renders them in the Prometheus text format
+"""
+
+import bisect
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Upper bounds in seconds, from sub-millisecond lookups to multi-second gateway calls
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                           0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """
+    A fixed-bucket histogram of observed values.
+
+    Each observation lands in the first bucket whose upper bound is >= the
+    value, or in the implicit +Inf bucket. Counts are kept per bucket and
+    reported cumulatively, together with the total count and sum.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.buckets: List[float] = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """Record one value."""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile (0..1) as the upper bound of the bucket holding it."""
+        with self._lock:
+            counts = list(self._counts)
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        running = 0
+        for bound, count in zip(self.buckets + [float('inf')], counts):
+            running += count
+            if running >= rank:
+                return bound
+        return float('inf')
+
+    def snapshot(self) -> Dict:
+        """Return cumulative bucket counts, count, sum and p50/p95/p99 estimates."""
+        with self._lock:
+            counts = list(self._counts)
+            total_sum = self._sum
+        cumulative = []
+        running = 0
+        for bound, count in zip(self.buckets + [float('inf')], counts):
+            running += count
+            cumulative.append(('+Inf' if bound == float('inf') else bound, running))
+        return {
+            'buckets': cumulative,
+            'count': running,
+            'sum': round(total_sum, 6),
+            'p50': _json_bound(self.quantile(0.5)),
+            'p95': _json_bound(self.quantile(0.95)),
+            'p99': _json_bound(self.quantile(0.99)),
+        }
+
+
+def _json_bound(value: Optional[float]):
+    # JSON has no infinity; report the overflow bucket by its Prometheus label
+    return '+Inf' if value == float('inf') else value
+
+
+# Labels added to every sample this process renders (see set_process_labels)
+_process_labels: Tuple[Tuple[str, str], ...] = ()
+
+def set_process_labels(**labels: str):
+    """
+    Add these labels to every sample this process renders.
+
+    A pre-fork server sets worker="<pid>" in each worker: workers keep their
+    own counters, so without it a scrape landing on another worker would
+    look like the same series jumping backwards.
+    """
+    global _process_labels
+    _process_labels = tuple(sorted(labels.items()))
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in _process_labels]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing count, optionally split by label values."""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values: str) -> float:
+        with self._lock:
+            return self._values.get(label_values, 0)
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f'{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}')
+        return lines
+
+
+class Gauge:
+    """A point-in-time value read from a callback when metrics are rendered."""
+
+    def __init__(self, name: str, help_text: str,
+                 collect: Callable[[], Iterable[Tuple[Tuple[str, ...], float]]],
+                 label_names: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge']
+        for labels, value in self._collect():
+            lines.append(f'{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}')
+        return lines
+
+
+class LabeledHistogram:
+    """A family of Histograms, one per combination of label values."""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._children: Dict[Tuple[str, ...], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *label_values: str) -> Histogram:
+        """Get (creating on first use) the histogram for these label values."""
+        child = self._children.get(label_values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(label_values, Histogram(self.buckets))
+        return child
+
+    def observe(self, value: float, *label_values: str):
+        self.labels(*label_values).observe(value)
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            children = sorted(self._children.items())
+        for labels, histogram in children:
+            lines.extend(render_histogram(self.name, histogram, self.label_names, labels))
+        return lines
+
+
+def render_histogram(name: str, histogram: Histogram, label_names: Sequence[str] = (),
+                     label_values: Sequence[str] = ()) -> List[str]:
+    """Render one Histogram as Prometheus _bucket/_sum/_count sample lines."""
+    snapshot = histogram.snapshot()
+    lines = []
+    for bound, count in snapshot['buckets']:
+        le = f'le="{bound if bound == "+Inf" else _format_value(bound)}"'
+        lines.append(f'{name}_bucket{_format_labels(label_names, label_values, le)} {count}')
+    labels = _format_labels(label_names, label_values)
+    lines.append(f'{name}_sum{labels} {_format_value(snapshot["sum"])}')
+    lines.append(f'{name}_count{labels} {snapshot["count"]}')
+    return lines
+
+
+class Registry:
+    """An ordered set of metrics rendered together for /metrics."""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Add a metric (anything with .name and .render()) and return it."""
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Render every registered metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide registry served by /metrics
+REGISTRY = Registry()
@@ -0,0 +1,396 @@
+"""
+Schema Migrations for Library Management System
+Applies ordered, versioned schema changes and tracks the applied version
+in SQLite's PRAGMA user_version.
+"""
+
+import sqlite3
+from typing import Callable, Dict, List, Tuple
+
+def _create_base_tables(conn: sqlite3.Connection):
+    """Create the books and borrow_records tables."""
+    # Create books table
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS books (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            author TEXT NOT NULL,
+            isbn TEXT UNIQUE NOT NULL,
+            total_copies INTEGER NOT NULL,
+            available_copies INTEGER NOT NULL
+        )
+    ''')
+
+    # Create borrow_records table
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS borrow_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            borrow_date TEXT NOT NULL,
+            due_date TEXT NOT NULL,
+            return_date TEXT,
+            FOREIGN KEY (book_id) REFERENCES books (id)
+        )
+    ''')
+
+def _index_borrow_records(conn: sqlite3.Connection):
+    """Index borrow_records for loan counts, active-loan lookups and returns."""
+    # Active loans only: serves loan counts, borrowed-book lists and returns
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_active
+        ON borrow_records (patron_id, book_id) WHERE return_date IS NULL
+    ''')
+    # Full borrowing history per patron
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_patron
+        ON borrow_records (patron_id, borrow_date)
+    ''')
+    # Loans per book
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_book
+        ON borrow_records (book_id)
+    ''')
+
+def _create_books_fts(conn: sqlite3.Connection):
+    """Full-text index over book titles and authors, kept in sync by triggers."""
+    # The trigram tokenizer matches any substring of 3+ characters, case-insensitively
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+                title, author, content='books', content_rowid='id', tokenize='trigram'
+            )
+        ''')
+    except sqlite3.OperationalError:
+        # SQLite built without FTS5 or trigram (< 3.34): searches fall back to substring scans
+        return
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author)
+            VALUES ('delete', old.id, old.title, old.author);
+        END
+    ''')
+    # Only title/author edits touch the index, not availability changes
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_update AFTER UPDATE OF title, author ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author)
+            VALUES ('delete', old.id, old.title, old.author);
+            INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END
+    ''')
+    conn.execute("INSERT INTO books_fts (books_fts) VALUES ('rebuild')")
+
+def _index_books_title(conn: sqlite3.Connection):
+    """Index books in catalog order for keyset pagination."""
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_books_title
+        ON books (title, id)
+    ''')
+
+def _pausable_books_fts_insert(conn: sqlite3.Connection):
+    """Let bulk loads skip the per-row FTS trigger and index each chunk in one statement."""
+    if not conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'books_fts'"
+    ).fetchone():
+        return
+    # A row here pauses the insert trigger; bulk loads add and remove it inside
+    # their own write transaction, so no other connection ever sees it
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS books_fts_pause (paused INTEGER PRIMARY KEY)
+    ''')
+    conn.execute('DROP TRIGGER IF EXISTS books_fts_insert')
+    conn.execute('''
+        CREATE TRIGGER books_fts_insert AFTER INSERT ON books
+        WHEN NOT EXISTS (SELECT 1 FROM books_fts_pause) BEGIN
+            INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END
+    ''')
+
+def _create_idempotency_keys(conn: sqlite3.Connection):
+    """Store the outcome of payment/refund requests by client idempotency key."""
+    # status is 'pending' while the first request is talking to the gateway,
+    # then 'done' with the JSON response that replays return
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            key TEXT PRIMARY KEY,
+            operation TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            status TEXT NOT NULL,
+            response TEXT,
+            created_at REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    # Expiry sweeps
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created
+        ON idempotency_keys (created_at)
+    ''')
+
+def _add_epoch_date_columns(conn: sqlite3.Connection):
+    """Integer epoch-second copies of the loan dates, with active loans indexed by due date."""
+    # Generated from the ISO TEXT columns, so every writer keeps them in sync;
+    # VIRTUAL columns cost nothing to store and can still be indexed (SQLite 3.31+)
+    if sqlite3.sqlite_version_info < (3, 31, 0):
+        raise RuntimeError(f"SQLite 3.31 or newer is required (found {sqlite3.sqlite_version})")
+    for name, source in (('borrow_ts', 'borrow_date'), ('due_ts', 'due_date'), ('return_ts', 'return_date')):
+        conn.execute(f'''
+            ALTER TABLE borrow_records ADD COLUMN {name} INTEGER
+            GENERATED ALWAYS AS (CAST(strftime('%s', {source}) AS INTEGER)) VIRTUAL
+        ''')
+    # Overdue sweeps: a range scan over active loans instead of parsing every row
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_active_due
+        ON borrow_records (due_ts) WHERE return_date IS NULL
+    ''')
+
+def _order_active_loans_by_borrow_date(conn: sqlite3.Connection):
+    """Key the active-loan index by (patron_id, borrow_date, book_id)."""
+    # Loan lists and returns both want a patron's active loans oldest first;
+    # without borrow_date in this index the planner picks idx_borrow_records_patron
+    # for them (it does on empty statistics) and filters every past loan
+    conn.execute('DROP INDEX IF EXISTS idx_borrow_records_active')
+    conn.execute('''
+        CREATE INDEX idx_borrow_records_active
+        ON borrow_records (patron_id, borrow_date, book_id) WHERE return_date IS NULL
+    ''')
+
+def _create_catalog_version(conn: sqlite3.Connection):
+    """A one-row catalog version that triggers bump on every write to books or borrow_records."""
+    # Triggers see every writer: the app, CLI imports and scripts using plain sqlite3.
+    # tag is random per database, so a restored or replaced file never repeats a version
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            tag TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            modified REAL NOT NULL
+        )
+    ''')
+    conn.execute('''
+        INSERT OR IGNORE INTO catalog_version (id, tag, version, modified)
+        VALUES (1, lower(hex(randomblob(4))), 0, (julianday('now') - 2440587.5) * 86400.0)
+    ''')
+    for table in ('books', 'borrow_records'):
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS catalog_version_{table}_{event.lower()}
+                AFTER {event} ON {table} BEGIN
+                    UPDATE catalog_version
+                    SET version = version + 1, modified = (julianday('now') - 2440587.5) * 86400.0;
+                END
+            ''')
+
+def _create_fee_settlements(conn: sqlite3.Connection):
+    """Record batch late-fee settlements and the part of each loan's fee they charged."""
+    # status: 'pending' from the claim until the gateway answers, then 'settled',
+    # 'failed' (declined or never sent; the fee can be charged again) or
+    # 'unknown' (timed out or errored mid-call; held for reconciliation).
+    # Only 'failed' rows release their loans' fees to later runs.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS fee_settlements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patron_id TEXT NOT NULL,
+            as_of TEXT NOT NULL,
+            amount REAL NOT NULL,
+            status TEXT NOT NULL,
+            transaction_id TEXT,
+            created_at REAL NOT NULL
+        )
+    ''')
+    # A loan's fee accrued up to as_of, minus what earlier settlements already claimed
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS fee_settlement_loans (
+            loan_id INTEGER NOT NULL,
+            settlement_id INTEGER NOT NULL REFERENCES fee_settlements (id),
+            amount REAL NOT NULL,
+            PRIMARY KEY (loan_id, settlement_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_fee_settlements_patron
+        ON fee_settlements (patron_id, as_of)
+    ''')
+
+def _drop_borrow_records_statistics(conn: sqlite3.Connection):
+    """Forget the borrow_records statistics earlier migrations gathered."""
+    # Migrations 2, 7 and 8 ran ANALYZE on whatever the table held at the
+    # time (one loan in the shipped library.db), and those frozen row counts
+    # steered the planner to full scans as the table grew. The hot
+    # statements now name their index (INDEXED BY) instead.
+    if conn.execute("SELECT 1 FROM sqlite_schema WHERE name = 'sqlite_stat1'").fetchone():
+        conn.execute("DELETE FROM sqlite_stat1 WHERE tbl = 'borrow_records'")
+
+# Ordered list of (version, description, apply function). Append only.
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, 'Create books and borrow_records tables', _create_base_tables),
+    (2, 'Index borrow_records by patron, book and active loans', _index_borrow_records),
+    (3, 'Full-text index books_fts over title and author', _create_books_fts),
+    (4, 'Index books by (title, id) for catalog paging', _index_books_title),
+    (5, 'Pausable books_fts insert trigger for bulk loads', _pausable_books_fts_insert),
+    (6, 'Idempotency keys for payments and refunds', _create_idempotency_keys),
+    (7, 'Epoch date columns and due-date index for active loans', _add_epoch_date_columns),
+    (8, 'Order the active-loan index by borrow date', _order_active_loans_by_borrow_date),
+    (9, 'Catalog version row bumped by triggers on books and borrow_records', _create_catalog_version),
+    (10, 'Fee settlements and the loan fees each one charged', _create_fee_settlements),
+    (11, 'Drop stale borrow_records planner statistics', _drop_borrow_records_statistics),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Get the schema version recorded in the database."""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def apply_migrations(conn: sqlite3.Connection) -> List[int]:
+    """
+    Apply every migration newer than the database's schema version.
+
+    Each migration runs in its own IMMEDIATE transaction together with the
+    version bump, so concurrent starters never apply the same step twice.
+    Returns the versions that were applied.
+    """
+    # Up to date (every start after the first): a single PRAGMA read
+    if get_schema_version(conn) >= LATEST_VERSION:
+        return []
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        if get_schema_version(conn) >= version:
+            continue
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Another process may have migrated while we waited for the lock
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            migrate(conn)
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+# Hot borrow_records statements. database.py executes these exact strings and
+# check_query_plans() explains them, so the checked plans are the served ones.
+# Each names its index: without statistics (or with stale ones) the planner
+# may otherwise pick a full scan, and a missing index fails loudly instead.
+ACTIVE_LOAN_COUNT_SQL = '''
+    SELECT COUNT(*) as count FROM borrow_records INDEXED BY idx_borrow_records_active
+    WHERE patron_id = ? AND return_date IS NULL
+'''
+
+PATRON_LOANS_SQL = '''
+    SELECT br.book_id, b.title, b.author, br.borrow_date, br.due_date,
+           br.due_ts < ? as is_overdue
+    FROM borrow_records br INDEXED BY idx_borrow_records_active
+    JOIN books b ON br.book_id = b.id
+    WHERE br.patron_id = ? AND br.return_date IS NULL
+    ORDER BY br.borrow_date
+'''
+
+# Stamps the patron's oldest active loan for a book
+RETURN_LOAN_SQL = '''
+    UPDATE borrow_records SET return_date = ?
+    WHERE id = (
+        SELECT id FROM borrow_records INDEXED BY idx_borrow_records_active
+        WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+        ORDER BY borrow_date LIMIT 1
+    )
+    RETURNING id, patron_id, book_id, borrow_date, due_date, return_date
+'''
+
+PATRON_HISTORY_SQL = '''
+    SELECT br.id, br.patron_id, br.book_id, br.borrow_date, br.due_date, br.return_date,
+           b.title, b.author
+    FROM borrow_records br INDEXED BY idx_borrow_records_patron
+    JOIN books b ON b.id = br.book_id
+    WHERE br.patron_id = ?
+    ORDER BY br.borrow_date DESC, br.id DESC
+    LIMIT ?
+'''
+
+# Next history page: records before the (borrow_date, id) of the previous page's last one
+PATRON_HISTORY_BEFORE_SQL = '''
+    SELECT br.id, br.patron_id, br.book_id, br.borrow_date, br.due_date, br.return_date,
+           b.title, b.author
+    FROM borrow_records br INDEXED BY idx_borrow_records_patron
+    JOIN books b ON b.id = br.book_id
+    WHERE br.patron_id = ? AND (br.borrow_date, br.id) < (?, ?)
+    ORDER BY br.borrow_date DESC, br.id DESC
+    LIMIT ?
+'''
+
+OVERDUE_LOANS_SQL = '''
+    SELECT id, patron_id, book_id, due_date, ? - due_ts / 86400 as days_overdue
+    FROM borrow_records INDEXED BY idx_borrow_records_active_due
+    WHERE return_date IS NULL AND due_ts < ?
+'''
+
+# The same sweep for a batch of patrons; database.py appends the IN list
+PATRON_OVERDUE_LOANS_SQL = '''
+    SELECT id, patron_id, book_id, due_date, ? - due_ts / 86400 as days_overdue
+    FROM borrow_records INDEXED BY idx_borrow_records_active
+    WHERE return_date IS NULL AND due_ts < ? AND patron_id IN '''
+
+# name -> (statement, sample parameters, index its plan must search)
+HOT_QUERIES: Dict[str, Tuple[str, tuple, str]] = {
+    'patron_borrow_count': (ACTIVE_LOAN_COUNT_SQL, ('000000',), 'idx_borrow_records_active'),
+    'patron_borrowed_books': (PATRON_LOANS_SQL, (0, '000000'), 'idx_borrow_records_active'),
+    'return_loan': (RETURN_LOAN_SQL, ('', '000000', 0), 'idx_borrow_records_active'),
+    'patron_history': (PATRON_HISTORY_SQL, ('000000', 50), 'idx_borrow_records_patron'),
+    'patron_history_page': (PATRON_HISTORY_BEFORE_SQL, ('000000', '', 0, 50), 'idx_borrow_records_patron'),
+    'overdue_loans': (OVERDUE_LOANS_SQL, (0, 0), 'idx_borrow_records_active_due'),
+    'patron_overdue_loans': (PATRON_OVERDUE_LOANS_SQL + '(?, ?)', (0, 0, '000000', '000001'),
+                             'idx_borrow_records_active'),
+}
+
+def explain_query_plan(conn: sqlite3.Connection, sql: str, params: tuple = ()) -> List[str]:
+    """Get the EXPLAIN QUERY PLAN detail lines for a statement."""
+    rows = conn.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+    return [row[3] for row in rows]
+
+def check_query_plans(conn: sqlite3.Connection) -> Dict[str, Dict]:
+    """
+    Run EXPLAIN QUERY PLAN over HOT_QUERIES.
+
+    Returns {name: {'plan': [...], 'index': str, 'uses_index': bool}} where
+    uses_index is True only if borrow_records is searched through the
+    expected index and no step is a full SCAN.
+    """
+    report = {}
+    for name, (sql, params, index) in HOT_QUERIES.items():
+        plan = explain_query_plan(conn, sql, params)
+        report[name] = {
+            'plan': plan,
+            'index': index,
+            'uses_index': (any(f'USING INDEX {index} ' in step for step in plan)
+                           and not any(step.startswith('SCAN ') for step in plan)),
+        }
+    return report
+
+
+if __name__ == '__main__':
+    from .config import load_config
+    from .database import ConnectionPool, configure
+
+    # Same database as the app: LIBRARY_PROFILE / LIBRARY_DB_PATH
+    settings = load_config()
+    configure(settings)
+    # A bare pool: get_pool() would check the schema (and refuse it) before we migrate
+    pool = ConnectionPool(settings['DATABASE'], max_size=1)
+    conn = pool.acquire()
+    try:
+        applied = apply_migrations(conn)
+        print(f"Schema version {get_schema_version(conn)} (applied: {applied or 'none'})")
+        for name, result in check_query_plans(conn).items():
+            status = 'OK' if result['uses_index'] else f"NOT {result['index']}"
+            print(f"{status:10} {name}: {'; '.join(result['plan'])}")
+    finally:
+        pool.release(conn)
+        pool.close_all()
@@ -0,0 +1,116 @@
+"""
+Row Models for Library Management System
+Compact slotted records for books and loans, built directly from query rows
+by a cursor row_factory. They behave as mutable mappings, so services,
+templates and JSON responses keep treating them like the dicts they replace.
+"""
+
+from collections.abc import MutableMapping
+from datetime import datetime
+from typing import Dict, Tuple
+
+from flask.json.provider import DefaultJSONProvider
+
+
+class Record(MutableMapping):
+    """
+    A fixed set of named fields stored in __slots__, with dict-style access.
+
+    Subclasses list their fields in _fields (also their __slots__). Query
+    column order must match _fields for from_row(); see columns().
+    """
+
+    __slots__ = ()
+    _fields: Tuple[str, ...] = ()
+
+    def __init__(self, *values, **named):
+        if len(values) > len(self._fields):
+            raise TypeError(f"{type(self).__name__} takes {len(self._fields)} fields")
+        for name, value in zip(self._fields, values):
+            setattr(self, name, value)
+        for name in self._fields[len(values):]:
+            setattr(self, name, named.pop(name, None))
+        if named:
+            raise TypeError(f"{type(self).__name__} has no field {next(iter(named))!r}")
+
+    @classmethod
+    def from_row(cls, cursor, row):
+        """sqlite3 row_factory building one instance per row."""
+        return cls(*row)
+
+    @classmethod
+    def columns(cls, alias: str = '') -> str:
+        """SELECT list matching the field order, optionally qualified by a table alias."""
+        prefix = f'{alias}.' if alias else ''
+        return ', '.join(prefix + name for name in cls._fields)
+
+    def __getitem__(self, key):
+        if key not in self._fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self._fields:
+            raise KeyError(f"{type(self).__name__} has no field {key!r}")
+        setattr(self, key, value)
+
+    def __delitem__(self, key):
+        raise TypeError(f"{type(self).__name__} fields cannot be deleted")
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __contains__(self, key):
+        return key in self._fields
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self._fields)
+        return f'{type(self).__name__}({fields})'
+
+    def copy(self):
+        """A shallow copy of the record."""
+        return type(self)(*(getattr(self, name) for name in self._fields))
+
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self._fields}
+
+
+class Book(Record):
+    """A row of the books table."""
+
+    _fields = ('id', 'title', 'author', 'isbn', 'total_copies', 'available_copies')
+    __slots__ = _fields
+
+
+class Loan(Record):
+    """An active loan with its book, as listed for a patron."""
+
+    _fields = ('book_id', 'title', 'author', 'borrow_date', 'due_date', 'is_overdue')
+    __slots__ = _fields
+
+    @classmethod
+    def from_row(cls, cursor, row):
+        # Dates are stored as ISO text; is_overdue comes back from SQL as 0/1
+        book_id, title, author, borrow_date, due_date, is_overdue = row
+        return cls(book_id, title, author, datetime.fromisoformat(borrow_date),
+                   datetime.fromisoformat(due_date), bool(is_overdue))
+
+
+class BorrowRecord(Record):
+    """A borrow_records row with its book's title and author (patron history)."""
+
+    _fields = ('id', 'patron_id', 'book_id', 'borrow_date', 'due_date', 'return_date', 'title', 'author')
+    __slots__ = _fields
+
+
+class RecordJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that serializes records as objects."""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, Record):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
@@ -2,12 +2,26 @@
 API Routes - JSON API endpoints
 """
 
-from flask import Blueprint, jsonify, request
-from ..services.library_service import calculate_late_fee_for_book, search_books_in_catalog
+import io
+import os
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from ..services.library_service import (
+    calculate_late_fee_for_book, search_books_in_catalog, get_catalog_page, CATALOG_PAGE_SIZE,
+    borrow_books_by_patron, return_books_by_patron, pay_late_fees, refund_late_fee_payment
+)
+from ..services.import_service import import_books, IMPORT_FORMATS
+from ..services.export_service import export_table, validate_export, EXPORT_MIMETYPES
+from ..services.settlement_service import settle_late_fees, SETTLEMENT_WORKERS, SETTLEMENT_CALL_TIMEOUT
+from ..services.payment_service import get_payment_gateway
+from ..services.idempotency_service import (
+    pay_late_fees_idempotent, refund_late_fee_payment_idempotent, settle_late_fees_idempotent
+)
+from .conditional import conditional
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
 @api_bp.route('/late_fee/<patron_id>/<int:book_id>')
+@conditional(vary_by_day=True, snapshot=False)
 def get_late_fee(patron_id, book_id):
     """
     Calculate late fee for a specific book borrowed by a patron.
@@ -17,6 +31,7 @@ def get_late_fee(patron_id, book_id):
     return jsonify(result), 501 if 'not implemented' in result.get('status', '') else 200
 
 @api_bp.route('/search')
+@conditional()
 def search_books_api():
     """
     Search for books via API endpoint.
@@ -24,16 +39,203 @@ def search_books_api():
     """
     search_term = request.args.get('q', '').strip()
     search_type = request.args.get('type', 'title')
+    mode = request.args.get('mode', 'fts')
+    limit = request.args.get('limit', type=int)
     
     if not search_term:
         return jsonify({'error': 'Search term is required'}), 400
     
     # Use business logic function
-    books = search_books_in_catalog(search_term, search_type)
+    books = search_books_in_catalog(search_term, search_type, mode, limit)
     
     return jsonify({
         'search_term': search_term,
         'search_type': search_type,
+        'mode': mode,
         'results': books,
         'count': len(books)
     })
+
+@api_bp.route('/books')
+@conditional()
+def list_books_api():
+    """
+    Page through the catalog via API endpoint.
+    Keyset-paginated JSON interface for R2: Book Catalog Display
+    """
+    default_limit = current_app.config.get('CATALOG_PAGE_SIZE', CATALOG_PAGE_SIZE)
+    limit = request.args.get('limit', default_limit, type=int)
+    page = get_catalog_page(request.args.get('after'), request.args.get('before'), limit)
+    
+    if page['status'] != 'OK':
+        return jsonify({'error': page['status']}), 400
+    
+    return jsonify({
+        'books': page['books'],
+        'count': len(page['books']),
+        'limit': page['limit'],
+        'next_cursor': page['next_cursor'],
+        'prev_cursor': page['prev_cursor']
+    })
+
+@api_bp.route('/books/import', methods=['POST'])
+def import_books_api():
+    """
+    Bulk import books from an uploaded CSV or JSON Lines file.
+    Accepts a multipart 'file' field or the raw request body.
+    """
+    upload = request.files.get('file')
+    fmt = request.args.get('format')
+    if not fmt:
+        name = upload.filename if upload and upload.filename else ''
+        content_type = (upload.mimetype if upload else request.mimetype) or ''
+        fmt = 'jsonl' if name.endswith(('.jsonl', '.ndjson')) or 'json' in content_type else 'csv'
+    
+    if fmt not in IMPORT_FORMATS:
+        return jsonify({'error': f'Unsupported format: {fmt}'}), 400
+    
+    raw = upload.stream if upload else request.stream
+    stream = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+    report = import_books(stream, fmt)
+    
+    return jsonify(report)
+
+@api_bp.route('/borrow', methods=['POST'])
+def borrow_books_api():
+    """
+    Borrow several books for one patron in a single transaction.
+    Batch JSON interface for R2: Book Borrowing
+    Body: {"patron_id": "123456", "book_ids": [1, 2, 3]}
+    """
+    payload = request.get_json(silent=True) or {}
+    result = borrow_books_by_patron(str(payload.get('patron_id', '')).strip(), payload.get('book_ids'))
+    
+    if result['status'] != 'OK':
+        return jsonify({'error': result['status']}), 400
+    
+    return jsonify(result)
+
+@api_bp.route('/return', methods=['POST'])
+def return_books_api():
+    """
+    Return several books for one patron in a single transaction.
+    Batch JSON interface for R3: Book Return Processing
+    Body: {"patron_id": "123456", "book_ids": [1, 2, 3]}
+    """
+    payload = request.get_json(silent=True) or {}
+    result = return_books_by_patron(str(payload.get('patron_id', '')).strip(), payload.get('book_ids'))
+    
+    if result['status'] != 'OK':
+        return jsonify({'error': result['status']}), 400
+    
+    return jsonify(result)
+
+@api_bp.route('/export/<table>')
+def export_api(table):
+    """
+    Stream the books or borrow_records table as NDJSON (default) or CSV.
+    borrow_records accepts patron_id, since and until (YYYY-MM-DD, inclusive) filters.
+    """
+    fmt = request.args.get('format', 'ndjson')
+    patron_id = request.args.get('patron_id', '').strip() or None
+    since = request.args.get('since') or None
+    until = request.args.get('until') or None
+    
+    error = validate_export(table, fmt, patron_id, since, until)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    body = stream_with_context(export_table(table, fmt, patron_id, since, until))
+    extension = 'csv' if fmt == 'csv' else 'ndjson'
+    return Response(body, mimetype=EXPORT_MIMETYPES[fmt], headers={
+        'Content-Disposition': f'attachment; filename={table}.{extension}'
+    })
+
+@api_bp.route('/late_fees/settle', methods=['POST'])
+def settle_late_fees_api():
+    """
+    Charge outstanding late fees through the payment gateway, one call per patron.
+    Fees already charged by an earlier settlement are not charged again.
+    Body (optional): {"patron_ids": ["123456", ...]}; default is every patron with overdue loans.
+    Honours Idempotency-Key like /api/late_fees/pay: a retried batch replays the first run's results.
+    """
+    payload = request.get_json(silent=True) or {}
+    patron_ids = payload.get('patron_ids')
+    if patron_ids is not None and (not isinstance(patron_ids, list)
+                                   or not all(isinstance(pid, str) for pid in patron_ids)):
+        return jsonify({'error': 'patron_ids must be a list of strings'}), 400
+    key = request.headers.get('Idempotency-Key')
+    max_workers = current_app.config.get('SETTLEMENT_WORKERS', SETTLEMENT_WORKERS)
+    call_timeout = current_app.config.get('SETTLEMENT_CALL_TIMEOUT', SETTLEMENT_CALL_TIMEOUT)
+    
+    if key is not None:
+        result = settle_late_fees_idempotent(key, get_payment_gateway(), patron_ids,
+                                             max_workers=max_workers, call_timeout=call_timeout)
+    else:
+        result = settle_late_fees(get_payment_gateway(), patron_ids,
+                                  max_workers=max_workers, call_timeout=call_timeout)
+    
+    if result['status'] != 'OK':
+        return jsonify({'error': result['status']}), _payment_status_code(result)
+    
+    return jsonify(result)
+
+@api_bp.route('/gateway/status')
+def gateway_status_api():
+    """
+    Payment gateway client health: circuit breaker state, call counters
+    and latency histogram. Each server worker has its own client, so the
+    answering worker's pid is included.
+    """
+    return jsonify({**get_payment_gateway().stats(), 'worker': os.getpid()})
+
+@api_bp.route('/late_fees/pay', methods=['POST'])
+def pay_late_fees_api():
+    """
+    Charge the late fee for one loan.
+    Body: {"patron_id": "123456", "book_id": 1}. With an Idempotency-Key
+    header, retries of the same request replay the first result instead of
+    charging again.
+    """
+    payload = request.get_json(silent=True) or {}
+    patron_id = str(payload.get('patron_id', '')).strip()
+    book_id = payload.get('book_id')
+    key = request.headers.get('Idempotency-Key')
+    
+    if key is not None:
+        result = pay_late_fees_idempotent(key, patron_id, book_id, get_payment_gateway())
+    else:
+        result = pay_late_fees(patron_id, book_id, get_payment_gateway())
+    
+    return jsonify(result), _payment_status_code(result)
+
+@api_bp.route('/late_fees/refund', methods=['POST'])
+def refund_late_fee_api():
+    """
+    Refund a late fee payment.
+    Body: {"transaction_id": "...", "amount": 5.0}; honours Idempotency-Key
+    like /api/late_fees/pay.
+    """
+    payload = request.get_json(silent=True) or {}
+    transaction_id = str(payload.get('transaction_id', ''))
+    amount = payload.get('amount')
+    if not isinstance(amount, (int, float)) or isinstance(amount, bool):
+        return jsonify({'success': False, 'status': 'Invalid refund amount'}), 400
+    key = request.headers.get('Idempotency-Key')
+    
+    if key is not None:
+        result = refund_late_fee_payment_idempotent(key, transaction_id, amount, get_payment_gateway())
+    else:
+        result = refund_late_fee_payment(transaction_id, amount, get_payment_gateway())
+    
+    return jsonify(result), _payment_status_code(result)
+
+def _payment_status_code(result):
+    status = result.get('status', '')
+    if result.get('success'):
+        return 200
+    if 'idempotency key' in status.lower():
+        return 409 if 'in progress' in status else 422
+    if status.startswith(('Payment error', 'Refund error')):
+        return 502
+    return 400
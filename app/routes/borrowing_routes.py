@@ -14,18 +14,20 @@ def borrow_book():
     Web interface for R2: Book Borrowing
     """
     patron_id = request.form.get('patron_id', '').strip()
+    # Return to the catalog page the request came from
+    page_args = {key: request.form[key] for key in ('after', 'before', 'limit') if request.form.get(key)}
     
     try:
         book_id = int(request.form.get('book_id', ''))
     except (ValueError, TypeError):
         flash('Invalid book ID.', 'error')
-        return redirect(url_for('catalog.catalog'))
+        return redirect(url_for('catalog.catalog', **page_args))
     
     # Use business logic function
     success, message = borrow_book_by_patron(patron_id, book_id)
     
     flash(message, 'success' if success else 'error')
-    return redirect(url_for('catalog.catalog'))
+    return redirect(url_for('catalog.catalog', **page_args))
 
 @borrowing_bp.route('/return', methods=['GET', 'POST'])
 def return_book():
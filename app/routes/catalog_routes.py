@@ -2,9 +2,9 @@
 Catalog Routes - Book catalog related endpoints
 """
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash
-from ..services.library_service import add_book_to_catalog
-from ..database import get_all_books
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash
+from ..services.library_service import add_book_to_catalog, get_catalog_page, CATALOG_PAGE_SIZE
+from .conditional import conditional
 
 catalog_bp = Blueprint('catalog', __name__)
 
@@ -14,13 +14,21 @@ def index():
     return redirect(url_for('catalog.catalog'))
 
 @catalog_bp.route('/catalog')
+@conditional(skip_with_flashes=True)
 def catalog():
     """
-    Display all books in the catalog.
+    Display one page of books in the catalog.
     Implements R2: Book Catalog Display
     """
-    books = get_all_books()
-    return render_template('catalog.html', books=books)
+    default_limit = current_app.config.get('CATALOG_PAGE_SIZE', CATALOG_PAGE_SIZE)
+    limit = request.args.get('limit', default_limit, type=int)
+    page = get_catalog_page(request.args.get('after'), request.args.get('before'), limit)
+    if page['status'] != 'OK':
+        flash('Invalid page link; showing the first page.', 'error')
+        page = get_catalog_page(limit=limit)
+    # Keep the position so a borrow from this page redirects back to it
+    page_args = {key: request.args[key] for key in ('after', 'before', 'limit') if request.args.get(key)}
+    return render_template('catalog.html', books=page['books'], page=page, page_args=page_args)
 
 @catalog_bp.route('/add_book', methods=['GET', 'POST'])
 def add_book():
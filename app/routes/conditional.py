@@ -0,0 +1,38 @@
+"""
+Conditional Responses - ETag validation for read-only endpoints
+"""
+
+from datetime import date, datetime, timezone
+from functools import wraps
+from flask import make_response, request, session
+from ..database import get_catalog_version_info
+
+def conditional(vary_by_day: bool = False, skip_with_flashes: bool = False, snapshot: bool = True):
+    """
+    Decorator answering If-None-Match with 304 before the view runs.
+
+    The ETag comes from the catalog_version row, which every write to books
+    or borrow_records bumps (CLI imports and other processes included), so
+    a matching request costs one single-row read. vary_by_day adds today's
+    date for responses that change with time (late fees). skip_with_flashes
+    always renders pages that have pending flash messages to show.
+    snapshot=False is for views that read the live database rather than
+    the catalog snapshot.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            version, modified = get_catalog_version_info(snapshot)
+            etag = f'{version}-{date.today().isoformat()}' if vary_by_day else version
+            pending_flashes = skip_with_flashes and session.get('_flashes')
+            if not pending_flashes and etag in request.if_none_match:
+                response = make_response('', 304)
+                response.set_etag(etag)
+                return response
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+                response.last_modified = datetime.fromtimestamp(modified, timezone.utc)
+            return response
+        return wrapped
+    return decorator
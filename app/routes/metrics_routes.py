@@ -0,0 +1,51 @@
+"""
+Metrics Routes - Prometheus metrics endpoint
+"""
+
+from flask import Blueprint, Response
+from ..database import get_book_cache_stats, get_pool_stats, get_read_pool_stats
+from ..metrics import REGISTRY, Gauge, render_histogram
+from ..services.payment_service import CircuitBreaker, get_payment_gateway
+
+metrics_bp = Blueprint('metrics', __name__)
+
+def _pool_gauges():
+    stats = get_pool_stats()
+    return [(('in_use',), stats['in_use']), (('idle',), stats['idle']), (('max',), stats['max_size'])]
+
+def _read_pool_gauges():
+    stats = get_read_pool_stats()
+    return [(('in_use',), stats['in_use']), (('idle',), stats['idle']), (('max',), stats['max_size'])]
+
+def _book_cache_gauges():
+    stats = get_book_cache_stats()
+    return [(('hits',), stats['hits']), (('misses',), stats['misses']), (('size',), stats['size'])]
+
+def _breaker_gauges():
+    state = get_payment_gateway().breaker.state
+    return [((name,), int(state == name))
+            for name in (CircuitBreaker.CLOSED, CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN)]
+
+class _GatewayLatency:
+    # Renders the shared gateway client's latency histogram
+    name = 'library_gateway_call_duration_seconds'
+
+    def render(self):
+        return [f'# HELP {self.name} Payment gateway call latency per attempt.',
+                f'# TYPE {self.name} histogram',
+                *render_histogram(self.name, get_payment_gateway().latency)]
+
+REGISTRY.register(Gauge('library_db_pool_connections', 'Connection pool usage.', _pool_gauges, ('state',)))
+REGISTRY.register(Gauge('library_db_read_pool_connections', 'Read-only connection pool usage.',
+                        _read_pool_gauges, ('state',)))
+REGISTRY.register(Gauge('library_book_cache', 'Book row cache counters.', _book_cache_gauges, ('kind',)))
+REGISTRY.register(Gauge('library_gateway_circuit_state', 'Payment gateway circuit breaker state (1 = current).',
+                        _breaker_gauges, ('state',)))
+REGISTRY.register(_GatewayLatency())
+
+@metrics_bp.route('/metrics')
+def metrics():
+    """
+    Request, SQL, pool, cache and gateway metrics in the Prometheus text format.
+    """
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
@@ -15,12 +15,13 @@ def search_books():
     """
     search_term = request.args.get('q', '').strip()
     search_type = request.args.get('type', 'title')
+    mode = request.args.get('mode', 'fts')
     
     if not search_term:
         return render_template('search.html', books=[], search_term='', search_type=search_type)
     
     # Use business logic function
-    books = search_books_in_catalog(search_term, search_type)
+    books = search_books_in_catalog(search_term, search_type, mode)
     
     if not books:
         flash('Search functionality is not yet implemented.', 'error')
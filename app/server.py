@@ -0,0 +1,83 @@
+"""
+Production Server for Library Management System
+Runs the app in a gunicorn pre-fork master: the app is created (and the
+database migrated and seeded) once in the master, then forked into WORKERS
+processes serving THREADS requests at a time each. Started by
+`python -m app --server gunicorn` or the production profile.
+"""
+
+import os
+from typing import Dict
+
+from flask import Flask
+from gunicorn.app.base import BaseApplication
+
+from . import database
+from .metrics import set_process_labels
+
+
+def _post_fork(server, worker):
+    # Open this worker's own pooled connections before its first request;
+    # the fork hooks in database.py left it with empty pools and fresh locks
+    with database.db_session(), database.read_session():
+        pass
+    # Metrics, pools, caches and the gateway breaker are per worker; say which one answered
+    set_process_labels(worker=str(worker.pid))
+    server.log.info("Worker %s ready", worker.pid)
+
+
+def server_options(settings: Dict, bind: str) -> Dict:
+    """gunicorn settings for a loaded app config (WORKERS, THREADS, ...)."""
+    workers = settings['WORKERS'] or os.cpu_count() or 1
+    if workers < 0 or settings['THREADS'] < 1:
+        raise ValueError(f"WORKERS must be >= 0 and THREADS >= 1, got {settings['WORKERS']} and {settings['THREADS']}")
+    return {
+        'bind': bind,
+        'workers': workers,
+        'threads': settings['THREADS'],
+        'worker_class': 'gthread',
+        'preload_app': True,
+        # gunicorn takes whole seconds
+        'graceful_timeout': round(settings['GRACEFUL_TIMEOUT']),
+        # A worker stuck in one request longer than this is killed and replaced
+        'timeout': max(30, round(settings['GRACEFUL_TIMEOUT'])),
+        'max_requests': settings['MAX_REQUESTS'],
+        'max_requests_jitter': settings['MAX_REQUESTS'] // 10,
+        'post_fork': _post_fork,
+    }
+
+
+class LibraryServer(BaseApplication):
+    """gunicorn application serving an already-created Flask app."""
+
+    def __init__(self, app: Flask, options: Dict):
+        self.application = app
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+
+def serve(app: Flask, bind: str = '0.0.0.0:5000'):
+    """
+    Serve app from a pre-fork master until it is stopped.
+
+    Workers share book-cache invalidations and the snapshot generation
+    through memory set up here, so cached books stay coherent across
+    processes; a snapshot refresher started by create_app() keeps running in
+    the master and workers follow its refreshes. SIGHUP restarts the
+    workers gracefully with the code already loaded in the master; new code
+    needs a full restart (or USR2 + QUIT).
+    """
+    database.share_catalog_state()
+    # Compile every template once so workers inherit them instead of each compiling on first render
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    # Connections must not cross the fork; each worker opens its own
+    database.close_pools()
+    LibraryServer(app, server_options(app.config, bind)).run()
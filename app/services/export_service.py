@@ -0,0 +1,65 @@
+"""
+Export Service Module - Streaming data export
+Streams the books and borrow_records tables as NDJSON or CSV, one chunk of
+rows at a time, so memory use does not grow with the table size.
+"""
+
+import csv
+import io
+import json
+from datetime import date, timedelta
+from typing import Iterator, List, Optional
+from ..database import iter_books_chunks, iter_borrow_records_chunks, EXPORT_CHUNK_SIZE
+
+EXPORT_FORMATS = {"ndjson", "csv"}
+EXPORT_TABLES = {
+    "books": ["id", "title", "author", "isbn", "total_copies", "available_copies"],
+    "borrow_records": ["id", "patron_id", "book_id", "borrow_date", "due_date", "return_date"],
+}
+EXPORT_MIMETYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+def validate_export(table: str, fmt: str, patron_id: Optional[str] = None,
+                    since: Optional[str] = None, until: Optional[str] = None) -> Optional[str]:
+    # Returns the error message for an export request, or None if it is valid.
+    if table not in EXPORT_TABLES:
+        return f"Unknown table: {table}"
+    if fmt not in EXPORT_FORMATS:
+        return f"Unsupported format: {fmt}"
+    if table == "books" and (patron_id or since or until):
+        return "Filters apply to borrow_records only."
+    if patron_id and (not patron_id.isdigit() or len(patron_id) != 6):
+        return "Invalid patron ID. Must be exactly 6 digits."
+    for value in (since, until):
+        if value:
+            try:
+                date.fromisoformat(value)
+            except ValueError:
+                return f"Invalid date: {value} (expected YYYY-MM-DD)"
+    return None
+
+def _iter_chunks(table: str, patron_id: Optional[str], since: Optional[str],
+                 until: Optional[str], chunk_size: int):
+    if table == "books":
+        return iter_books_chunks(chunk_size)
+    # until is inclusive for callers; the query bound is the next day
+    until_bound = (date.fromisoformat(until) + timedelta(days=1)).isoformat() if until else None
+    return iter_borrow_records_chunks(patron_id or None, since or None, until_bound, chunk_size)
+
+def _csv_lines(rows: List[List]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+def export_table(table: str, fmt: str = "ndjson", patron_id: Optional[str] = None,
+                 since: Optional[str] = None, until: Optional[str] = None,
+                 chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[str]:
+    # Yields the export as text, one string per chunk of rows (CSV starts with a header).
+    # Call validate_export() first; since/until are inclusive ISO dates on borrow_date.
+    columns = EXPORT_TABLES[table]
+    if fmt == "csv":
+        yield _csv_lines([columns])
+    for rows in _iter_chunks(table, patron_id, since, until, chunk_size):
+        if fmt == "csv":
+            yield _csv_lines([tuple(row) for row in rows])
+        else:
+            yield "".join(json.dumps(dict(zip(columns, row))) + "\n" for row in rows)
@@ -0,0 +1,200 @@
+"""
+Idempotency Service Module - Replay-safe payments, refunds and settlements
+Runs a payment, refund or fee settlement at most once per client
+idempotency key and replays the stored result to retries, from a hot
+in-memory cache backed by the idempotency_keys table.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+from .. import database
+from ..cache import MISSING, TTLCache
+from ..database import (
+    reserve_idempotency_key, get_idempotency_record, complete_idempotency_key,
+    release_idempotency_key, purge_idempotency_keys
+)
+from .library_service import pay_late_fees, refund_late_fee_payment
+from .payment_service import GatewayNotAttemptedError
+from .settlement_service import SETTLEMENT_CALL_TIMEOUT, SETTLEMENT_WORKERS, settle_late_fees
+
+IDEMPOTENCY_TTL = 24 * 3600 # Seconds a stored result can be replayed
+IDEMPOTENCY_CACHE_TTL = 600 # Seconds a result stays in the in-memory hot cache
+IDEMPOTENCY_CACHE_SIZE = 10000 # Results kept in the hot cache
+PENDING_TIMEOUT = 300 # Seconds before a pending key left by a crashed worker can be reclaimed
+WAIT_TIMEOUT = 30.0 # Seconds a duplicate waits for the original request to finish
+MAX_KEY_LENGTH = 255
+_POLL_INTERVAL = 0.05 # Seconds between checks on a request running in another process
+
+_hot_results = TTLCache(IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_CACHE_TTL)
+
+class _InFlight:
+    # A request running in this process; duplicates wait on its event.
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[Dict] = None
+
+_in_flight: Dict[Tuple[str, str], _InFlight] = {}
+_in_flight_lock = threading.Lock()
+
+def _slot(key: str) -> Tuple[str, str]:
+    # Cache and in-flight entries are per database file, like the book cache
+    return database.DATABASE, key
+
+def _fingerprint(operation: str, params: Tuple) -> str:
+    return hashlib.sha256(json.dumps([operation, list(params)]).encode()).hexdigest()
+
+class _TrackedGateway:
+    # Passes calls through to a gateway, noting whether one was turned away
+    # before reaching it (open circuit, no free slot, cancelled while queued).
+    def __init__(self, gateway):
+        self._gateway = gateway
+        self.not_attempted = False
+
+    def _call(self, method: str, *args) -> Dict:
+        try:
+            return getattr(self._gateway, method)(*args)
+        except GatewayNotAttemptedError:
+            self.not_attempted = True
+            raise
+
+    def process_payment(self, patron_id: str, amount: float) -> Dict:
+        return self._call("process_payment", patron_id, amount)
+
+    def refund_payment(self, transaction_id: str, amount: float) -> Dict:
+        return self._call("refund_payment", transaction_id, amount)
+
+def _tracked(func: Callable[[Any], Dict], payment_gateway) -> Callable[[], Dict]:
+    # func(gateway) whose result is marked retryable if the gateway never saw the call
+    def run() -> Dict:
+        gateway = _TrackedGateway(payment_gateway)
+        result = func(gateway)
+        return {**result, "retryable": True} if gateway.not_attempted else result
+    return run
+
+def _is_final(result: Dict) -> bool:
+    # Only calls that never reached the gateway are released for the client
+    # to retry with the same key. Everything else is stored and replayed,
+    # including timeouts and other errors whose charge may have gone through:
+    # those are held for reconciliation instead of being charged again.
+    return not result.get("retryable")
+
+def _replay(result: Dict) -> Dict:
+    return {**result, "idempotent_replay": True}
+
+def _mismatch() -> Dict:
+    return {"success": False, "status": "Idempotency key was already used for a different request"}
+
+def _wait_for_other_process(key: str, fingerprint: str, deadline: float) -> Optional[Dict]:
+    # The key is pending in another worker process: poll the table until it finishes.
+    while time.monotonic() < deadline:
+        time.sleep(_POLL_INTERVAL)
+        row = get_idempotency_record(key)
+        if row is None:
+            return None
+        if row["fingerprint"] != fingerprint:
+            return _mismatch()
+        if row["status"] == "done":
+            result = json.loads(row["response"])
+            _hot_results.set(_slot(key), (fingerprint, result))
+            return _replay(result)
+    return {"success": False, "status": "A request with this idempotency key is still in progress"}
+
+def run_idempotent(key: str, operation: str, params: Tuple, func: Callable[[], Dict]) -> Dict:
+    # Runs func() once per key and returns its result; later calls with the
+    # same key and params get the stored result with idempotent_replay=True.
+    # Calls arriving while the first is running wait for it instead of calling func().
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return {"success": False, "status": "Invalid idempotency key"}
+    fingerprint = _fingerprint(operation, params)
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while True:
+        cached = _hot_results.get(_slot(key))
+        if cached is not MISSING:
+            return _replay(cached[1]) if cached[0] == fingerprint else _mismatch()
+
+        with _in_flight_lock:
+            running = _in_flight.get(_slot(key))
+            if running is None:
+                running = _in_flight[_slot(key)] = _InFlight()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            if not running.done.wait(max(0.0, deadline - time.monotonic())):
+                return {"success": False, "status": "A request with this idempotency key is still in progress"}
+            if running.result is None:
+                # The original never reached the gateway and was not stored; try again ourselves
+                continue
+            return _replay(running.result[1]) if running.result[0] == fingerprint else _mismatch()
+
+        try:
+            return _run_owned(key, operation, fingerprint, func, deadline, running)
+        finally:
+            with _in_flight_lock:
+                _in_flight.pop(_slot(key), None)
+            running.done.set()
+
+def _run_owned(key: str, operation: str, fingerprint: str, func: Callable[[], Dict],
+               deadline: float, running: _InFlight) -> Dict:
+    claimed, row = reserve_idempotency_key(key, operation, fingerprint, time.time(),
+                                           IDEMPOTENCY_TTL, PENDING_TIMEOUT)
+    if not claimed:
+        if row["fingerprint"] != fingerprint:
+            return _mismatch()
+        if row["status"] == "done":
+            result = json.loads(row["response"])
+            _hot_results.set(_slot(key), (fingerprint, result))
+            running.result = (fingerprint, result)
+            return _replay(result)
+        replay = _wait_for_other_process(key, fingerprint, deadline)
+        if replay is not None:
+            return replay
+        # The other process released its claim: run it here
+        return _run_owned(key, operation, fingerprint, func, deadline, running)
+
+    try:
+        result = func()
+    except BaseException:
+        release_idempotency_key(key)
+        raise
+    if _is_final(result):
+        complete_idempotency_key(key, json.dumps(result))
+        _hot_results.set(_slot(key), (fingerprint, result))
+        running.result = (fingerprint, result)
+    else:
+        release_idempotency_key(key)
+    return result
+
+def pay_late_fees_idempotent(idempotency_key: str, patron_id: str, book_id: int,
+                             payment_gateway) -> Dict[str, Any]:
+    # pay_late_fees() that charges at most once per idempotency key.
+    return run_idempotent(idempotency_key, "pay_late_fees", (patron_id, book_id),
+                          _tracked(lambda gateway: pay_late_fees(patron_id, book_id, gateway), payment_gateway))
+
+def refund_late_fee_payment_idempotent(idempotency_key: str, transaction_id: str, amount: float,
+                                       payment_gateway) -> Dict[str, Any]:
+    # refund_late_fee_payment() that refunds at most once per idempotency key.
+    return run_idempotent(idempotency_key, "refund_late_fee_payment", (transaction_id, amount),
+                          _tracked(lambda gateway: refund_late_fee_payment(transaction_id, amount, gateway),
+                                   payment_gateway))
+
+def settle_late_fees_idempotent(idempotency_key: str, payment_gateway,
+                                patron_ids: Optional[Iterable[str]] = None,
+                                max_workers: int = SETTLEMENT_WORKERS,
+                                call_timeout: float = SETTLEMENT_CALL_TIMEOUT) -> Dict[str, Any]:
+    # settle_late_fees() that runs at most once per idempotency key; a retried
+    # batch gets the first run's per-patron results back.
+    patrons = sorted(set(patron_ids)) if patron_ids is not None else None
+    return run_idempotent(idempotency_key, "settle_late_fees", (patrons,),
+                          lambda: settle_late_fees(payment_gateway, patrons, max_workers=max_workers,
+                                                   call_timeout=call_timeout))
+
+def purge_expired_keys(now: Optional[float] = None) -> int:
+    # Deletes stored results older than IDEMPOTENCY_TTL; returns how many.
+    return purge_idempotency_keys((now or time.time()) - IDEMPOTENCY_TTL)
+
+def get_idempotency_cache_stats() -> Dict:
+    return _hot_results.stats()
@@ -0,0 +1,102 @@
+"""
+Import Service Module - Bulk book import
+Streams books from CSV or JSON Lines, validates them with the same rules as
+add_book_to_catalog, and inserts them in chunked transactions.
+"""
+
+import csv
+import json
+from typing import Dict, IO, Iterator, List, Optional, Tuple
+from ..database import insert_new_books
+from .library_service import validate_book_fields
+
+IMPORT_FORMATS = {"csv", "jsonl"}
+IMPORT_CHUNK_SIZE = 5000 # Rows validated and inserted per transaction
+MAX_REPORTED_ERRORS = 1000 # Row errors kept in the report (all are counted)
+
+def iter_book_records(stream: IO[str], fmt: str) -> Iterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    # Yields (line number, record, parse error) for each data row of the stream.
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record, None
+    else:
+        for line_no, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as exc:
+                yield line_no, None, f"Invalid JSON: {exc}"
+                continue
+            if not isinstance(record, dict):
+                yield line_no, None, "Each line must be a JSON object."
+                continue
+            yield line_no, record, None
+
+def _parse_record(record: Dict) -> Tuple[Optional[Tuple[str, str, str, int, int]], Optional[str]]:
+    # Normalizes one record into an insert row, or returns the validation error.
+    title = record.get("title")
+    author = record.get("author")
+    isbn = record.get("isbn")
+    title = title.strip() if isinstance(title, str) else ""
+    author = author.strip() if isinstance(author, str) else ""
+    isbn = str(isbn).strip() if isbn is not None else ""
+    copies = record.get("total_copies")
+    try:
+        total_copies = int(copies) if not isinstance(copies, bool) else None
+    except (TypeError, ValueError):
+        total_copies = None
+    if isinstance(copies, float) and not copies.is_integer():
+        total_copies = None
+    error = validate_book_fields(title, author, isbn, total_copies)
+    if error:
+        return None, error
+    return (title, author, isbn, total_copies, total_copies), None
+
+def import_books(stream: IO[str], fmt: str = "csv", chunk_size: int = IMPORT_CHUNK_SIZE) -> Dict:
+    # Imports books from a text stream and returns a per-row error report.
+    if fmt not in IMPORT_FORMATS:
+        return {"status": f"Unsupported format: {fmt}", "rows": 0, "imported": 0,
+                "error_count": 0, "errors": []}
+    report = {"rows": 0, "imported": 0, "error_count": 0, "errors": []}
+
+    def add_error(line_no: int, isbn: Optional[str], message: str):
+        report["error_count"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"line": line_no, "isbn": isbn, "error": message})
+
+    chunk: List[Tuple[str, str, str, int, int]] = []
+    chunk_lines: Dict[str, int] = {}
+
+    def flush():
+        if not chunk:
+            return
+        inserted, duplicates = insert_new_books(chunk)
+        report["imported"] += inserted
+        for isbn in duplicates:
+            add_error(chunk_lines[isbn], isbn, f"A book with ISBN {isbn} already exists.")
+        chunk.clear()
+        chunk_lines.clear()
+
+    for line_no, record, parse_error in iter_book_records(stream, fmt):
+        report["rows"] += 1
+        if parse_error:
+            add_error(line_no, None, parse_error)
+            continue
+        row, error = _parse_record(record)
+        if error:
+            add_error(line_no, record.get("isbn"), error)
+            continue
+        isbn = row[2]
+        # Duplicates within the chunk; earlier chunks are already in the database
+        if isbn in chunk_lines:
+            add_error(line_no, isbn, f"Duplicate ISBN {isbn} in import (first on line {chunk_lines[isbn]}).")
+            continue
+        chunk.append(row)
+        chunk_lines[isbn] = line_no
+        if len(chunk) >= chunk_size:
+            flush()
+    flush()
+    report["status"] = "OK"
+    return report
@@ -4,13 +4,17 @@ Contains all the core business logic for the Library Management System,
 interacting with the database module to manage book, patron, and loan data.
 """
 
+import base64
+import json
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional, Tuple
 from ..database import (
     get_book_by_id, get_book_by_isbn, get_patron_borrow_count,
     insert_book, insert_borrow_record, update_book_availability,
     update_borrow_record_return_date, get_all_books, 
-    get_patron_borrowed_books, get_db_connection
+    get_patron_borrowed_books, get_db_connection, search_books_fulltext,
+    get_books_page, borrow_book_atomic, return_book_atomic, get_patron_borrow_history,
+    borrow_books_batch, return_books_batch
 )
 
 # Define constants for clarity
@@ -19,27 +23,52 @@ MAX_LOAN_LIMIT = 5
 FEE_RATE_1 = 0.50 # $0.50/day for first 7 days overdue
 FEE_RATE_2 = 1.00  # $1.00/day after 7 days overdue
 MAX_FEE = 15.00 # Maximum late fee limit
+CATALOG_PAGE_SIZE = 50 # Default books per catalog page
+MAX_CATALOG_PAGE_SIZE = 200 # Upper bound for a requested page size
+HISTORY_PAGE_SIZE = 50 # Default borrow history records per status report page
+SEARCH_MODES = {"fts", "prefix", "substring"} # fts: ranked full-text, prefix: starts-with, substring: legacy scan
+MAX_BATCH_SIZE = 50 # Books per batch borrow/return request
 
-def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -> Tuple[bool, str]:
-    # Adds a new book record to the catalog with specified copies.
-    # Input validation
+# Failure messages for the atomic borrow/return outcomes
+BORROW_FAILURES = {
+    "not_found": "Book not found.",
+    "unavailable": "This book is currently not available.",
+    "limit": f"You have reached the maximum borrowing limit of {MAX_LOAN_LIMIT} books.",
+    "error": "Database error occurred while creating borrow record.",
+}
+RETURN_FAILURES = {
+    "not_found": "Invalid book: no record found.",
+    "not_borrowed": "No record found: this book was not borrowed by the patron.",
+    "error": "Database error occurred while processing the return.",
+}
+
+def validate_book_fields(title: str, author: str, isbn: str, total_copies: int) -> Optional[str]:
+    # Returns the validation error message for a new book, or None if it is valid.
     if not title or not title.strip():
-        return False, "Title is required."
+        return "Title is required."
     
     if len(title.strip()) > 200:
-        return False, "Title must be less than 200 characters."
+        return "Title must be less than 200 characters."
     
     if not author or not author.strip():
-        return False, "Author is required."
+        return "Author is required."
     
     if len(author.strip()) > 100:
-        return False, "Author must be less than 100 characters."
+        return "Author must be less than 100 characters."
     
-    if len(isbn) != 13:
-        return False, "ISBN must be exactly 13 digits."
+    if not isinstance(isbn, str) or len(isbn) != 13:
+        return "ISBN must be exactly 13 digits."
     
     if not isinstance(total_copies, int) or total_copies <= 0:
-        return False, "Total copies must be a positive integer."
+        return "Total copies must be a positive integer."
+    return None
+
+def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -> Tuple[bool, str]:
+    # Adds a new book record to the catalog with specified copies.
+    # Input validation
+    error = validate_book_fields(title, author, isbn, total_copies)
+    if error:
+        return False, error
     # Check for duplicate ISBN (Duplicate ISBN fails)
     existing = get_book_by_isbn(isbn)
     if existing:
@@ -56,28 +85,14 @@ def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     # Validate patron ID (6-digit check) 
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
         return False, "Invalid patron ID. Must be exactly 6 digits."
-    # Check if book exists
-    book = get_book_by_id(book_id)
-    if not book:
-        return False, "Book not found."
-    # Check availability
-    if book['available_copies'] <= 0:
-        return False, "This book is currently not available."
-    # Check patron's borrowing limit (Max 5 books)
-    current_borrowed = get_patron_borrow_count(patron_id)
-    if current_borrowed >= MAX_LOAN_LIMIT:
-        return False, f"You have reached the maximum borrowing limit of {MAX_LOAN_LIMIT} books."
     # Calculate due date
     borrow_date = datetime.now()
     due_date = borrow_date + timedelta(days=LOAN_PERIOD_DAYS)
-    # Insert borrow record
-    borrow_success = insert_borrow_record(patron_id, book_id, borrow_date, due_date)
-    if not borrow_success:
-        return False, "Database error occurred while creating borrow record."
-    # Update book availability (-1)
-    availability_success = update_book_availability(book_id, -1)
-    if not availability_success:
-        return False, "Database error occurred while updating book availability."
+    # Check existence, availability and the loan limit (max 5 books), then
+    # decrement copies and record the loan, all in one transaction
+    outcome, book = borrow_book_atomic(patron_id, book_id, borrow_date, due_date, MAX_LOAN_LIMIT)
+    if outcome != "ok":
+        return False, BORROW_FAILURES.get(outcome, BORROW_FAILURES["error"])
     
     return True, f'Successfully borrowed "{book["title"]}". Due date: {due_date.strftime("%Y-%m-%d")}.'
 
@@ -88,26 +103,101 @@ def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
         return False, "Invalid patron ID: must be 6 digits."
     if not isinstance(book_id, int) or book_id <= 0:
         return False, "Invalid book ID."
-    # Check if the book exists to provide a specific error if possible
-    book = get_book_by_id(book_id)
-    if not book:
-        # Returning a failure message consistent with the test failure
-        return False, "Invalid book: no record found." 
-    # Calculate late fee
-    fee_report = calculate_late_fee_for_book(patron_id, book_id)
-    # Mark the borrow as returned. 
-    returned_count = update_borrow_record_return_date(patron_id, book_id, datetime.now())
-    if returned_count == 0:
-        return False, "No record found: this book was not borrowed by the patron."
-    fee_amount = fee_report['fee_amount']
-    current_avail = int(book.get("available_copies", 0))
-    total_copies = int(book.get("total_copies", 0))
-    # Prevent availability from exceeding total copies
-    if current_avail < total_copies:
-        update_book_availability(book_id, +1)
+    # Stamp the return on the active loan and give the copy back in one transaction
+    returned_at = datetime.now()
+    outcome, loan = return_book_atomic(patron_id, book_id, returned_at)
+    if outcome != "ok":
+        return False, RETURN_FAILURES.get(outcome, RETURN_FAILURES["error"])
+    # Late fee from the returned loan's due date
+    fee_amount = compute_late_fee(loan["due_date"], returned_at)["fee_amount"]
     fee_msg = f" Late fee: ${fee_amount:.2f}." if fee_amount > 0 else " No late fee."
     return True, f"Book returned successfully.{fee_msg}"
 
+def _validate_batch(patron_id: str, book_ids: Any) -> Optional[str]:
+    # Returns the validation error for a batch request, or None if it is valid.
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return "Invalid patron ID. Must be exactly 6 digits."
+    if not isinstance(book_ids, list) or not book_ids:
+        return "book_ids must be a non-empty list."
+    if len(book_ids) > MAX_BATCH_SIZE:
+        return f"At most {MAX_BATCH_SIZE} books per batch."
+    return None
+
+def _valid_book_id(book_id: Any) -> bool:
+    return isinstance(book_id, int) and not isinstance(book_id, bool) and book_id > 0
+
+def borrow_books_by_patron(patron_id: str, book_ids: List[int]) -> Dict:
+    # Borrows several books for one patron in one transaction.
+    # The loan limit counts the whole batch; each item gets its own outcome.
+    error = _validate_batch(patron_id, book_ids)
+    if error:
+        return {"status": error, "items": [], "borrowed": 0}
+    borrow_date = datetime.now()
+    due_date = borrow_date + timedelta(days=LOAN_PERIOD_DAYS)
+    valid_ids = [book_id for book_id in book_ids if _valid_book_id(book_id)]
+    results = iter(borrow_books_batch(patron_id, valid_ids, borrow_date, due_date, MAX_LOAN_LIMIT)
+                   if valid_ids else [])
+    items = []
+    for book_id in book_ids:
+        if not _valid_book_id(book_id):
+            items.append({"book_id": book_id, "success": False, "message": "Invalid book ID."})
+            continue
+        _, outcome, book = next(results)
+        if outcome == "ok":
+            items.append({"book_id": book_id, "success": True, "title": book["title"],
+                          "due_date": due_date.strftime("%Y-%m-%d"),
+                          "message": f'Successfully borrowed "{book["title"]}".'})
+        else:
+            items.append({"book_id": book_id, "success": False,
+                          "message": BORROW_FAILURES.get(outcome, BORROW_FAILURES["error"])})
+    return {"status": "OK", "items": items, "borrowed": sum(item["success"] for item in items)}
+
+def return_books_by_patron(patron_id: str, book_ids: List[int]) -> Dict:
+    # Returns several books for one patron in one transaction, with the
+    # late fee of each returned loan and the batch total.
+    error = _validate_batch(patron_id, book_ids)
+    if error:
+        return {"status": error, "items": [], "returned": 0, "total_fee": 0.0}
+    returned_at = datetime.now()
+    valid_ids = [book_id for book_id in book_ids if _valid_book_id(book_id)]
+    results = iter(return_books_batch(patron_id, valid_ids, returned_at) if valid_ids else [])
+    items = []
+    total_fee = 0.0
+    for book_id in book_ids:
+        if not _valid_book_id(book_id):
+            items.append({"book_id": book_id, "success": False, "message": "Invalid book ID."})
+            continue
+        _, outcome, loan = next(results)
+        if outcome != "ok":
+            items.append({"book_id": book_id, "success": False,
+                          "message": RETURN_FAILURES.get(outcome, RETURN_FAILURES["error"])})
+            continue
+        fee = compute_late_fee(loan["due_date"], returned_at)
+        total_fee += fee["fee_amount"]
+        items.append({"book_id": book_id, "success": True, "message": "Book returned successfully.",
+                      "fee_amount": fee["fee_amount"], "days_overdue": fee["days_overdue"]})
+    return {"status": "OK", "items": items, "returned": sum(item["success"] for item in items),
+            "total_fee": round(total_fee, 2)}
+
+def late_fee_for_days(days_overdue: int) -> float:
+    # Tiered fee calculation: $0.50/day for 1st 7 days, $1/day after, max $15
+    fee = 0.0
+    if days_overdue > 0:
+        # Apply the $0.50 rate for the first 7 days overdue
+        first7 = min(days_overdue, 7)
+        # Apply the $1.00 rate for the remaining days
+        rest = max(days_overdue - 7, 0)
+        fee = (FEE_RATE_1 * first7) + (FEE_RATE_2 * rest)
+        # Apply maximum cap
+        fee = min(fee, MAX_FEE)
+    return round(fee, 2)
+
+def compute_late_fee(due_date: datetime, today: Optional[datetime] = None) -> Dict:
+    # Tiered late fee for a loan with the given due date, as of today.
+    today = today or datetime.now()
+    days_overdue = max(0, (today.date() - due_date.date()).days)
+    return {'fee_amount': late_fee_for_days(days_overdue), 'days_overdue': int(days_overdue)}
+
 def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
     # Calculates the late fee based on the due date of the active loan.
     # Input validation
@@ -119,72 +209,127 @@ def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
     book = get_book_by_id(book_id)
     if not book:
         return {'fee_amount': 0.00, 'days_overdue': 0, 'status': 'Book not found'}
-    # Retrieve the patron's active borrow record for this specific book
-    try:
-        active_loans = get_patron_borrowed_books(patron_id)
-        # Find the specific active record for the book_id
-        rec = next((r for r in active_loans if int(r.get('book_id')) == int(book_id)), None)
-    except Exception:
-        rec = None
+    # Retrieve the patron's active borrow record for this specific book;
+    # database errors propagate instead of reading as "no active borrow"
+    active_loans = get_patron_borrowed_books(patron_id)
+    rec = next((r for r in active_loans if int(r.get('book_id')) == int(book_id)), None)
     if not rec:
         return {'fee_amount': 0.00, 'days_overdue': 0, 'status': 'No active borrow for this patron/book'}
-    # Compute overdue days
-    due_date = rec['due_date']
-    today = datetime.now()
-    # Calculate difference
-    days_overdue = max(0, (today.date() - due_date.date()).days)
-    # Tiered fee calculation: $0.50/day for 1st 7 days, $1/day after, max $15
-    fee = 0.0
-    if days_overdue > 0:
-        # Apply the $0.50 rate for the first 7 days overdue
-        first7 = min(days_overdue, 7)
-        # Apply the $1.00 rate for the remaining days
-        rest = max(days_overdue - 7, 0)
-        fee = (FEE_RATE_1 * first7) + (FEE_RATE_2 * rest)
-        # Apply maximum cap
-        fee = min(fee, MAX_FEE)
+    # Compute overdue days and the tiered, capped fee
+    fee = compute_late_fee(rec['due_date'])
     return {
-        'fee_amount': round(fee, 2),
-        'days_overdue': int(days_overdue),
+        'fee_amount': fee['fee_amount'],
+        'days_overdue': fee['days_overdue'],
         'status': 'OK'
     }
 
-def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
+def search_books_in_catalog(search_term: str, search_type: str, mode: str = "fts",
+                            limit: Optional[int] = None) -> List[Dict]:
     # Searches the book catalog by title, author, or ISBN.
     # Input checks and normalization
     if not isinstance(search_term, str) or not isinstance(search_type, str):
         return []
     q = search_term.strip()
     st = search_type.strip().lower()
-    if not q or st not in {"title", "author", "isbn"}:
+    if not q or st not in {"title", "author", "isbn"} or mode not in SEARCH_MODES:
         return [] # Invalid type or empty term returns []
     # Optimized search for exact ISBN
     if st == "isbn":
         book = get_book_by_isbn(q)
         return [book] if book else []
-    # Full catalog search for title/author
+    # Indexed full-text search; None means the index can't answer this query
+    if mode != "substring":
+        results = search_books_fulltext(q, st, prefix=(mode == "prefix"), limit=limit)
+        if results is not None:
+            return results
+    # Substring fallback: full catalog scan for title/author
     all_books = get_all_books()
     needle = q.lower()
     results: List[Dict] = []
     for b in all_books:
         # Retrieve the value based on the search type
         val = (b.get(st) or "")
-        if isinstance(val, str) and needle in val.lower():
-            results.append(b)     
-    return results
+        if not isinstance(val, str):
+            continue
+        matched = val.lower().startswith(needle) if mode == "prefix" else needle in val.lower()
+        if matched:
+            results.append(b)
+    return results[:limit] if limit is not None else results
+
+def _encode_cursor(key: List) -> str:
+    # Opaque, URL-safe cursor holding a keyset sort key.
+    raw = json.dumps(key, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _decode_cursor(cursor: str) -> Optional[Tuple[str, int]]:
+    # Returns a (text, id) sort key, or None if the cursor is malformed.
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        text, row_id = json.loads(raw.decode("utf-8"))
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None
+    if not isinstance(text, str) or not isinstance(row_id, int):
+        return None
+    return text, row_id
+
+def encode_catalog_cursor(book: Dict) -> str:
+    # Cursor holding the (title, id) sort key of a book.
+    return _encode_cursor([book["title"], book["id"]])
 
-def get_patron_status_report(patron_id: str) -> Dict:
-    # Generates a full status report for a patron, including active loans, fees, and history.
+def decode_catalog_cursor(cursor: str) -> Optional[Tuple[str, int]]:
+    # Returns the (title, id) sort key, or None if the cursor is malformed.
+    return _decode_cursor(cursor)
+
+def get_catalog_page(after: Optional[str] = None, before: Optional[str] = None,
+                     limit: int = CATALOG_PAGE_SIZE) -> Dict:
+    # Returns one page of the catalog ordered by title/id, with next/prev cursors.
+    if not isinstance(limit, int) or limit <= 0:
+        limit = CATALOG_PAGE_SIZE
+    limit = min(limit, MAX_CATALOG_PAGE_SIZE)
+    after_key = decode_catalog_cursor(after) if after else None
+    before_key = decode_catalog_cursor(before) if before else None
+    if (after and after_key is None) or (before and before_key is None):
+        return {"books": [], "next_cursor": None, "prev_cursor": None, "limit": limit,
+                "status": "Invalid cursor"}
+    # Fetch one extra row to learn whether another page exists in that direction
+    if before_key is not None:
+        rows = get_books_page(before=before_key, limit=limit + 1)
+        has_more = len(rows) > limit
+        books = rows[1:] if has_more else rows
+        has_prev, has_next = has_more, True
+    else:
+        rows = get_books_page(after=after_key, limit=limit + 1)
+        has_more = len(rows) > limit
+        books = rows[:limit]
+        has_prev, has_next = after_key is not None, has_more
+    return {
+        "books": books,
+        "next_cursor": encode_catalog_cursor(books[-1]) if books and has_next else None,
+        "prev_cursor": encode_catalog_cursor(books[0]) if books and has_prev else None,
+        "limit": limit,
+        "status": "OK",
+    }
+
+def get_patron_status_report(patron_id: str, history_limit: int = HISTORY_PAGE_SIZE,
+                             history_cursor: Optional[str] = None) -> Dict:
+    # Generates a status report for a patron: active loans, fees, and one page of history.
     # Validate patron ID
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
         return {"status": "Invalid patron ID"}
-    # Process Active Loans and Calculate Total Fees
-    active_loans = get_patron_borrowed_books(patron_id) 
+    if not isinstance(history_limit, int) or history_limit <= 0:
+        history_limit = HISTORY_PAGE_SIZE
+    history_limit = min(history_limit, MAX_CATALOG_PAGE_SIZE)
+    before = _decode_cursor(history_cursor) if history_cursor else None
+    if history_cursor and before is None:
+        return {"status": "Invalid history cursor"}
+    # Process Active Loans (one query) and derive every fee from the loaded due dates
+    active_loans = get_patron_borrowed_books(patron_id)
+    now = datetime.now()
     current_borrows: List[Dict] = []
     total_fees = 0.0
     for rec in active_loans:
-        fee_info = calculate_late_fee_for_book(patron_id, int(rec["book_id"]))
-        fee_amt = float(fee_info.get("fee_amount", 0.0))
+        fee_info = compute_late_fee(rec["due_date"], now)
+        fee_amt = float(fee_info["fee_amount"])
         total_fees += fee_amt   
         # Format due date nicely
         due_date_str = rec["due_date"].strftime("%Y-%m-%d") if hasattr(rec["due_date"], "strftime") else str(rec["due_date"]).split(" ")[0]   
@@ -196,21 +341,10 @@ def get_patron_status_report(patron_id: str) -> Dict:
             "is_overdue": fee_info['days_overdue'] > 0, 
             "fee": round(fee_amt, 2),
         })
-    # Full Borrowing History
-    conn = get_db_connection()
-    # Query all borrow records for the patron
-    rows = conn.execute(
-        """
-        SELECT br.patron_id, br.book_id, br.borrow_date, br.due_date, br.return_date,
-               b.title, b.author
-        FROM borrow_records br
-        JOIN books b ON b.id = br.book_id
-        WHERE br.patron_id = ?
-        ORDER BY datetime(br.borrow_date) DESC, br.id DESC
-        """,
-        (patron_id,)
-    ).fetchall()
-    conn.close()
+    # One page of Borrowing History (one query); fetch an extra row to detect more pages
+    rows = get_patron_borrow_history(patron_id, history_limit + 1, before)
+    has_more = len(rows) > history_limit
+    rows = rows[:history_limit]
     history: List[Dict] = []
     for r in rows:
         bd = str(r["borrow_date"]).split("T")[0] if r["borrow_date"] else None
@@ -225,15 +359,25 @@ def get_patron_status_report(patron_id: str) -> Dict:
             "return_date": rd,
             "status": "returned" if r["return_date"] else "borrowed",
         })
+    next_cursor = _encode_cursor([rows[-1]["borrow_date"], rows[-1]["id"]]) if has_more else None
     # Final Report Structure
     return {
         "current_borrows": current_borrows,
         "total_late_fees": round(total_fees, 2),
         "borrow_count": len(active_loans), # R7 requires this to be the count of CURRENT loans
         "history": history,
+        "history_next_cursor": next_cursor,
         "status": "OK",
     }
 
+def normalize_payment_result(result: Any) -> Tuple[bool, Optional[str], str]:
+    # Gateway replies are dicts, but a bare truthy/falsy value is accepted too.
+    if isinstance(result, dict):
+        success = bool(result.get("success"))
+        return success, result.get("transaction_id"), result.get("message", "OK" if success else "Declined")
+    success = bool(result)
+    return success, None, "OK" if success else "Declined"
+
 def pay_late_fees(patron_id: str, book_id: int, payment_gateway) -> Dict[str, Any]:
     # validate patron ID
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
@@ -282,14 +426,7 @@ def pay_late_fees(patron_id: str, book_id: int, payment_gateway) -> Dict[str, An
             "amount_charged": 0.0,
         }
     # normalize result
-    if isinstance(result, dict):
-        success = bool(result.get("success"))
-        tx_id = result.get("transaction_id")
-        status_msg = result.get("message", "OK" if success else "Declined")
-    else:
-        success = bool(result)
-        tx_id = None
-        status_msg = "OK" if success else "Declined"
+    success, tx_id, status_msg = normalize_payment_result(result)
     # if payment failed dont charge anything
     if not success:
         return {
@@ -1,4 +1,11 @@
-from typing import Dict
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Optional, Tuple, Union
+from ..metrics import Histogram
 
 class PaymentGateway:
 
@@ -13,4 +20,258 @@ class PaymentGateway:
         return {
             "success": True,
             "message": f"Refund of ${amount:.2f} processed (simulated).",
-        }
\ No newline at end of file
+        }
+
+class StubPaymentGateway(PaymentGateway):
+    # Local gateway for tests and load runs: adds latency and fails a share of
+    # calls with ConnectionError. latency is seconds or a callable returning seconds.
+
+    def __init__(self, latency: Union[float, Callable[[], float]] = 0.0, error_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _simulate(self):
+        with self._lock:
+            self.calls += 1
+            fail = self._random.random() < self.error_rate
+        delay = self.latency() if callable(self.latency) else self.latency
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise ConnectionError("Simulated gateway failure")
+
+    def process_payment(self, patron_id: str, amount: float) -> Dict:
+        self._simulate()
+        return super().process_payment(patron_id, amount)
+
+    def refund_payment(self, transaction_id: str, amount: float) -> Dict:
+        self._simulate()
+        return super().refund_payment(transaction_id, amount)
+
+class GatewayTimeoutError(TimeoutError):
+    # The gateway did not answer within the per-call deadline; the outcome is unknown.
+    pass
+
+class GatewayNotAttemptedError(ConnectionError):
+    # The call never reached the gateway, so retrying it cannot charge twice.
+    pass
+
+class CircuitOpenError(GatewayNotAttemptedError):
+    # The circuit breaker is open, so the call was not attempted.
+    pass
+
+class GatewayBusyError(GatewayNotAttemptedError):
+    # Every gateway call slot is in use, so the call was not attempted.
+    pass
+
+class CircuitBreaker:
+    # Fails fast after the gateway starts erroring. Closed: calls go through and
+    # outcomes are kept in a rolling window. Once the window holds at least
+    # min_calls outcomes and the failure share reaches failure_threshold, the
+    # breaker opens and rejects calls for reset_timeout seconds. It then lets a
+    # single trial call through (half-open): success closes it, failure reopens it.
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: float = 0.5, min_calls: int = 10, window: int = 20,
+                 reset_timeout: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._outcomes = deque(maxlen=window)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    def _refresh(self):
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        # True if a call may go ahead now; counts a rejection otherwise.
+        with self._lock:
+            self._refresh()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, success: bool):
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                if success:
+                    self._state = self.CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._open()
+                return
+            self._outcomes.append(success)
+            failures = self._outcomes.count(False)
+            if (self._state == self.CLOSED and len(self._outcomes) >= self.min_calls
+                    and failures / len(self._outcomes) >= self.failure_threshold):
+                self._open()
+
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = self._clock()
+        self._trial_in_flight = False
+        self._outcomes.clear()
+        self.times_opened += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._refresh()
+            outcomes = list(self._outcomes)
+            return {
+                "state": self._state,
+                "window_calls": len(outcomes),
+                "window_failures": outcomes.count(False),
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+            }
+
+# Transport failures that are safe to retry: the request never completed
+TRANSIENT_ERRORS: Tuple[type, ...] = (ConnectionError,)
+
+class ResilientPaymentGateway:
+    # Wraps a PaymentGateway with a per-attempt deadline, jittered exponential
+    # backoff retries for transient errors, and a circuit breaker. Calls run on
+    # a small bounded thread pool so the caller (a Flask worker) waits at most
+    # `timeout` per attempt even if the gateway hangs. At most max_concurrency
+    # calls are in flight; further calls fail fast with GatewayBusyError
+    # instead of queueing behind hung ones. Timeouts are not retried by
+    # default: the charge may have gone through. Declines are never retried.
+
+    def __init__(self, gateway: PaymentGateway, timeout: float = 2.0, max_retries: int = 2,
+                 backoff_base: float = 0.1, backoff_max: float = 1.0, retry_timeouts: bool = False,
+                 breaker: Optional[CircuitBreaker] = None, max_concurrency: int = 16):
+        self.gateway = gateway
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_timeouts = retry_timeouts
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = Histogram()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="gateway")
+        # A slot is held from submit until the call returns, even after its caller timed out
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._counts = {"calls": 0, "attempts": 0, "retries": 0, "timeouts": 0,
+                        "errors": 0, "rejected": 0, "busy": 0, "cancelled": 0}
+
+    def _count(self, key: str):
+        with self._lock:
+            self._counts[key] += 1
+
+    def _backoff(self, attempt: int) -> float:
+        # "Full jitter": uniform in [0, min(max, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _attempt(self, method: str, *args) -> Dict:
+        if not self._slots.acquire(blocking=False):
+            self._count("busy")
+            raise GatewayBusyError("Payment gateway busy (all call slots in use)")
+        if not self.breaker.allow():
+            self._slots.release()
+            self._count("rejected")
+            raise CircuitOpenError("Payment gateway unavailable (circuit open)")
+        self._count("attempts")
+        started = time.perf_counter()
+        future = self._executor.submit(getattr(self.gateway, method), *args)
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            self.breaker.record(False)
+            self.latency.observe(time.perf_counter() - started)
+            if future.cancel():
+                # Still queued: the gateway never saw it
+                self._count("cancelled")
+                raise GatewayNotAttemptedError(f"Payment gateway call not started within {self.timeout:g}s")
+            self._count("timeouts")
+            raise GatewayTimeoutError(f"Payment gateway did not answer within {self.timeout:g}s")
+        except Exception:
+            self._count("errors")
+            self.breaker.record(False)
+            self.latency.observe(time.perf_counter() - started)
+            raise
+        self.breaker.record(True)
+        self.latency.observe(time.perf_counter() - started)
+        return result
+
+    def _call(self, method: str, *args) -> Dict:
+        self._count("calls")
+        attempt = 0
+        # A retried timeout may have charged, so the call as a whole stays a timeout
+        timed_out: Optional[GatewayTimeoutError] = None
+        while True:
+            try:
+                return self._attempt(method, *args)
+            except (CircuitOpenError, GatewayBusyError) as exc:
+                if timed_out is not None:
+                    raise timed_out from exc
+                raise
+            except GatewayTimeoutError as exc:
+                if not self.retry_timeouts or attempt >= self.max_retries:
+                    raise
+                timed_out = exc
+            except TRANSIENT_ERRORS as exc:
+                if attempt >= self.max_retries:
+                    if timed_out is not None:
+                        raise timed_out from exc
+                    raise
+            self._count("retries")
+            time.sleep(self._backoff(attempt))
+            attempt += 1
+
+    def process_payment(self, patron_id: str, amount: float) -> Dict:
+        return self._call("process_payment", patron_id, amount)
+
+    def refund_payment(self, transaction_id: str, amount: float) -> Dict:
+        return self._call("refund_payment", transaction_id, amount)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self._counts)
+        return {**counts, "breaker": self.breaker.stats(), "latency_seconds": self.latency.snapshot()}
+
+_default_gateway: Optional[ResilientPaymentGateway] = None
+_default_lock = threading.Lock()
+
+def _reset_after_fork():
+    # A forked worker gets its own gateway: executor threads do not survive fork
+    global _default_gateway, _default_lock
+    _default_gateway = None
+    _default_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def get_payment_gateway() -> ResilientPaymentGateway:
+    # Process-wide resilient gateway, so breaker state and latency are shared by all requests.
+    global _default_gateway
+    with _default_lock:
+        if _default_gateway is None:
+            _default_gateway = ResilientPaymentGateway(PaymentGateway())
+        return _default_gateway
@@ -0,0 +1,117 @@
+"""
+Settlement Service Module - Batch late fee settlement
+Computes outstanding late fees per patron and charges them through the
+payment gateway from a bounded pool of worker threads.
+"""
+
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from ..database import claim_fee_settlements, finish_fee_settlements, iter_overdue_loans
+from .late_fee_service import late_fees_for_days
+from .library_service import normalize_payment_result
+from .payment_service import GatewayNotAttemptedError
+
+SETTLEMENT_WORKERS = 8 # Gateway calls in flight at once
+SETTLEMENT_CALL_TIMEOUT = 10.0 # Seconds a single gateway call may take; a backstop above the resilient gateway's own deadline and retries
+_POLL_INTERVAL = 0.05 # Seconds between timeout checks while calls are running
+
+def _charge(payment_gateway, patron_id: str, amount: float, started: Dict[str, float]) -> Dict:
+    # Runs on a worker thread; records its start time so the caller can time it out.
+    # outcome is what the fee_settlements row becomes: only a call the gateway
+    # never saw frees the fee again, any other error leaves the charge unknown.
+    started[patron_id] = time.monotonic()
+    try:
+        result = payment_gateway.process_payment(patron_id, amount)
+    except GatewayNotAttemptedError as exc:
+        return {"success": False, "status": f"Payment error: {exc}", "transaction_id": None,
+                "outcome": "failed"}
+    except Exception as exc:
+        return {"success": False, "status": f"Payment error: {exc}", "transaction_id": None,
+                "outcome": "unknown"}
+    success, tx_id, status_msg = normalize_payment_result(result)
+    return {"success": success, "status": status_msg, "transaction_id": tx_id,
+            "outcome": "settled" if success else "failed"}
+
+def _loan_fees(today: date, patron_ids: Optional[Iterable[str]]) -> List[Tuple[int, str, float]]:
+    # (loan_id, patron_id, fee) for every overdue active loan, patron filter applied in SQL
+    loan_fees: List[Tuple[int, str, float]] = []
+    for rows in iter_overdue_loans(today.isoformat(), patron_ids=patron_ids):
+        fees = late_fees_for_days([row["days_overdue"] for row in rows])
+        loan_fees.extend((row["id"], row["patron_id"], fee) for row, fee in zip(rows, fees))
+    return loan_fees
+
+def settle_late_fees(payment_gateway, patron_ids: Optional[Iterable[str]] = None,
+                     today: Optional[date] = None, max_workers: int = SETTLEMENT_WORKERS,
+                     call_timeout: float = SETTLEMENT_CALL_TIMEOUT) -> Dict:
+    # Charges each patron's outstanding late fees (all patrons with overdue
+    # loans, or only patron_ids) with one gateway call per patron, at most
+    # max_workers at a time. Wall-clock time is about
+    # ceil(patrons / max_workers) gateway round trips instead of the sum.
+    # Fees are claimed in fee_settlements before any call, so a second run or
+    # a client retry only charges what accrued since and nothing twice.
+    # A call still running after call_timeout is reported as timed out and
+    # its settlement held as 'unknown' for reconciliation; the run returns
+    # without waiting for it. Calls left queued behind workers that are all
+    # stuck are cancelled unsent, which frees their fees for the next run.
+    if max_workers < 1:
+        return {"status": "max_workers must be at least 1", "results": []}
+    today = today or datetime.now().date()
+    if isinstance(today, datetime):
+        today = today.date()
+    as_of = today.isoformat()
+    settlements = claim_fee_settlements(as_of, _loan_fees(today, patron_ids), time.time())
+
+    results: Dict[str, Dict] = {}
+    started: Dict[str, float] = {}
+    stuck: List[Future] = []
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="settlement")
+    try:
+        pending: Dict[Future, str] = {
+            executor.submit(_charge, payment_gateway, item["patron_id"], item["amount"], started): item["patron_id"]
+            for item in settlements
+        }
+        while pending:
+            done, _ = wait(pending, timeout=_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[pending.pop(future)] = future.result()
+            now = time.monotonic()
+            for future, pid in list(pending.items()):
+                if not future.done() and pid in started and now - started[pid] > call_timeout:
+                    del pending[future]
+                    stuck.append(future)
+                    results[pid] = {"success": False, "transaction_id": None, "timed_out": True,
+                                    "outcome": "unknown",
+                                    "status": f"Payment timed out after {call_timeout:g}s; outcome unknown"}
+            if sum(not future.done() for future in stuck) >= max_workers:
+                # No worker left to run the rest
+                for future, pid in list(pending.items()):
+                    if future.cancel():
+                        del pending[future]
+                        results[pid] = {"success": False, "transaction_id": None, "outcome": "failed",
+                                        "status": "Payment not attempted: every settlement worker is stuck"}
+    finally:
+        # Do not wait for calls that timed out; anything still queued is dropped unsent
+        executor.shutdown(wait=False, cancel_futures=True)
+    finish_fee_settlements((item["id"], results[item["patron_id"]]["outcome"],
+                            results[item["patron_id"]]["transaction_id"]) for item in settlements)
+
+    items: List[Dict] = []
+    summary = {"settled": 0, "failed": 0, "timed_out": 0, "amount_charged": 0.0, "amount_unsettled": 0.0}
+    for item in settlements:
+        pid, amount = item["patron_id"], item["amount"]
+        result = results[pid]
+        items.append({"patron_id": pid, "amount": amount, "success": result["success"],
+                      "transaction_id": result["transaction_id"], "status": result["status"],
+                      "settlement_id": item["id"]})
+        if result["success"]:
+            summary["settled"] += 1
+            summary["amount_charged"] += amount
+        else:
+            summary["timed_out" if result.get("timed_out") else "failed"] += 1
+            summary["amount_unsettled"] += amount
+    summary["amount_charged"] = round(summary["amount_charged"], 2)
+    summary["amount_unsettled"] = round(summary["amount_unsettled"], 2)
+    return {"status": "OK", "as_of": as_of, "patron_count": len(settlements),
+            **summary, "results": items}
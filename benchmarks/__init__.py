@@ -0,0 +1,4 @@
+"""
+Performance benchmarks for the Library Management System service layer.
+Run with: python -m benchmarks.run --help
+"""
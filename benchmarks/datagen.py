@@ -0,0 +1,169 @@
+"""
+Deterministic synthetic data for benchmarks.
+
+Builds a migrated library database with a given number of books, patrons
+and loans from a seed. The same seed and sizes always give the same rows;
+loan dates are laid out relative to an anchor date (today by default) so
+that a fixed share of active loans is overdue whenever the data is used.
+"""
+
+import json
+import random
+import sqlite3
+from array import array
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, Optional, Tuple
+
+from app import database
+
+# Named dataset sizes: (books, patrons, loans)
+SIZES = {
+    'tiny': (1000, 200, 5000),
+    'small': (10000, 2000, 50000),
+    'medium': (100000, 20000, 1000000),
+    'large': (1000000, 200000, 10000000),
+}
+
+ACTIVE_SHARE = 0.1 # Share of loans that are still out
+OVERDUE_SHARE = 0.3 # Share of active loans past their due date
+MAX_ACTIVE_PER_PATRON = 5 # Matches the service loan limit
+INSERT_BATCH = 50000
+
+_WORDS = (
+    'river night garden silent empire shadow winter crown glass forest iron '
+    'ocean paper stone golden hidden last broken city storm memory distant '
+    'secret fire summer house letter island bright quiet wild northern song '
+    'machine journey mountain little lost moon red star tower voice window'
+).split()
+_FIRST_NAMES = 'Ada Ben Cara Dev Elena Farid Grace Hugo Iris Jonas Kei Lena Milo Nia Omar Priya'.split()
+_LAST_NAMES = 'Adams Brook Chen Diaz Evans Fischer Gupta Hale Ito Jensen Kaur Lopez Moreau Novak'.split()
+
+def _books(rng: random.Random, count: int, copies: array) -> Iterator[Tuple]:
+    for n in range(count):
+        title = ' '.join(rng.choice(_WORDS) for _ in range(rng.randint(2, 4))).title()
+        author = f'{rng.choice(_FIRST_NAMES)} {rng.choice(_LAST_NAMES)}'
+        total = copies[n]
+        yield title, author, f'978{n:010d}', total, total
+
+def _patron_id(n: int) -> str:
+    return f'{100000 + n:06d}'
+
+def _loans(rng: random.Random, books: int, patrons: int, loans: int, copies: array,
+           anchor: datetime, stats: Dict) -> Iterator[Tuple]:
+    # Active loans come last so each book's remaining copies and each patron's
+    # loan count can be tracked in two flat arrays instead of per-row lookups.
+    active_target = int(loans * ACTIVE_SHARE)
+    active = array('b', bytes(patrons))
+    history = loans - active_target
+    for _ in range(history):
+        borrowed = anchor - timedelta(days=rng.randint(15, 730), seconds=rng.randint(0, 86399))
+        due = borrowed + timedelta(days=14)
+        returned = borrowed + timedelta(days=rng.randint(1, 30))
+        yield (_patron_id(rng.randrange(patrons)), rng.randrange(books) + 1,
+               borrowed.isoformat(), due.isoformat(), returned.isoformat())
+    made = 0
+    attempts = 0
+    while made < active_target and attempts < active_target * 4:
+        attempts += 1
+        patron = rng.randrange(patrons)
+        book = rng.randrange(books)
+        if active[patron] >= MAX_ACTIVE_PER_PATRON or copies[book] == 0:
+            continue
+        active[patron] += 1
+        copies[book] -= 1
+        if rng.random() < OVERDUE_SHARE:
+            borrowed = anchor - timedelta(days=rng.randint(15, 60))
+        else:
+            borrowed = anchor - timedelta(days=rng.randint(0, 13))
+        borrowed -= timedelta(seconds=rng.randint(0, 86399))
+        made += 1
+        yield (_patron_id(patron), book + 1, borrowed.isoformat(),
+               (borrowed + timedelta(days=14)).isoformat(), None)
+    stats['active_loans'] = made
+    stats['history_loans'] = history
+
+def _batched(rows: Iterator[Tuple], size: int) -> Iterator[list]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def read_meta(path: str) -> Optional[Dict]:
+    """Get the generator parameters stored in a benchmark database, if any."""
+    try:
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    except sqlite3.OperationalError:
+        return None
+    try:
+        row = conn.execute('SELECT value FROM bench_meta WHERE key = ?', ('params',)).fetchone()
+        return json.loads(row[0]) if row else None
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()
+
+def generate_database(path: str, books: int, patrons: int, loans: int, seed: int = 327,
+                      anchor: Optional[date] = None) -> Dict:
+    """
+    Create a benchmark database at path (which must not exist yet).
+
+    Returns the generator parameters, which are also stored in the
+    bench_meta table so later runs can reuse a matching database.
+    """
+    anchor = anchor or date.today()
+    anchor_dt = datetime.combine(anchor, datetime.min.time()) + timedelta(hours=12)
+    rng = random.Random(seed)
+    copies = array('b', (rng.randint(1, 5) for _ in range(books)))
+    stats: Dict = {}
+
+    previous = database.DATABASE
+    database.DATABASE = path
+    try:
+        database.init_database()
+    finally:
+        database.DATABASE = previous
+        database.close_pools()
+
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = OFF')
+    has_fts = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'books_fts_pause'"
+    ).fetchone() is not None
+    with conn:
+        if has_fts:
+            # Index titles once at the end instead of per row (see migration 5)
+            conn.execute('INSERT INTO books_fts_pause VALUES (1)')
+        for batch in _batched(_books(random.Random(seed + 1), books, copies), INSERT_BATCH):
+            conn.executemany('''
+                INSERT INTO books (title, author, isbn, total_copies, available_copies)
+                VALUES (?, ?, ?, ?, ?)
+            ''', batch)
+    total_copies = array('b', copies)
+    loan_rng = random.Random(seed + 2)
+    for batch in _batched(_loans(loan_rng, books, patrons, loans, copies, anchor_dt, stats),
+                          INSERT_BATCH):
+        with conn:
+            conn.executemany('''
+                INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date)
+                VALUES (?, ?, ?, ?, ?)
+            ''', batch)
+    with conn:
+        # Availability reflects the active loans handed out above
+        conn.executemany('UPDATE books SET available_copies = ? WHERE id = ?',
+                         ((c, n + 1) for n, c in enumerate(copies) if c != total_copies[n]))
+        if has_fts:
+            conn.execute('DELETE FROM books_fts_pause')
+            conn.execute("INSERT INTO books_fts (books_fts) VALUES ('rebuild')")
+    conn.execute('ANALYZE')
+    params = {'books': books, 'patrons': patrons, 'loans': loans, 'seed': seed,
+              'anchor': anchor.isoformat(), **stats}
+    with conn:
+        conn.execute('CREATE TABLE bench_meta (key TEXT PRIMARY KEY, value TEXT)')
+        conn.execute('INSERT INTO bench_meta VALUES (?, ?)', ('params', json.dumps(params)))
+    conn.close()
+    return params
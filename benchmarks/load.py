@@ -0,0 +1,302 @@
+"""
+HTTP load harness for the Flask app.
+
+Replays a traffic file (JSON Lines, one request per line) against the app,
+either in-process through the WSGI test client or against a running server,
+and reports per-route latency percentiles, histograms and error rates.
+
+    python -m benchmarks.load --write-traffic traffic.jsonl --requests 5000
+    python -m benchmarks.load --traffic traffic.jsonl --concurrency 16 --requests 5000
+    python -m benchmarks.load --traffic traffic.jsonl --rate 200 --duration 30 --url http://127.0.0.1:5000
+
+A traffic line looks like {"method": "POST", "path": "/borrow",
+"form": {"patron_id": "100001", "book_id": "42"}}; "json" and "headers"
+are accepted too. Closed-loop mode (--concurrency) keeps N requests in
+flight; open-loop mode (--rate) starts requests on a fixed schedule and
+measures latency from the scheduled start, so queueing delay is counted.
+"""
+
+import argparse
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.metrics import Histogram
+
+# Default circulation mix: (route, weight)
+DEFAULT_MIX = (
+    ('catalog', 20), ('search', 10), ('api_search', 20),
+    ('borrow', 15), ('return', 15), ('api_late_fee', 20),
+)
+_TERMS = ('river', 'night', 'garden', 'silent', 'empire', 'shadow', 'crown', 'glass',
+          'gatsby', 'orwell', 'harper')
+
+def generate_traffic(count: int, books: int, patrons: int, seed: int = 327,
+                     mix=DEFAULT_MIX) -> Iterator[Dict]:
+    """Yield count requests drawn from mix against book ids 1..books and patrons 100000+."""
+    rng = random.Random(seed)
+    routes = [route for route, _ in mix]
+    weights = [weight for _, weight in mix]
+    for _ in range(count):
+        route = rng.choices(routes, weights)[0]
+        patron = f'{100000 + rng.randrange(patrons):06d}'
+        book = rng.randint(1, books)
+        term = rng.choice(_TERMS)
+        if route == 'catalog':
+            yield {'method': 'GET', 'path': '/catalog'}
+        elif route == 'search':
+            yield {'method': 'GET', 'path': f'/search?q={term}&type=title'}
+        elif route == 'api_search':
+            field = rng.choice(['title', 'author'])
+            yield {'method': 'GET', 'path': f'/api/search?q={term}&type={field}&limit=20'}
+        elif route == 'borrow':
+            yield {'method': 'POST', 'path': '/borrow', 'form': {'patron_id': patron, 'book_id': str(book)}}
+        elif route == 'return':
+            yield {'method': 'POST', 'path': '/return', 'form': {'patron_id': patron, 'book_id': str(book)}}
+        else:
+            yield {'method': 'GET', 'path': f'/api/late_fee/{patron}/{book}'}
+
+def read_traffic(path: str) -> List[Dict]:
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def route_name(path: str) -> str:
+    """Group a request path by route: /api/late_fee/123456/1 -> /api/late_fee."""
+    parts = [p for p in urllib.parse.urlsplit(path).path.split('/') if p]
+    if not parts:
+        return '/'
+    if parts[0] == 'api' and len(parts) > 1:
+        return f'/api/{parts[1]}'
+    return f'/{parts[0]}'
+
+class _Target:
+    # Sends one traffic entry and returns its HTTP status code.
+    def send(self, entry: Dict) -> int:
+        raise NotImplementedError
+
+class WSGITarget(_Target):
+    # Drives create_app() in-process; one test client per worker thread.
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def send(self, entry: Dict) -> int:
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(entry['path'], method=entry.get('method', 'GET'),
+                               data=entry.get('form'), json=entry.get('json'),
+                               headers=entry.get('headers'))
+        response.close()
+        return response.status_code
+
+class HTTPTarget(_Target):
+    # Sends real HTTP requests to a running server with the standard library.
+    def __init__(self, base_url: str, timeout: float = 30.0):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def send(self, entry: Dict) -> int:
+        headers = dict(entry.get('headers') or {})
+        body = None
+        if entry.get('json') is not None:
+            body = json.dumps(entry['json']).encode()
+            headers['Content-Type'] = 'application/json'
+        elif entry.get('form') is not None:
+            body = urllib.parse.urlencode(entry['form']).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        request = urllib.request.Request(self.base_url + entry['path'], data=body, headers=headers,
+                                         method=entry.get('method', 'GET'))
+        try:
+            with _NoRedirect.opener.open(request, timeout=self.timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as exc:
+            return exc.code
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Report 302s (e.g. after /borrow) instead of following them, like the test client
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+_NoRedirect.opener = urllib.request.build_opener(_NoRedirect)
+
+class Recorder:
+    # Thread-safe per-route latency samples, histograms and status counts.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.histograms: Dict[str, Histogram] = defaultdict(Histogram)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, route: str, latency: float, status: str):
+        with self._lock:
+            self.samples[route].append(latency)
+            self.histograms[route].observe(latency)
+            self.statuses[route][status] += 1
+
+    def report(self, elapsed: float) -> Dict:
+        routes = {}
+        all_samples: List[float] = []
+        errors = 0
+        with self._lock:
+            for route in sorted(self.samples):
+                samples = sorted(self.samples[route])
+                all_samples.extend(samples)
+                statuses = dict(self.statuses[route])
+                route_errors = sum(n for s, n in statuses.items() if s == 'error' or s.startswith('5'))
+                errors += route_errors
+                routes[route] = {
+                    'requests': len(samples),
+                    **_percentiles(samples),
+                    'error_rate': round(route_errors / len(samples), 4),
+                    'statuses': statuses,
+                    'histogram': self.histograms[route].snapshot()['buckets'],
+                }
+        total = len(all_samples)
+        return {
+            'requests': total,
+            'elapsed_sec': round(elapsed, 3),
+            'throughput_rps': round(total / elapsed, 1) if elapsed else None,
+            'error_rate': round(errors / total, 4) if total else 0.0,
+            **_percentiles(sorted(all_samples)),
+            'routes': routes,
+        }
+
+def _percentiles(samples: List[float]) -> Dict:
+    if not samples:
+        return {}
+
+    def pct(q: float) -> float:
+        return round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 3)
+
+    return {'p50_ms': pct(0.50), 'p90_ms': pct(0.90), 'p99_ms': pct(0.99),
+            'max_ms': round(samples[-1] * 1000, 3)}
+
+def _send(target: _Target, entry: Dict, started: float, recorder: Recorder):
+    try:
+        status = str(target.send(entry))
+    except Exception:
+        status = 'error'
+    recorder.record(route_name(entry['path']), time.perf_counter() - started, status)
+
+def run_closed_loop(target: _Target, traffic: List[Dict], concurrency: int,
+                    requests: Optional[int], duration: Optional[float]) -> Dict:
+    """Keep `concurrency` requests in flight until `requests` are sent or `duration` passes."""
+    recorder = Recorder()
+    entries = itertools.cycle(traffic)
+    if requests:
+        entries = itertools.islice(entries, requests)
+    lock = threading.Lock()
+    started = time.perf_counter()
+    stop_at = started + duration if duration else None
+
+    def worker():
+        while True:
+            with lock:
+                entry = next(entries, None)
+            if entry is None or (stop_at and time.perf_counter() >= stop_at):
+                return
+            _send(target, entry, time.perf_counter(), recorder)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return recorder.report(time.perf_counter() - started)
+
+def run_open_loop(target: _Target, traffic: List[Dict], rate: float, requests: Optional[int],
+                  duration: Optional[float], max_in_flight: int) -> Dict:
+    """Start requests at `rate` per second whether or not earlier ones have finished."""
+    recorder = Recorder()
+    total = requests or int(rate * (duration or 10))
+    entries = itertools.islice(itertools.cycle(traffic), total)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        for i, entry in enumerate(entries):
+            scheduled = started + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            # Latency counts from the scheduled start, including any wait for a free worker
+            pool.submit(_send, target, entry, scheduled, recorder)
+    return recorder.report(time.perf_counter() - started)
+
+def _make_wsgi_target(db_path: Optional[str]) -> Tuple[_Target, Callable[[], None]]:
+    from app import database
+    from app.__main__ import create_app
+    return WSGITarget(create_app(config={'DATABASE': db_path} if db_path else None)), database.close_pools
+
+def _print_summary(report: Dict):
+    print(f"{report['requests']} requests in {report['elapsed_sec']}s "
+          f"({report['throughput_rps']} req/s), error rate {report['error_rate']:.2%}", file=sys.stderr)
+    print(f"{'route':18} {'reqs':>7} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'errors':>8}", file=sys.stderr)
+    for route, r in report['routes'].items():
+        print(f"{route:18} {r['requests']:7} {r['p50_ms']:9.2f} {r['p90_ms']:9.2f} "
+              f"{r['p99_ms']:9.2f} {r['error_rate']:8.2%}", file=sys.stderr)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--traffic', help='Traffic file (JSON Lines); default: generated mix')
+    parser.add_argument('--write-traffic', metavar='PATH', help='Write the generated mix to PATH and exit')
+    parser.add_argument('--books', type=int, default=3, help='Book ids used by the generated mix')
+    parser.add_argument('--patrons', type=int, default=50, help='Patrons used by the generated mix')
+    parser.add_argument('--seed', type=int, default=327)
+    parser.add_argument('--url', help='Base URL of a running server (default: in-process WSGI)')
+    parser.add_argument('--db', help='Database for the in-process app (e.g. a benchmarks/data file)')
+    parser.add_argument('--concurrency', type=int, default=8, help='Closed loop: requests in flight')
+    parser.add_argument('--rate', type=float, help='Open loop: requests started per second')
+    parser.add_argument('--max-in-flight', type=int, default=256, help='Open loop: worker threads')
+    parser.add_argument('--requests', type=int, help='Total requests to send')
+    parser.add_argument('--duration', type=float, help='Seconds to run (closed loop) or schedule (open loop)')
+    parser.add_argument('--output', help='Write the JSON report here')
+    args = parser.parse_args(argv)
+
+    count = args.requests or 1000
+    if args.write_traffic:
+        with open(args.write_traffic, 'w', encoding='utf-8') as f:
+            for entry in generate_traffic(count, args.books, args.patrons, args.seed):
+                f.write(json.dumps(entry) + '\n')
+        return 0
+    traffic = (read_traffic(args.traffic) if args.traffic
+               else list(generate_traffic(count, args.books, args.patrons, args.seed)))
+    if not traffic:
+        parser.error('traffic file is empty')
+    if not args.requests and not args.duration:
+        args.requests = len(traffic)
+
+    close = lambda: None
+    if args.url:
+        target: _Target = HTTPTarget(args.url)
+    else:
+        target, close = _make_wsgi_target(args.db)
+    try:
+        if args.rate:
+            report = run_open_loop(target, traffic, args.rate, args.requests, args.duration,
+                                   args.max_in_flight)
+        else:
+            report = run_closed_loop(target, traffic, args.concurrency, args.requests, args.duration)
+    finally:
+        close()
+    report['mode'] = (f'open loop, {args.rate:g} req/s' if args.rate
+                      else f'closed loop, concurrency {args.concurrency}')
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    _print_summary(report)
+    return 1 if report['error_rate'] > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,223 @@
+"""
+Service-layer benchmark runner.
+
+Times the hot service functions against a synthetic database and writes
+the results as JSON. With --compare, fails (exit code 1) if any scenario's
+median latency regressed by more than --threshold against a baseline file.
+
+    python -m benchmarks.run --size small --output bench.json
+    python -m benchmarks.run --size small --compare bench.json --threshold 0.3
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from app import database
+from app.services import library_service
+from .datagen import SIZES, generate_database, read_meta
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, timeout=5, check=True).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def _summarize(samples: List[float]) -> Dict:
+    samples = sorted(samples)
+    count = len(samples)
+    total = sum(samples)
+
+    def pct(q: float) -> float:
+        return samples[min(count - 1, int(q * count))]
+
+    return {
+        'calls': count,
+        'mean_ms': round(total / count * 1000, 4),
+        'p50_ms': round(statistics.median(samples) * 1000, 4),
+        'p95_ms': round(pct(0.95) * 1000, 4),
+        'p99_ms': round(pct(0.99) * 1000, 4),
+        'max_ms': round(samples[-1] * 1000, 4),
+        'ops_per_sec': round(count / total, 1) if total else None,
+    }
+
+def _time_calls(calls: List[Callable[[], object]], warmup: int) -> Dict:
+    for call in calls[:warmup]:
+        call()
+    samples = []
+    for call in calls:
+        started = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - started)
+    return _summarize(samples)
+
+def _sample_active_loans(path: str, count: int, rng: random.Random) -> List[tuple]:
+    conn = sqlite3.connect(path)
+    try:
+        max_id = conn.execute('SELECT MAX(id) FROM borrow_records').fetchone()[0] or 0
+        rows = conn.execute('''
+            SELECT patron_id, book_id FROM borrow_records
+            WHERE return_date IS NULL AND id >= ? LIMIT ?
+        ''', (rng.randint(1, max(1, max_id // 2)), count)).fetchall()
+    finally:
+        conn.close()
+    return rows
+
+def _free_books(path: str, count: int) -> List[int]:
+    conn = sqlite3.connect(path)
+    try:
+        return [row[0] for row in conn.execute(
+            'SELECT id FROM books WHERE available_copies > 0 ORDER BY id LIMIT ?', (count,))]
+    finally:
+        conn.close()
+
+def run_scenarios(path: str, params: Dict, iterations: int, seed: int, warmup: int = 10) -> Dict:
+    """Run every scenario against the database at path and return per-scenario timings."""
+    rng = random.Random(seed)
+    words = ['river', 'night', 'garden', 'silent', 'empire', 'shadow', 'crown', 'glass']
+    patrons = params['patrons']
+    results = {}
+
+    search_terms = [rng.choice(words) for _ in range(iterations)]
+    results['search_title_fts'] = _time_calls(
+        [lambda t=t: library_service.search_books_in_catalog(t, 'title', limit=50) for t in search_terms],
+        warmup)
+    results['search_author_prefix'] = _time_calls(
+        [lambda t=t: library_service.search_books_in_catalog(t, 'author', mode='prefix', limit=50)
+         for t in (rng.choice(['Ada', 'Ben', 'Cara', 'Dev', 'Iris']) for _ in range(iterations))],
+        warmup)
+    results['search_isbn'] = _time_calls(
+        [lambda n=n: library_service.search_books_in_catalog(f'978{n:010d}', 'isbn')
+         for n in (rng.randrange(params['books']) for _ in range(iterations))], warmup)
+
+    report_patrons = [f'{100000 + rng.randrange(patrons):06d}' for _ in range(iterations)]
+    results['patron_status_report'] = _time_calls(
+        [lambda p=p: library_service.get_patron_status_report(p) for p in report_patrons], warmup)
+
+    loans = _sample_active_loans(path, iterations, rng)
+    if loans:
+        results['calculate_late_fee'] = _time_calls(
+            [lambda p=p, b=b: library_service.calculate_late_fee_for_book(p, b) for p, b in loans],
+            warmup)
+
+    # Borrow then return the same (patron, book) pairs so the data is unchanged afterwards.
+    # Patron ids above the generated range start with no loans.
+    books = _free_books(path, iterations)
+    pairs = [(f'{100000 + patrons + i // 4:06d}', book) for i, book in enumerate(books)]
+    if pairs:
+        results['borrow_book'] = _time_calls(
+            [lambda p=p, b=b: library_service.borrow_book_by_patron(p, b) for p, b in pairs], 0)
+        results['return_book'] = _time_calls(
+            [lambda p=p, b=b: library_service.return_book_by_patron(p, b) for p, b in pairs], 0)
+    return results
+
+def compare(current: Dict, baseline: Dict, threshold: float, metric: str = 'p50_ms') -> List[str]:
+    """List the scenarios whose metric grew by more than threshold (0.2 = 20%) over baseline."""
+    regressions = []
+    for name, result in current['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if not before or not before.get(metric):
+            continue
+        change = result[metric] / before[metric] - 1
+        if change > threshold:
+            regressions.append(f'{name}: {metric} {before[metric]} -> {result[metric]} (+{change:.0%})')
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', choices=sorted(SIZES), default='small',
+                        help='Named dataset size (books/patrons/loans)')
+    parser.add_argument('--books', type=int, help='Override the number of books')
+    parser.add_argument('--patrons', type=int, help='Override the number of patrons')
+    parser.add_argument('--loans', type=int, help='Override the number of loans')
+    parser.add_argument('--seed', type=int, default=327, help='Data and workload seed')
+    parser.add_argument('--db', help='Benchmark database path (default: benchmarks/data/<size>.db)')
+    parser.add_argument('--regenerate', action='store_true', help='Rebuild the database even if it matches')
+    parser.add_argument('--iterations', type=int, default=500, help='Calls per scenario')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs per scenario; the run with the lowest median is kept')
+    parser.add_argument('--output', help='Write results JSON here (default: stdout)')
+    parser.add_argument('--compare', metavar='BASELINE', help='Baseline results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed median slowdown before a scenario counts as a regression')
+    args = parser.parse_args(argv)
+
+    books, patrons, loans = SIZES[args.size]
+    books = args.books or books
+    patrons = args.patrons or patrons
+    loans = args.loans or loans
+    path = args.db or os.path.join(os.path.dirname(__file__), 'data', f'{args.size}-{args.seed}.db')
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    params = read_meta(path) if os.path.exists(path) else None
+    wanted = {'books': books, 'patrons': patrons, 'loans': loans, 'seed': args.seed,
+              'anchor': datetime.now().date().isoformat()}
+    if args.regenerate or not params or any(params.get(k) != v for k, v in wanted.items()):
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        started = time.perf_counter()
+        params = generate_database(path, books, patrons, loans, args.seed)
+        print(f'Generated {path} in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+
+    database.DATABASE = path
+    database.init_database()
+    try:
+        # Best-of-N medians keep one noisy run from reading as a regression
+        results: Dict[str, Dict] = {}
+        for _ in range(max(1, args.repeat)):
+            for name, result in run_scenarios(path, params, args.iterations, args.seed).items():
+                if name not in results or result['p50_ms'] < results[name]['p50_ms']:
+                    results[name] = result
+    finally:
+        database.close_pools()
+
+    report = {
+        'meta': {
+            'dataset': params,
+            'iterations': args.iterations,
+            'repeat': args.repeat,
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    for name, result in results.items():
+        print(f"{name:24} p50 {result['p50_ms']:9.3f} ms   p95 {result['p95_ms']:9.3f} ms   "
+              f"{result['ops_per_sec']:>10} ops/s", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('meta', {}).get('dataset', {}).get('books') != params['books']:
+            print('Warning: baseline was run on a different dataset size', file=sys.stderr)
+        regressions = compare(report, baseline, args.threshold)
+        for line in regressions:
+            print(f'REGRESSION {line}', file=sys.stderr)
+        if regressions:
+            return 1
+        print(f'No regressions above {args.threshold:.0%}', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""
+Cold-start benchmark.
+
+Starts fresh Python processes that import the app under -X importtime,
+build it with create_app() and serve one first request per route, and
+reports the median import, create_app and time-to-first-request latencies
+plus the modules that cost the most to import. With --compare, fails
+(exit code 1) on a median slowdown above --threshold, like benchmarks.run.
+
+    python -m benchmarks.startup --runs 10 --output startup.json
+    python -m benchmarks.startup --profile production --template-cache --compare startup.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from .run import _git_commit, compare
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# First request per route, in this order, in every process
+ROUTES = ('/api/books?limit=20', '/catalog', '/search?q=startup&type=title')
+
+# Runs in the child process; prints one JSON line of timings
+_CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+from app.__main__ import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+client = app.test_client()
+first = {}
+for path in sys.argv[1:]:
+    t = time.perf_counter()
+    status = client.get(path).status_code
+    first[path] = ((time.perf_counter() - t) * 1000, status)
+print(json.dumps({"import_ms": (imported - started) * 1000, "create_app_ms": (created - imported) * 1000,
+                  "first_request": first}))
+'''
+
+def parse_importtime(stderr: str) -> Dict[str, Tuple[int, int]]:
+    """Map module name -> (self us, cumulative us) from -X importtime output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+def run_once(env: Dict[str, str]) -> Tuple[Dict, Dict[str, Tuple[int, int]]]:
+    """Start one process; returns its timings and import-time table."""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', _CHILD, *ROUTES],
+                          cwd=ROOT, env=env, capture_output=True, text=True, timeout=120)
+    if proc.returncode != 0:
+        raise RuntimeError(f'startup process failed:\n{proc.stderr[-2000:]}')
+    return json.loads(proc.stdout.strip().splitlines()[-1]), parse_importtime(proc.stderr)
+
+def _median(samples: List[float]) -> Dict:
+    return {'p50_ms': round(statistics.median(samples), 2), 'min_ms': round(min(samples), 2),
+            'max_ms': round(max(samples), 2), 'runs': len(samples)}
+
+def run_startup(env: Dict[str, str], runs: int, warmup: int = 1, top: int = 15) -> Dict:
+    """Time runs fresh processes after warmup discarded ones (which also migrate a new database)."""
+    timings = []
+    imports: Dict[str, List[Tuple[int, int]]] = {}
+    for i in range(warmup + runs):
+        result, modules = run_once(env)
+        if i < warmup:
+            continue
+        timings.append(result)
+        for name, times in modules.items():
+            imports.setdefault(name, []).append(times)
+    results = {
+        'import': _median([t['import_ms'] for t in timings]),
+        'create_app': _median([t['create_app_ms'] for t in timings]),
+    }
+    for path in ROUTES:
+        results[f'first_request {path}'] = _median([t['first_request'][path][0] for t in timings])
+    results['ready'] = _median([t['import_ms'] + t['create_app_ms'] + t['first_request'][ROUTES[0]][0]
+                                for t in timings])
+    self_ms = {name: statistics.median(s for s, _ in times) / 1000 for name, times in imports.items()}
+    app_modules = [name for name in self_ms if name == 'app' or name.startswith('app.')]
+    return {
+        'results': results,
+        'imports': {
+            'app_self_ms': round(sum(self_ms[name] for name in app_modules), 2),
+            'slowest_self_ms': {name: round(ms, 2) for name, ms in
+                                sorted(self_ms.items(), key=lambda item: -item[1])[:top]},
+            'slowest_app_cumulative_ms': {
+                name: round(statistics.median(c for _, c in imports[name]) / 1000, 2)
+                for name in sorted(app_modules, key=lambda n: -statistics.median(c for _, c in imports[n]))[:top]
+            },
+        },
+    }
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--profile', default='production', help='LIBRARY_PROFILE for the started processes')
+    parser.add_argument('--db', help='Database to start against (default: a new temporary database)')
+    parser.add_argument('--runs', type=int, default=10, help='Measured process starts')
+    parser.add_argument('--warmup', type=int, default=1, help='Discarded starts before measuring')
+    parser.add_argument('--template-cache', action='store_true',
+                        help='Share a compiled-template cache between starts (LIBRARY_TEMPLATE_CACHE_DIR)')
+    parser.add_argument('--output', help='Write results JSON here (default: stdout)')
+    parser.add_argument('--compare', metavar='BASELINE', help='Baseline results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed median slowdown before a measurement counts as a regression')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        env = dict(os.environ, LIBRARY_PROFILE=args.profile,
+                   LIBRARY_DB_PATH=args.db or os.path.join(scratch, 'startup.db'),
+                   PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])))
+        if not args.db:
+            # A new database must be migrated once before a check-only profile can start on it
+            env['LIBRARY_MIGRATE_ON_START'] = 'true'
+            subprocess.run([sys.executable, '-m', 'app.migrations'], cwd=ROOT, env=env,
+                           capture_output=True, check=True, timeout=120)
+            del env['LIBRARY_MIGRATE_ON_START']
+        if args.template_cache:
+            env['LIBRARY_TEMPLATE_CACHE_DIR'] = os.path.join(scratch, 'templates')
+        report = run_startup(env, args.runs, args.warmup)
+
+    report['meta'] = {
+        'profile': args.profile,
+        'template_cache': args.template_cache,
+        'runs': args.runs,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    for name, result in report['results'].items():
+        print(f"{name:40} p50 {result['p50_ms']:9.2f} ms   min {result['min_ms']:9.2f} ms", file=sys.stderr)
+    print(f"app modules (self): {report['imports']['app_self_ms']:.2f} ms", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        for line in regressions:
+            print(f'REGRESSION {line}', file=sys.stderr)
+        if regressions:
+            return 1
+        print(f'No regressions above {args.threshold:.0%}', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,12 @@
+import pytest
+import database
+
+@pytest.fixture
+def library_db(tmp_path, monkeypatch):
+    """Fresh migrated database with an empty book cache; pools closed afterwards."""
+    path = str(tmp_path / "library.db")
+    monkeypatch.setattr(database, "DATABASE", path)
+    database.init_database()
+    database.clear_book_cache()
+    yield path
+    database.close_pools()
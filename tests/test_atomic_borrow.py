@@ -0,0 +1,38 @@
+import threading
+import database
+from services.library_service import borrow_book_by_patron, MAX_LOAN_LIMIT
+
+def test_borrow_decrements_and_records_in_one_step(library_db):
+    database.insert_book("Atomic Book", "A. Author", "9781000000001", 2, 2)
+    book_id = database.get_book_by_isbn("9781000000001")["id"]
+    success, message = borrow_book_by_patron("123456", book_id)
+    assert success is True
+    assert "Atomic Book" in message
+    assert database.get_book_by_id(book_id)["available_copies"] == 1
+    assert database.get_patron_borrow_count("123456") == 1
+
+def test_concurrent_borrows_never_oversell(library_db):
+    """Many patrons racing for the last copies get exactly as many loans as copies."""
+    database.insert_book("Popular Book", "P. Author", "9781000000002", 3, 3)
+    book_id = database.get_book_by_isbn("9781000000002")["id"]
+    results = []
+    def borrow(patron_id):
+        results.append(borrow_book_by_patron(patron_id, book_id)[0])
+    threads = [threading.Thread(target=borrow, args=(f"{200000 + i}",)) for i in range(12)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count(True) == 3
+    assert database.get_book_by_id(book_id)["available_copies"] == 0
+
+def test_loan_limit_leaves_availability_untouched(library_db):
+    for i in range(MAX_LOAN_LIMIT + 1):
+        database.insert_book(f"Limit Book {i}", "L. Author", f"978200000000{i}", 1, 1)
+    ids = [database.get_book_by_isbn(f"978200000000{i}")["id"] for i in range(MAX_LOAN_LIMIT + 1)]
+    for book_id in ids[:MAX_LOAN_LIMIT]:
+        assert borrow_book_by_patron("654321", book_id)[0] is True
+    success, message = borrow_book_by_patron("654321", ids[-1])
+    assert success is False
+    assert "maximum borrowing limit" in message
+    assert database.get_book_by_id(ids[-1])["available_copies"] == 1
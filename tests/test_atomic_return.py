@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+import pytest
+import database
+from services.library_service import borrow_book_by_patron, return_book_by_patron, compute_late_fee
+
+@pytest.fixture
+def return_db(library_db):
+    """Fresh migrated database with one book borrowed by patron 123456."""
+    database.insert_book("Return Book", "R. Author", "9781000000010", 2, 2)
+    book_id = database.get_book_by_isbn("9781000000010")["id"]
+    borrow_book_by_patron("123456", book_id)
+    return book_id
+
+def test_return_restores_copy_and_stamps_loan(return_db):
+    success, message = return_book_by_patron("123456", return_db)
+    assert success is True
+    assert "no late fee" in message.lower()
+    assert database.get_book_by_id(return_db)["available_copies"] == 2
+    assert database.get_patron_borrow_count("123456") == 0
+
+def test_second_return_reports_not_borrowed(return_db):
+    return_book_by_patron("123456", return_db)
+    success, message = return_book_by_patron("123456", return_db)
+    assert success is False
+    assert "not borrowed" in message.lower()
+    assert database.get_book_by_id(return_db)["available_copies"] == 2
+
+def test_overdue_return_reports_fee(return_db):
+    overdue = (datetime.now() - timedelta(days=10)).isoformat()
+    conn = database.get_db_connection()
+    conn.execute("UPDATE borrow_records SET due_date = ? WHERE book_id = ?", (overdue, return_db))
+    conn.commit()
+    conn.close()
+    success, message = return_book_by_patron("123456", return_db)
+    assert success is True
+    assert "late fee: $6.50" in message.lower()
+
+def test_return_date_update_reports_rows_affected(return_db):
+    assert database.update_borrow_record_return_date("123456", return_db, datetime.now()) == 1
+    assert database.update_borrow_record_return_date("123456", return_db, datetime.now()) == 0
+
+def test_compute_late_fee_tiers_and_cap():
+    today = datetime(2025, 3, 31, 12, 0)
+    assert compute_late_fee(today - timedelta(days=3), today)["fee_amount"] == 1.50
+    assert compute_late_fee(today - timedelta(days=10), today)["fee_amount"] == 6.50
+    assert compute_late_fee(today - timedelta(days=40), today)["fee_amount"] == 15.00
+    assert compute_late_fee(today + timedelta(days=2), today) == {"fee_amount": 0.0, "days_overdue": 0}
@@ -0,0 +1,52 @@
+import pytest
+import database
+from datetime import datetime, timedelta
+from services.library_service import (
+    borrow_books_by_patron, return_books_by_patron, MAX_LOAN_LIMIT, MAX_BATCH_SIZE
+)
+
+@pytest.fixture
+def batch_db(library_db):
+    """Fresh migrated database with MAX_LOAN_LIMIT + 2 single-copy books."""
+    ids = []
+    for i in range(MAX_LOAN_LIMIT + 2):
+        database.insert_book(f"Batch Book {i}", "B. Author", f"978700000000{i}", 1, 1)
+        ids.append(database.get_book_by_isbn(f"978700000000{i}")["id"])
+    return ids
+
+def test_batch_borrow_applies_limit_across_batch(batch_db):
+    result = borrow_books_by_patron("123456", batch_db)
+    assert result["status"] == "OK"
+    assert result["borrowed"] == MAX_LOAN_LIMIT
+    assert [item["success"] for item in result["items"]] == [True] * MAX_LOAN_LIMIT + [False, False]
+    assert "maximum borrowing limit" in result["items"][-1]["message"]
+    assert database.get_patron_borrow_count("123456") == MAX_LOAN_LIMIT
+    assert database.get_book_by_id(batch_db[-1])["available_copies"] == 1
+
+def test_batch_borrow_reports_each_failure(batch_db):
+    result = borrow_books_by_patron("123456", [batch_db[0], batch_db[0], 999999, "x"])
+    messages = [item["message"] for item in result["items"]]
+    assert result["items"][0]["success"] is True
+    assert messages[1:] == ["This book is currently not available.", "Book not found.", "Invalid book ID."]
+
+def test_batch_rejects_bad_requests(batch_db):
+    assert borrow_books_by_patron("12", batch_db)["status"].startswith("Invalid patron ID")
+    assert return_books_by_patron("123456", [])["status"] == "book_ids must be a non-empty list."
+    assert "At most" in borrow_books_by_patron("123456", [1] * (MAX_BATCH_SIZE + 1))["status"]
+
+def test_batch_return_with_fees(batch_db):
+    borrow_books_by_patron("123456", batch_db[:2])
+    # Make the first loan ten days overdue
+    conn = database.get_db_connection()
+    conn.execute("UPDATE borrow_records SET due_date = ? WHERE book_id = ?",
+                 ((datetime.now() - timedelta(days=10)).isoformat(), batch_db[0]))
+    conn.commit()
+    conn.close()
+    result = return_books_by_patron("123456", [batch_db[0], batch_db[1], batch_db[2]])
+    assert result["returned"] == 2
+    assert result["items"][0]["fee_amount"] == 6.50
+    assert result["items"][1]["fee_amount"] == 0.0
+    assert result["items"][2]["message"] == "No record found: this book was not borrowed by the patron."
+    assert result["total_fee"] == 6.50
+    assert database.get_patron_borrow_count("123456") == 0
+    assert database.get_book_by_id(batch_db[0])["available_copies"] == 1
@@ -0,0 +1,46 @@
+import pytest
+import database
+from cache import LRUCache, MISSING
+from services.library_service import borrow_book_by_patron, return_book_by_patron
+
+@pytest.fixture
+def cache_db(library_db):
+    """Fresh database with one book and an empty book cache."""
+    database.insert_book("Cached Book", "C. Author", "9785000000001", 2, 2)
+    return database.get_book_by_isbn("9785000000001")["id"]
+
+def test_repeated_lookups_hit_cache(cache_db):
+    before = database.get_book_cache_stats()["hits"]
+    for _ in range(3):
+        assert database.get_book_by_id(cache_db)["title"] == "Cached Book"
+    assert database.get_book_cache_stats()["hits"] - before >= 2
+
+def test_availability_update_invalidates(cache_db):
+    database.get_book_by_id(cache_db)
+    database.update_book_availability(cache_db, -1)
+    assert database.get_book_by_id(cache_db)["available_copies"] == 1
+
+def test_borrow_and_return_invalidate(cache_db):
+    database.get_book_by_id(cache_db)
+    borrow_book_by_patron("123456", cache_db)
+    assert database.get_book_by_isbn("9785000000001")["available_copies"] == 1
+    return_book_by_patron("123456", cache_db)
+    assert database.get_book_by_id(cache_db)["available_copies"] == 2
+
+def test_callers_cannot_mutate_cached_row(cache_db):
+    book = database.get_book_by_id(cache_db)
+    book["title"] = "Changed"
+    assert database.get_book_by_id(cache_db)["title"] == "Cached Book"
+
+def test_lru_evicts_and_rejects_stale_writes():
+    cache = LRUCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is MISSING
+    generation = cache.generation
+    cache.invalidate("a")
+    assert cache.set_if_current("a", 99, generation) is False
+    assert cache.get("a") is MISSING
+    assert cache.stats()["evictions"] == 1
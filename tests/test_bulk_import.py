@@ -0,0 +1,52 @@
+import io
+import pytest
+import database
+from services.import_service import import_books
+from services.library_service import search_books_in_catalog
+
+@pytest.fixture
+def import_db(library_db):
+    """Fresh migrated database with one existing book."""
+    database.insert_book("Existing Book", "E. Author", "9786000000001", 1, 1)
+
+def test_csv_import_reports_row_errors(import_db):
+    data = io.StringIO(
+        "title,author,isbn,total_copies\n"
+        "Imported One,I. Author,9786000000002,2\n"
+        ",No Title,9786000000003,1\n"
+        "Short Isbn,S. Author,123,1\n"
+        "Existing Again,E. Author,9786000000001,1\n"
+        "Imported One Again,I. Author,9786000000002,1\n"
+        "Zero Copies,Z. Author,9786000000004,0\n"
+    )
+    report = import_books(data, "csv")
+    assert report["rows"] == 6
+    assert report["imported"] == 1
+    errors = {e["line"]: e["error"] for e in report["errors"]}
+    assert errors[3] == "Title is required."
+    assert errors[4] == "ISBN must be exactly 13 digits."
+    assert "already exists" in errors[5]
+    assert "Duplicate ISBN" in errors[6]
+    assert errors[7] == "Total copies must be a positive integer."
+    assert database.get_book_by_isbn("9786000000002")["available_copies"] == 2
+
+def test_jsonl_import_across_chunks(import_db):
+    lines = [f'{{"title": "Chunk Book {i}", "author": "C. Author", "isbn": "97860000001{i:02d}", "total_copies": 1}}'
+             for i in range(5)]
+    lines.append(lines[0])  # duplicate that lands in a later chunk
+    lines.append("not json")
+    report = import_books(io.StringIO("\n".join(lines)), "jsonl", chunk_size=2)
+    assert report["imported"] == 5
+    assert report["error_count"] == 2
+
+def test_bulk_imported_books_are_searchable(import_db):
+    data = io.StringIO("title,author,isbn,total_copies\nQuasar Atlas,Q. Author,9786000000099,1\n")
+    import_books(data, "csv")
+    assert [b["title"] for b in search_books_in_catalog("quasar", "title")] == ["Quasar Atlas"]
+    # Per-row indexing is active again for ordinary inserts
+    database.insert_book("Quasar Guide", "Q. Author", "9786000000098", 1, 1)
+    assert len(search_books_in_catalog("quasar", "title")) == 2
+
+def test_unsupported_format(import_db):
+    report = import_books(io.StringIO(""), "xml")
+    assert report["status"] == "Unsupported format: xml"
@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+import pytest
+import database
+from services.library_service import compute_late_fee, late_fee_for_days, borrow_book_by_patron
+from services.late_fee_service import late_fees_for_days, calculate_late_fees_bulk, calculate_overdue_fees
+
+def test_bulk_fees_match_scalar_for_every_day_count():
+    days = list(range(0, 400)) + [-3, 10000, 123456]
+    assert late_fees_for_days(days) == [late_fee_for_days(d) if d > 0 else 0.0 for d in days]
+
+def test_bulk_due_dates_match_compute_late_fee():
+    today = datetime(2025, 6, 1, 9, 30)
+    due_dates = [today - timedelta(days=d, hours=h) for d in range(-5, 40) for h in (0, 11)]
+    bulk = calculate_late_fees_bulk(due_dates, today)
+    for i, due in enumerate(due_dates):
+        scalar = compute_late_fee(due, today)
+        assert bulk["fee_amount"][i] == scalar["fee_amount"]
+        assert bulk["days_overdue"][i] == scalar["days_overdue"]
+
+@pytest.fixture
+def overdue_db(library_db):
+    """Fresh database with loans 3 and 30 days overdue for one patron, one on time for another."""
+    for i, (patron, days_late) in enumerate([("100001", 3), ("100001", 30), ("100002", -2)]):
+        database.insert_book(f"Fee Book {i}", "F. Author", f"978400000000{i}", 1, 1)
+        book_id = database.get_book_by_isbn(f"978400000000{i}")["id"]
+        borrow_book_by_patron(patron, book_id)
+        conn = database.get_db_connection()
+        conn.execute("UPDATE borrow_records SET due_date = ? WHERE book_id = ?",
+                     ((datetime.now() - timedelta(days=days_late)).isoformat(), book_id))
+        conn.commit()
+        conn.close()
+
+def test_overdue_sweep_totals_per_patron(overdue_db):
+    result = calculate_overdue_fees()
+    assert result["loan_count"] == 2
+    assert result["patron_totals"] == {"100001": 16.50}
+    assert result["total_fees"] == 16.50
+    assert sorted(loan["fee_amount"] for loan in result["loans"]) == [1.50, 15.00]
+
+def test_overdue_sweep_for_one_patron_without_loan_rows(overdue_db):
+    result = calculate_overdue_fees(patron_id="100002", include_loans=False)
+    assert result["loan_count"] == 0
+    assert "loans" not in result
@@ -0,0 +1,41 @@
+import pytest
+import database
+from services.library_service import get_catalog_page, decode_catalog_cursor
+
+@pytest.fixture
+def paged_db(library_db):
+    """Fresh database with five books, two sharing a title."""
+    for i, title in enumerate(["Echo", "Alpha", "Delta", "Bravo", "Bravo"]):
+        database.insert_book(title, "Author", f"978000000000{i}", 1, 1)
+
+def test_pages_walk_catalog_in_title_order(paged_db):
+    """Following next cursors visits every book exactly once in (title, id) order."""
+    seen = []
+    page = get_catalog_page(limit=2)
+    while True:
+        seen.extend((b["title"], b["id"]) for b in page["books"])
+        if not page["next_cursor"]:
+            break
+        page = get_catalog_page(after=page["next_cursor"], limit=2)
+    assert seen == sorted(seen)
+    assert len(seen) == 5
+
+def test_prev_cursor_returns_previous_page(paged_db):
+    """A prev cursor from the second page leads back to the first page."""
+    first = get_catalog_page(limit=2)
+    second = get_catalog_page(after=first["next_cursor"], limit=2)
+    back = get_catalog_page(before=second["prev_cursor"], limit=2)
+    assert [b["id"] for b in back["books"]] == [b["id"] for b in first["books"]]
+    assert first["prev_cursor"] is None
+    assert back["prev_cursor"] is None
+
+def test_invalid_cursor_is_reported(paged_db):
+    page = get_catalog_page(after="not-a-cursor")
+    assert page["status"] == "Invalid cursor"
+    assert page["books"] == []
+    assert decode_catalog_cursor("not-a-cursor") is None
+
+def test_page_size_is_capped(paged_db):
+    page = get_catalog_page(limit=10_000)
+    assert page["limit"] <= 200
+    assert len(page["books"]) == 5
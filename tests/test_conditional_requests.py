@@ -0,0 +1,69 @@
+import sqlite3
+from flask import Flask, flash, jsonify
+import database
+from routes.conditional import conditional
+
+def make_app(calls):
+    app = Flask(__name__)
+    app.secret_key = "test"
+
+    @app.route("/data")
+    @conditional()
+    def data():
+        calls.append(1)
+        return jsonify({"ok": True})
+
+    @app.route("/page")
+    @conditional(skip_with_flashes=True)
+    def page():
+        calls.append(1)
+        return "page"
+
+    @app.route("/flash")
+    def add_flash():
+        flash("hello")
+        return "flashed"
+
+    return app
+
+def test_matching_etag_returns_304_without_running_view(library_db):
+    calls = []
+    client = make_app(calls).test_client()
+    first = client.get("/data")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    second = client.get("/data", headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.headers["ETag"] == etag
+    assert len(calls) == 1
+
+def test_write_changes_etag(library_db):
+    calls = []
+    client = make_app(calls).test_client()
+    etag = client.get("/data").headers["ETag"]
+    database.insert_book("Versioned", "V. Author", "9789300000001", 1, 1)
+    response = client.get("/data", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+def test_outside_write_changes_etag(library_db):
+    """Writes that bypass the app (CLI imports, loaders) still invalidate cached pages."""
+    calls = []
+    client = make_app(calls).test_client()
+    etag = client.get("/data").headers["ETag"]
+    conn = sqlite3.connect(library_db)
+    conn.execute("INSERT INTO books (title, author, isbn, total_copies, available_copies) "
+                 "VALUES ('Imported', 'I. Author', '9789300000002', 1, 1)")
+    conn.commit()
+    conn.close()
+    response = client.get("/data", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+def test_pending_flash_messages_bypass_304(library_db):
+    calls = []
+    client = make_app(calls).test_client()
+    etag = client.get("/page").headers["ETag"]
+    client.get("/flash")
+    response = client.get("/page", headers={"If-None-Match": etag})
+    assert response.status_code == 200
@@ -0,0 +1,95 @@
+import sqlite3
+import pytest
+import database
+import migrations
+from config import load_config, DEFAULTS
+
+def test_profile_env_and_override_precedence():
+    settings = load_config('production', environ={'LIBRARY_CACHE_SIZE': '-1000',
+                                                  'LIBRARY_DB_PATH': '/data/library.db'})
+    assert settings['PROFILE'] == 'production'
+    assert settings['MMAP_SIZE'] == 268435456
+    assert settings['CACHE_SIZE'] == -1000
+    assert settings['DATABASE'] == '/data/library.db'
+    settings = load_config(environ={'LIBRARY_PROFILE': 'test'}, overrides={'SYNCHRONOUS': 'FULL'})
+    assert settings['PROFILE'] == 'test'
+    assert settings['SYNCHRONOUS'] == 'full'
+    assert load_config(environ={})['PROFILE'] == 'development'
+
+def test_invalid_settings_are_rejected():
+    with pytest.raises(ValueError):
+        load_config('staging', environ={})
+    with pytest.raises(ValueError):
+        load_config(environ={'LIBRARY_JOURNAL_MODE': 'fast'})
+    with pytest.raises(ValueError):
+        load_config(environ={'LIBRARY_MMAP_SIZE': 'lots'})
+
+@pytest.fixture
+def configured_db(tmp_path):
+    """Database configured through the production profile; defaults restored afterwards."""
+    database.configure(load_config('production', {'DATABASE': str(tmp_path / "wal.db")}, environ={}))
+    database.init_database()
+    yield str(tmp_path / "wal.db")
+    database.configure(dict(DEFAULTS))
+
+def test_pragmas_applied_to_pooled_connections(configured_db):
+    pragmas = database.get_connection_pragmas()
+    assert pragmas['journal_mode'] == 'wal'
+    assert pragmas['mmap_size'] == 268435456
+    assert pragmas['cache_size'] == -65536
+    assert pragmas['busy_timeout'] == 5000
+    assert database.get_pool_stats()['max_size'] == 16
+
+def test_wal_reads_proceed_during_a_write(configured_db):
+    database.insert_book("WAL Book", "W. Author", "9789000000001", 1, 1)
+    writer = sqlite3.connect(configured_db)
+    writer.execute("BEGIN EXCLUSIVE")
+    writer.execute("UPDATE books SET available_copies = 0")
+    try:
+        # Under a rollback journal an exclusive lock blocks every reader
+        books = database.get_all_books()
+        assert books[0]["available_copies"] == 1
+    finally:
+        writer.rollback()
+        writer.close()
+
+def test_startup_flags():
+    assert load_config('development', environ={})['SAMPLE_DATA'] is True
+    assert load_config('test', environ={})['SAMPLE_DATA'] is False
+    settings = load_config('production', environ={'LIBRARY_SAMPLE_DATA': 'yes'})
+    assert settings['SAMPLE_DATA'] is True and settings['MIGRATE_ON_START'] is False
+    with pytest.raises(ValueError):
+        load_config(environ={'LIBRARY_MIGRATE_ON_START': 'sometimes'})
+
+def test_check_only_start_rejects_old_schema(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    migrations._create_base_tables(conn)
+    conn.execute("PRAGMA user_version = 1")
+    conn.close()
+    database.configure(load_config('production', {'DATABASE': path}, environ={}))
+    try:
+        with pytest.raises(RuntimeError, match="app.migrations"):
+            database.init_database(migrate=False)
+        database.init_database()
+        database.init_database(migrate=False)
+    finally:
+        database.configure(dict(DEFAULTS))
+
+def test_first_connection_migrates_or_refuses_old_schema(tmp_path, monkeypatch):
+    path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(path)
+    migrations._create_base_tables(conn)
+    conn.close()
+    monkeypatch.setattr(database, "DATABASE", path)
+    try:
+        # Check-only settings: a library call fails loudly instead of "no such column"
+        monkeypatch.setattr(database, "MIGRATE_ON_START", False)
+        with pytest.raises(RuntimeError, match="app.migrations"):
+            database.get_patron_borrowed_books("123456")
+        monkeypatch.setattr(database, "MIGRATE_ON_START", True)
+        assert database.get_patron_borrowed_books("123456") == []
+        with database.db_session() as conn:
+            assert migrations.get_schema_version(conn) == migrations.LATEST_VERSION
+    finally:
+        database.close_pools()
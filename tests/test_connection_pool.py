@@ -0,0 +1,49 @@
+import pytest
+import database
+
+def test_pool_reuses_released_connection(tmp_path):
+    """A released connection is handed out again instead of opening a new one."""
+    pool = database.ConnectionPool(str(tmp_path / "pool.db"), max_size=2)
+    first = pool.acquire()
+    pool.release(first)
+    second = pool.acquire()
+    assert second is first
+    stats = pool.stats()
+    assert stats["created"] == 1
+    assert stats["acquired"] == 2
+    pool.release(second)
+    pool.close_all()
+
+def test_pool_is_bounded_and_times_out(tmp_path):
+    """When every connection is checked out, acquire waits and then fails."""
+    pool = database.ConnectionPool(str(tmp_path / "pool.db"), max_size=1, timeout=0.05)
+    conn = pool.acquire()
+    with pytest.raises(database.PoolTimeoutError):
+        pool.acquire()
+    assert pool.stats()["timeouts"] == 1
+    pool.release(conn)
+    pool.close_all()
+
+def test_release_discards_uncommitted_work(tmp_path):
+    """Uncommitted changes never leak to the next user of a pooled connection."""
+    pool = database.ConnectionPool(str(tmp_path / "pool.db"), max_size=1)
+    conn = pool.acquire()
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.commit()
+    conn.execute("INSERT INTO t VALUES (1)")
+    pool.release(conn)
+    conn = pool.acquire()
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+    pool.release(conn)
+    pool.close_all()
+
+def test_get_db_connection_close_returns_to_pool(library_db):
+    """Outside a request, closing a connection returns it to the shared pool."""
+    conn = database.get_db_connection()
+    conn.execute("SELECT 1")
+    conn.close()
+    conn = database.get_db_connection()
+    conn.close()
+    stats = database.get_pool_stats()
+    assert stats["created"] == 1
+    assert stats["in_use"] == 0
@@ -0,0 +1,57 @@
+import csv
+import io
+import json
+import pytest
+from flask import Flask, Response, stream_with_context
+import database
+from services.export_service import export_table, validate_export
+
+@pytest.fixture
+def export_db(library_db):
+    """Fresh migrated database with five books and loans across October."""
+    for i in range(5):
+        database.insert_book(f"Export Book {i}", "E. Author", f"978800000000{i}", 2, 2)
+    conn = database.get_db_connection()
+    conn.executemany(
+        "INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date) VALUES (?, ?, ?, ?)",
+        [("111111", 1, "2025-10-01T10:00:00", "2025-10-15T10:00:00"),
+         ("111111", 2, "2025-10-10T10:00:00", "2025-10-24T10:00:00"),
+         ("222222", 3, "2025-10-20T10:00:00", "2025-11-03T10:00:00")])
+    conn.commit()
+    conn.close()
+
+def test_ndjson_export_streams_in_chunks(export_db):
+    chunks = list(export_table("books", "ndjson", chunk_size=2))
+    assert len(chunks) == 3
+    rows = [json.loads(line) for chunk in chunks for line in chunk.splitlines()]
+    assert [row["isbn"] for row in rows] == [f"978800000000{i}" for i in range(5)]
+
+def test_streamed_export_holds_no_connection_between_chunks(export_db):
+    app = Flask(__name__)
+    database.init_app(app)
+
+    @app.route('/books')
+    def books():
+        return Response(stream_with_context(export_table("books", "ndjson", chunk_size=2)))
+
+    response = app.test_client().get('/books', buffered=False)
+    in_use = []
+    for _ in response.response:
+        # The client is still reading the body: no pooled connection is checked out
+        in_use.append(database.get_read_pool_stats()['in_use'])
+    response.close()
+    assert in_use == [0, 0, 0]
+
+def test_csv_export_with_filters(export_db):
+    text = "".join(export_table("borrow_records", "csv", since="2025-10-05", until="2025-10-20"))
+    rows = list(csv.DictReader(io.StringIO(text)))
+    assert [row["book_id"] for row in rows] == ["2", "3"]
+    text = "".join(export_table("borrow_records", "csv", patron_id="111111"))
+    assert [row["book_id"] for row in csv.DictReader(io.StringIO(text))] == ["1", "2"]
+
+def test_validate_export():
+    assert validate_export("books", "ndjson") is None
+    assert validate_export("patrons", "ndjson") == "Unknown table: patrons"
+    assert validate_export("books", "xml") == "Unsupported format: xml"
+    assert validate_export("books", "csv", patron_id="111111") == "Filters apply to borrow_records only."
+    assert validate_export("borrow_records", "csv", since="10/01/2025").startswith("Invalid date")
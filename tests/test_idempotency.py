@@ -0,0 +1,89 @@
+import threading
+import time
+import pytest
+import database
+from services import idempotency_service
+from services.idempotency_service import pay_late_fees_idempotent, refund_late_fee_payment_idempotent
+from services.payment_service import CircuitBreaker, ResilientPaymentGateway, StubPaymentGateway
+
+class CountingGateway(StubPaymentGateway):
+    """Stub gateway that hands out a new transaction id per charge."""
+
+    def process_payment(self, patron_id, amount):
+        self._simulate()
+        return {"success": True, "transaction_id": f"TX{self.calls}", "message": "OK"}
+
+@pytest.fixture
+def fee_db(library_db, monkeypatch):
+    """Fresh migrated database with fees patched to $5.00."""
+    monkeypatch.setattr("services.library_service.get_book_by_id", lambda book_id: {"id": book_id})
+    monkeypatch.setattr("services.library_service.calculate_late_fee_for_book",
+                        lambda patron_id, book_id: {"fee_amount": 5.0, "days_overdue": 10, "status": "OK"})
+
+def test_replay_returns_stored_result(fee_db):
+    gateway = CountingGateway()
+    first = pay_late_fees_idempotent("key-1", "123456", 1, gateway)
+    second = pay_late_fees_idempotent("key-1", "123456", 1, gateway)
+    assert gateway.calls == 1
+    assert second["transaction_id"] == first["transaction_id"]
+    assert second["idempotent_replay"] is True
+    # A different key is a new charge
+    assert pay_late_fees_idempotent("key-2", "123456", 1, gateway)["transaction_id"] == "TX2"
+
+def test_replay_survives_hot_cache_eviction(fee_db):
+    gateway = CountingGateway()
+    first = pay_late_fees_idempotent("key-1", "123456", 1, gateway)
+    idempotency_service._hot_results.clear()
+    assert pay_late_fees_idempotent("key-1", "123456", 1, gateway)["transaction_id"] == first["transaction_id"]
+    assert gateway.calls == 1
+
+def test_concurrent_duplicates_wait_for_original(fee_db):
+    gateway = CountingGateway(latency=0.2)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(
+        pay_late_fees_idempotent("key-1", "123456", 1, gateway))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(results) == 8
+    assert gateway.calls == 1
+    assert {r["transaction_id"] for r in results} == {"TX1"}
+    assert sum(1 for r in results if not r.get("idempotent_replay")) == 1
+
+def test_key_reuse_with_other_params_is_rejected(fee_db):
+    gateway = CountingGateway()
+    pay_late_fees_idempotent("key-1", "123456", 1, gateway)
+    result = pay_late_fees_idempotent("key-1", "123456", 2, gateway)
+    assert result["success"] is False
+    assert "different request" in result["status"]
+    assert gateway.calls == 1
+
+def test_unknown_outcomes_are_stored(fee_db):
+    stub = CountingGateway(latency=0.2)
+    gateway = ResilientPaymentGateway(stub, timeout=0.05)
+    first = pay_late_fees_idempotent("key-1", "123456", 1, gateway)
+    assert "did not answer" in first["status"]
+    # The charge may have gone through, so a retry replays instead of charging again
+    stub.latency = 0.0
+    second = pay_late_fees_idempotent("key-1", "123456", 1, gateway)
+    assert second["status"] == first["status"] and second["idempotent_replay"] is True
+    time.sleep(0.25)
+    assert stub.calls == 1
+
+def test_calls_that_never_reached_the_gateway_are_released(fee_db):
+    breaker = CircuitBreaker(min_calls=1, window=1, reset_timeout=3600)
+    breaker.record(False)
+    stub = CountingGateway()
+    gateway = ResilientPaymentGateway(stub, breaker=breaker)
+    result = pay_late_fees_idempotent("key-1", "123456", 1, gateway)
+    assert "circuit open" in result["status"] and result["retryable"] is True
+    gateway.breaker = CircuitBreaker()
+    assert pay_late_fees_idempotent("key-1", "123456", 1, gateway)["transaction_id"] == "TX1"
+    assert stub.calls == 1
+
+def test_refund_replay(fee_db):
+    gateway = CountingGateway()
+    refund_late_fee_payment_idempotent("refund-1", "TX1", 5.0, gateway)
+    refund_late_fee_payment_idempotent("refund-1", "TX1", 5.0, gateway)
+    assert gateway.calls == 1
@@ -0,0 +1,76 @@
+import logging
+import pytest
+from flask import Flask
+import database
+import instrumentation
+import metrics
+from metrics import Counter, LabeledHistogram, Registry
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    counter = registry.register(Counter('demo_total', 'Demo counter.', ('kind',)))
+    histogram = registry.register(LabeledHistogram('demo_seconds', 'Demo latency.', ('route',),
+                                                   buckets=(0.1, 1.0)))
+    counter.inc('a', amount=2)
+    histogram.observe(0.05, '/x')
+    histogram.observe(0.5, '/x')
+    text = registry.render()
+    assert '# TYPE demo_total counter' in text
+    assert 'demo_total{kind="a"} 2' in text
+    assert 'demo_seconds_bucket{route="/x",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{route="/x",le="+Inf"} 2' in text
+    assert 'demo_seconds_count{route="/x"} 2' in text
+
+def test_statement_kind():
+    assert instrumentation.statement_kind('SELECT * FROM books WHERE id = ?') == 'select books'
+    assert instrumentation.statement_kind('\n  UPDATE borrow_records SET x = 1') == 'update borrow_records'
+    assert instrumentation.statement_kind('BEGIN IMMEDIATE') == 'begin'
+
+@pytest.fixture
+def metrics_app(library_db):
+    """Bare Flask app with instrumentation and a pooled database."""
+    app = Flask(__name__)
+    app.config['SLOW_QUERY_MS'] = 0
+    database.init_app(app)
+    instrumentation.init_app(app)
+
+    @app.route('/three')
+    def three_queries():
+        for _ in range(3):
+            database.get_patron_borrow_count('123456')
+        return 'ok'
+
+    yield app
+    instrumentation.init_app(Flask(__name__))  # restore default thresholds
+
+def test_request_records_queries_and_slow_log(metrics_app, caplog):
+    before = instrumentation.REQUEST_QUERIES.labels('three_queries').snapshot()
+    with caplog.at_level(logging.WARNING, logger='app.sql'):
+        assert metrics_app.test_client().get('/three').status_code == 200
+    after = instrumentation.REQUEST_QUERIES.labels('three_queries').snapshot()
+    assert after['count'] == before['count'] + 1
+    assert after['sum'] == before['sum'] + 3
+    assert instrumentation.REQUEST_DURATION.labels('three_queries', 'GET', '200').snapshot()['count'] >= 1
+    assert any('Slow query' in r.getMessage() and 'borrow_records' in r.getMessage() for r in caplog.records)
+
+def test_slow_queries_outside_requests_are_not_logged(metrics_app, caplog):
+    # CLI imports and migrations run outside any request
+    with caplog.at_level(logging.WARNING, logger='app.sql'):
+        database.get_patron_borrow_count('123456')
+    assert not any('Slow query' in r.getMessage() for r in caplog.records)
+
+def test_process_labels_mark_every_sample():
+    registry = Registry()
+    counter = registry.register(Counter('demo_total', 'Demo counter.'))
+    histogram = registry.register(LabeledHistogram('demo_seconds', 'Demo latency.', ('route',),
+                                                   buckets=(1.0,)))
+    counter.inc()
+    histogram.observe(0.5, '/x')
+    metrics.set_process_labels(worker="4242")
+    try:
+        text = registry.render()
+    finally:
+        metrics.set_process_labels()
+    assert 'demo_total{worker="4242"} 1' in text
+    assert 'demo_seconds_bucket{worker="4242",route="/x",le="1.0"} 1' in text
+    assert 'demo_total 1' in registry.render()
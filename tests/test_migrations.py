@@ -0,0 +1,77 @@
+import sqlite3
+import migrations
+
+def test_migrations_bring_new_database_to_latest_version(tmp_path):
+    """A fresh database gets every migration applied in order."""
+    conn = sqlite3.connect(str(tmp_path / "fresh.db"))
+    applied = migrations.apply_migrations(conn)
+    assert applied == [version for version, _, _ in migrations.MIGRATIONS]
+    assert migrations.get_schema_version(conn) == migrations.LATEST_VERSION
+    conn.close()
+
+def test_migrations_are_not_reapplied(tmp_path):
+    """Running migrations again on an up-to-date database is a no-op."""
+    conn = sqlite3.connect(str(tmp_path / "again.db"))
+    migrations.apply_migrations(conn)
+    assert migrations.apply_migrations(conn) == []
+    conn.close()
+
+def test_migrations_upgrade_unversioned_database(tmp_path):
+    """A database created before versioning (user_version 0) is upgraded in place."""
+    conn = sqlite3.connect(str(tmp_path / "legacy.db"))
+    migrations._create_base_tables(conn)
+    conn.execute("INSERT INTO books (title, author, isbn, total_copies, available_copies) "
+                 "VALUES ('Old Book', 'Old Author', '9781111111111', 1, 1)")
+    conn.commit()
+    migrations.apply_migrations(conn)
+    assert migrations.get_schema_version(conn) == migrations.LATEST_VERSION
+    assert conn.execute("SELECT COUNT(*) FROM books").fetchone()[0] == 1
+    conn.close()
+
+def test_hot_borrow_record_queries_use_indexes(tmp_path):
+    """EXPLAIN QUERY PLAN shows each hot statement searching its expected index."""
+    conn = sqlite3.connect(str(tmp_path / "plans.db"))
+    migrations.apply_migrations(conn)
+    report = migrations.check_query_plans(conn)
+    for name, result in report.items():
+        assert result["uses_index"], f"{name} should use {result['index']}: {result['plan']}"
+    # Oldest active loan straight from the index, no sort
+    assert not any("TEMP B-TREE" in step for step in report["return_loan"]["plan"])
+    conn.close()
+
+def test_hot_queries_keep_their_indexes_on_small_analyzed_database(tmp_path):
+    """Statistics gathered on a one-loan table (like the shipped library.db) do not turn plans into scans."""
+    conn = sqlite3.connect(str(tmp_path / "small.db"))
+    migrations.apply_migrations(conn)
+    assert conn.execute("SELECT name FROM sqlite_schema WHERE name = 'sqlite_stat1'").fetchone() is None
+    conn.execute("INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date) "
+                 "VALUES ('123456', 1, '2026-01-01T00:00:00', '2026-01-15T00:00:00')")
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+    conn = sqlite3.connect(str(tmp_path / "small.db"))
+    for name, result in migrations.check_query_plans(conn).items():
+        assert result["uses_index"], f"{name} should use {result['index']}: {result['plan']}"
+    conn.close()
+
+def test_epoch_columns_follow_iso_dates(tmp_path):
+    """borrow_ts/due_ts/return_ts track the ISO text columns on insert and update."""
+    conn = sqlite3.connect(str(tmp_path / "epoch.db"))
+    migrations.apply_migrations(conn)
+    conn.execute("INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date) "
+                 "VALUES ('123456', 1, '2026-01-01T00:00:00', '2026-01-15T12:30:00.250000')")
+    row = conn.execute("SELECT borrow_ts, due_ts, return_ts FROM borrow_records").fetchone()
+    assert row == (1767225600, 1767225600 + 14 * 86400 + 45000, None)
+    conn.execute("UPDATE borrow_records SET return_date = '2026-01-10 08:00:00'")
+    assert conn.execute("SELECT return_ts FROM borrow_records").fetchone()[0] == 1767225600 + 9 * 86400 + 28800
+    conn.close()
+
+def test_up_to_date_database_costs_one_statement(tmp_path):
+    """Starting on a current schema only reads PRAGMA user_version."""
+    conn = sqlite3.connect(str(tmp_path / "current.db"))
+    migrations.apply_migrations(conn)
+    statements = []
+    conn.set_trace_callback(statements.append)
+    assert migrations.apply_migrations(conn) == []
+    assert statements == ["PRAGMA user_version"]
+    conn.close()
@@ -0,0 +1,38 @@
+import pytest
+import database
+import services.library_service as library_service
+from services.library_service import borrow_book_by_patron, return_book_by_patron, get_patron_status_report
+
+@pytest.fixture
+def history_db(library_db):
+    """Fresh database where patron 777888 has borrowed five books and returned two."""
+    for i in range(5):
+        database.insert_book(f"History Book {i}", "H. Author", f"978300000000{i}", 1, 1)
+        book_id = database.get_book_by_isbn(f"978300000000{i}")["id"]
+        borrow_book_by_patron("777888", book_id)
+        if i < 2:
+            return_book_by_patron("777888", book_id)
+
+def test_report_does_not_requery_per_loan(history_db, mocker):
+    """Fees come from the loaded due dates, not one lookup per active loan."""
+    per_loan = mocker.patch("services.library_service.calculate_late_fee_for_book")
+    report = get_patron_status_report("777888")
+    assert report["borrow_count"] == 3
+    assert per_loan.call_count == 0
+
+def test_history_pages_cover_all_records(history_db):
+    first = get_patron_status_report("777888", history_limit=2)
+    assert len(first["history"]) == 2
+    assert first["history_next_cursor"]
+    seen = [h["title"] for h in first["history"]]
+    cursor = first["history_next_cursor"]
+    while cursor:
+        page = get_patron_status_report("777888", history_limit=2, history_cursor=cursor)
+        seen.extend(h["title"] for h in page["history"])
+        cursor = page["history_next_cursor"]
+    assert len(seen) == 5
+    assert len(set(seen)) == 5
+
+def test_invalid_history_cursor(history_db):
+    report = get_patron_status_report("777888", history_cursor="garbage")
+    assert report["status"] == "Invalid history cursor"
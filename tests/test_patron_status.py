@@ -2,6 +2,7 @@ from services.library_service import get_patron_status_report
 import services.library_service as library_service
 import database
 from unittest.mock import Mock
+from datetime import datetime, timedelta
 
 def test_patron_status_returns_dict():
     """Test function returns a dict regardless of patron_id."""
@@ -33,7 +34,7 @@ def test_patron_status_with_negative_patron_id():
 def test_get_patron_status_with_stubbed_loans_and_history(mocker):
     """Valid patron with stubbed active loan and history (no real DB access)."""
     patron_id = "555666"  # valid 6-digit ID
-    # pretend this patron has one active loan
+    # pretend this patron has one active loan, due 3 days ago
     mocker.patch(
         "services.library_service.get_patron_borrowed_books",
         return_value=[
@@ -41,19 +42,14 @@ def test_get_patron_status_with_stubbed_loans_and_history(mocker):
                 "book_id": 1,
                 "title": "Stubbed Book",
                 "author": "Stub Author",
-                # store due_date as a simple string so str(...).split works
-                "due_date": "2025-01-15",
+                "due_date": datetime.now() - timedelta(days=3),
             }
         ],
     )
-    # pretend the late fee is a known value
-    mocker.patch(
-        "services.library_service.calculate_late_fee_for_book",
-        return_value={"fee_amount": 1.50, "days_overdue": 3, "status": "OK"},
-    )
-    # fake DB connection and history rows
+    # fake history page
     history_rows = [
         {
+            "id": 1,
             "borrow_date": "2025-01-01",
             "due_date": "2025-01-15",
             "return_date": None,
@@ -62,12 +58,9 @@ def test_get_patron_status_with_stubbed_loans_and_history(mocker):
             "author": "Stub Author",
         }
     ]
-    conn_mock = Mock()
-    execute_result = Mock()
-    execute_result.fetchall.return_value = history_rows
-    conn_mock.execute.return_value = execute_result
-    conn_mock.close.return_value = None
-    mocker.patch("services.library_service.get_db_connection", return_value=conn_mock)
+    history_mock = mocker.patch(
+        "services.library_service.get_patron_borrow_history", return_value=history_rows
+    )
     # Act
     report = library_service.get_patron_status_report(patron_id)
     # Assert – we are now exercising the main branch of the function
@@ -90,4 +83,7 @@ def test_get_patron_status_with_stubbed_loans_and_history(mocker):
     assert hist["book_id"] == 1
     assert hist["title"] == "Stubbed Book"
     assert hist["author"] == "Stub Author"
-    assert hist["status"] == "borrowed"  # because return_date is None
\ No newline at end of file
+    assert hist["status"] == "borrowed"  # because return_date is None
+    # one history query for the whole page, no further pages
+    history_mock.assert_called_once()
+    assert report["history_next_cursor"] is None
\ No newline at end of file
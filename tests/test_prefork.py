@@ -0,0 +1,51 @@
+import os
+from datetime import datetime, timedelta
+import pytest
+import database
+from config import load_config
+from server import server_options
+
+@pytest.fixture
+def shared_db(library_db, monkeypatch):
+    """Database whose catalog state is shared with forked workers; module state restored afterwards."""
+    for name in ("_snapshot_generation", "_shared_lock", "_invalidations", "_invalidations_seen", "_book_cache"):
+        monkeypatch.setattr(database, name, getattr(database, name))
+    database.share_catalog_state()
+
+def _in_worker(work):
+    # Run work in a forked child, like a gunicorn worker; fails the test if work raises
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            work()
+            code = 0
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_workers_share_catalog_version_and_book_cache(shared_db):
+    database.insert_book("Shared", "P. Author", "9789200000001", 2, 2)
+    book_id = database.get_book_by_isbn("9789200000001")["id"]
+    assert database.get_book_by_id(book_id)["available_copies"] == 2
+    version = database.get_catalog_version()
+
+    def borrow():
+        now = datetime.now()
+        assert database.borrow_book_atomic("123456", book_id, now, now + timedelta(days=14), 5)[0] == "ok"
+    _in_worker(borrow)
+
+    # The parent's ETag and cached row follow the other process's write
+    assert database.get_catalog_version() != version
+    assert database.get_book_by_id(book_id)["available_copies"] == 1
+
+def test_server_options():
+    options = server_options(load_config("production", {"THREADS": 8}, environ={}), "127.0.0.1:8000")
+    assert options["workers"] == (os.cpu_count() or 1)
+    assert options["threads"] == 8 and options["preload_app"] is True
+    settings = load_config(environ={"LIBRARY_SERVER": "GUNICORN", "LIBRARY_WORKERS": "3"})
+    assert settings["SERVER"] == "gunicorn" and server_options(settings, ":0")["workers"] == 3
+    with pytest.raises(ValueError):
+        load_config(environ={"LIBRARY_SERVER": "uwsgi"})
@@ -0,0 +1,61 @@
+import sqlite3
+from datetime import datetime, timedelta
+import pytest
+import database
+from config import load_config, DEFAULTS
+
+def _configure(tmp_path, **overrides):
+    database.configure(load_config('test', {'DATABASE': str(tmp_path / "replica.db"), **overrides}, environ={}))
+    database.init_database()
+
+@pytest.fixture
+def replica_db(tmp_path):
+    """Database read through the live read-only pool; defaults restored afterwards."""
+    _configure(tmp_path)
+    yield str(tmp_path / "replica.db")
+    database.configure(dict(DEFAULTS))
+
+@pytest.fixture
+def snapshot_db(tmp_path):
+    """Database whose catalog reads come from a backup-API snapshot."""
+    _configure(tmp_path, SNAPSHOT_INTERVAL=3600.0)
+    yield str(tmp_path / "replica.db")
+    database.configure(dict(DEFAULTS))
+
+def test_read_connections_reject_writes(replica_db):
+    with database.read_session() as conn:
+        assert conn.execute("PRAGMA query_only").fetchone()[0] == 1
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("DELETE FROM books")
+    assert database.get_read_pool_stats()['read_only'] is True
+
+def test_catalog_reads_use_read_pool_and_see_commits(replica_db):
+    database.insert_book("Replica Book", "R. Author", "9789100000001", 2, 2)
+    assert [b["title"] for b in database.get_all_books()] == ["Replica Book"]
+    assert database.search_books_fulltext("Replica", "title")[0]["isbn"] == "9789100000001"
+    stats = database.get_read_pool_stats()
+    assert stats['created'] >= 1 and stats['in_use'] == 0
+    # The write went through the primary pool only
+    assert database.get_pool_stats()['read_only'] is False
+
+def test_snapshot_refresh_publishes_new_data(snapshot_db):
+    database.insert_book("Before", "S. Author", "9789100000002", 1, 1)
+    database.refresh_snapshot()
+    database.insert_book("After", "S. Author", "9789100000003", 1, 1)
+    # Catalog reads lag until the next refresh
+    assert [b["title"] for b in database.get_all_books()] == ["Before"]
+    version = database.get_catalog_version()
+    database.refresh_snapshot()
+    assert sorted(b["title"] for b in database.get_all_books()) == ["After", "Before"]
+    assert database.get_catalog_version() != version
+
+def test_loan_reads_bypass_snapshot(snapshot_db):
+    database.insert_book("Loaned", "S. Author", "9789100000004", 1, 1)
+    database.refresh_snapshot()
+    book_id = database.get_book_by_isbn("9789100000004")["id"]
+    now = datetime.now()
+    outcome, _ = database.borrow_book_atomic("123456", book_id, now, now + timedelta(days=14), 5)
+    assert outcome == "ok"
+    # Loan counts and fee inputs come from the live database, not the snapshot
+    assert database.get_patron_borrow_count("123456") == 1
+    assert [loan["book_id"] for loan in database.get_patron_borrowed_books("123456")] == [book_id]
@@ -0,0 +1,81 @@
+import time
+import pytest
+from services.library_service import pay_late_fees
+from services.payment_service import (
+    StubPaymentGateway, ResilientPaymentGateway, CircuitBreaker,
+    CircuitOpenError, GatewayBusyError, GatewayTimeoutError
+)
+
+class FlakyGateway(StubPaymentGateway):
+    """Fails the first `failures` calls with ConnectionError, then succeeds."""
+
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def process_payment(self, patron_id, amount):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError("reset by peer")
+        return {"success": True, "transaction_id": "TX1", "message": "OK"}
+
+def test_transient_errors_are_retried():
+    gateway = ResilientPaymentGateway(FlakyGateway(failures=2), max_retries=2, backoff_base=0.001)
+    assert gateway.process_payment("123456", 5.0)["transaction_id"] == "TX1"
+    stats = gateway.stats()
+    assert (stats["attempts"], stats["retries"], stats["errors"]) == (3, 2, 2)
+    assert stats["latency_seconds"]["count"] == 3
+
+def test_slow_gateway_hits_deadline_without_retry():
+    gateway = ResilientPaymentGateway(StubPaymentGateway(latency=0.5), timeout=0.05)
+    started = time.perf_counter()
+    with pytest.raises(GatewayTimeoutError):
+        gateway.process_payment("123456", 5.0)
+    assert time.perf_counter() - started < 0.3
+    assert gateway.stats()["attempts"] == 1
+
+def test_hung_calls_make_later_calls_fail_fast():
+    stub = StubPaymentGateway(latency=0.5)
+    gateway = ResilientPaymentGateway(stub, timeout=0.05, max_concurrency=1)
+    with pytest.raises(GatewayTimeoutError):
+        gateway.process_payment("123456", 5.0)
+    # The hung call still holds the only slot: nothing is queued to charge later
+    for _ in range(2):
+        with pytest.raises(GatewayBusyError):
+            gateway.process_payment("123456", 5.0)
+    time.sleep(0.6)
+    assert stub.calls == 1
+    assert gateway.stats()["busy"] == 2
+    stub.latency = 0.0
+    assert gateway.process_payment("123456", 5.0)["success"] is True
+
+def test_breaker_opens_then_recovers():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=0.5, min_calls=4, window=4, reset_timeout=10,
+                             clock=lambda: now[0])
+    stub = StubPaymentGateway(error_rate=1.0)
+    gateway = ResilientPaymentGateway(stub, max_retries=0, breaker=breaker)
+    for _ in range(4):
+        with pytest.raises(ConnectionError):
+            gateway.process_payment("123456", 5.0)
+    assert breaker.state == CircuitBreaker.OPEN
+    # Open: fails fast without touching the gateway
+    with pytest.raises(CircuitOpenError):
+        gateway.process_payment("123456", 5.0)
+    assert stub.calls == 4
+    # After reset_timeout one trial call closes the breaker again
+    now[0] = 11
+    stub.error_rate = 0.0
+    assert gateway.process_payment("123456", 5.0)["success"] is True
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_pay_late_fees_reports_open_circuit(mocker):
+    mocker.patch("services.library_service.get_book_by_id", return_value={"id": 1})
+    mocker.patch("services.library_service.calculate_late_fee_for_book",
+                 return_value={"fee_amount": 5.0, "days_overdue": 10, "status": "OK"})
+    breaker = CircuitBreaker(min_calls=1, window=1)
+    breaker.record(False)
+    gateway = ResilientPaymentGateway(StubPaymentGateway(), breaker=breaker)
+    result = pay_late_fees("123456", 1, gateway)
+    assert result["success"] is False
+    assert "circuit open" in result["status"]
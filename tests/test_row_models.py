@@ -0,0 +1,42 @@
+import json
+from datetime import datetime
+import pytest
+from flask import Flask
+import database
+from models import Book, BorrowRecord, Loan, RecordJSONProvider
+from services.library_service import borrow_book_by_patron
+
+@pytest.fixture
+def models_db(library_db):
+    """Fresh database with two books, one of them borrowed by patron 123456."""
+    database.insert_book("Slotted Book", "S. Author", "9786000000001", 2, 2)
+    database.insert_book("Another Book", "A. Author", "9786000000002", 1, 1)
+    book_id = database.get_book_by_isbn("9786000000001")["id"]
+    assert borrow_book_by_patron("123456", book_id)[0]
+    return book_id
+
+def test_books_are_slotted_mappings(models_db):
+    books = database.get_all_books()
+    assert all(type(book) is Book for book in books)
+    book = books[1]
+    assert book["title"] == book.title == "Slotted Book"
+    assert dict(book) == {"id": models_db, "title": "Slotted Book", "author": "S. Author",
+                          "isbn": "9786000000001", "total_copies": 2, "available_copies": 1}
+    assert book == dict(book) and "isbn" in book and book.get("missing") is None
+    assert not hasattr(book, "__dict__")
+    with pytest.raises(KeyError):
+        book["shelf"] = "A1"
+
+def test_loans_and_history_records(models_db):
+    loans = database.get_patron_borrowed_books("123456")
+    assert [type(loan) for loan in loans] == [Loan]
+    assert isinstance(loans[0]["due_date"], datetime) and loans[0]["is_overdue"] is False
+    history = database.get_patron_borrow_history("123456")
+    assert type(history[0]) is BorrowRecord and history[0]["return_date"] is None
+
+def test_json_provider_serializes_records(models_db):
+    app = Flask(__name__)
+    app.json = RecordJSONProvider(app)
+    book = database.get_book_by_id(models_db)
+    with app.app_context():
+        assert json.loads(app.json.dumps({"books": [book]})) == {"books": [dict(book)]}
@@ -0,0 +1,48 @@
+import pytest
+import database
+import migrations
+from services.library_service import search_books_in_catalog
+
+@pytest.fixture
+def catalog_db(library_db):
+    """Fresh migrated database with a few books."""
+    database.insert_book("The Great Gatsby", "F. Scott Fitzgerald", "9780743273565", 3, 3)
+    database.insert_book("Great Expectations", "Charles Dickens", "9780141439563", 1, 1)
+    database.insert_book("A Tale of Two Cities", "Charles Dickens", "9780141439600", 2, 2)
+
+def test_fts_search_matches_substring_semantics(catalog_db):
+    """Full-text mode returns the same books as the legacy substring scan."""
+    assert database.fts_available()
+    for term, field in [("great", "title"), ("ATSB", "title"), ("dickens", "author"), ("ale of t", "title")]:
+        fts = {b["id"] for b in search_books_in_catalog(term, field)}
+        scan = {b["id"] for b in search_books_in_catalog(term, field, mode="substring")}
+        assert fts == scan
+
+def test_prefix_search_only_matches_start_of_field(catalog_db):
+    """Prefix mode matches titles that begin with the term."""
+    results = search_books_in_catalog("great", "title", mode="prefix")
+    assert [b["title"] for b in results] == ["Great Expectations"]
+
+def test_short_terms_fall_back_to_scan(catalog_db):
+    """Terms shorter than a trigram are still answered by the substring fallback."""
+    results = search_books_in_catalog("ta", "title")
+    assert {b["title"] for b in results} == {"Great Expectations", "A Tale of Two Cities"}
+
+def test_index_follows_inserted_books(catalog_db):
+    """Triggers keep the full-text index in sync with new books."""
+    database.insert_book("Gatsby Revisited", "New Author", "9780000000001", 1, 1)
+    results = search_books_in_catalog("gatsby", "title")
+    assert {b["title"] for b in results} == {"The Great Gatsby", "Gatsby Revisited"}
+
+def test_invalid_mode_returns_empty_list(catalog_db):
+    assert search_books_in_catalog("great", "title", mode="fuzzy") == []
+
+def test_prefix_search_uses_trigram_index(catalog_db):
+    """Plain prefix terms are answered by the trigram index; wildcard characters are escaped."""
+    sql, params = database._fulltext_query("great", "title", prefix=True)
+    with database.read_session() as conn:
+        plan = migrations.explain_query_plan(conn, sql, params)
+    assert any(step.startswith("SCAN f VIRTUAL TABLE INDEX 0:L") for step in plan), plan
+    database.insert_book("100% Great", "A. Author", "9780000000017", 1, 1)
+    assert [b["title"] for b in search_books_in_catalog("100%", "title", mode="prefix")] == ["100% Great"]
+    assert search_books_in_catalog("10_", "title", mode="prefix") == []
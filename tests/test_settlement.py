@@ -0,0 +1,114 @@
+import threading
+import time
+import pytest
+import database
+from datetime import date
+from services.idempotency_service import settle_late_fees_idempotent
+from services.settlement_service import settle_late_fees
+
+class SlowGateway:
+    """Gateway stub with a fixed latency that tracks how many calls overlap."""
+
+    def __init__(self, latency=0.05, decline=(), hang=()):
+        self.latency = latency
+        self.decline = set(decline)
+        self.hang = set(hang)
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def process_payment(self, patron_id, amount):
+        with self._lock:
+            self.calls.append((patron_id, amount))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(1.0 if patron_id in self.hang else self.latency)
+        with self._lock:
+            self.in_flight -= 1
+        if patron_id in self.decline:
+            return {"success": False, "transaction_id": None, "message": "Declined"}
+        return {"success": True, "transaction_id": f"TX-{patron_id}", "message": "OK"}
+
+@pytest.fixture
+def overdue_db(library_db):
+    """Twelve patrons, each with two loans due 2025-10-01 (fees as of 2025-10-11)."""
+    conn = database.get_db_connection()
+    conn.executemany(
+        "INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date) VALUES (?, 1, ?, ?)",
+        [(f"{100000 + p}", "2025-09-17T10:00:00", "2025-10-01T10:00:00") for p in range(12) for _ in range(2)])
+    conn.commit()
+    conn.close()
+    return date(2025, 10, 11)
+
+def test_settlement_groups_per_patron_and_runs_concurrently(overdue_db):
+    gateway = SlowGateway(latency=0.1)
+    started = time.perf_counter()
+    result = settle_late_fees(gateway, today=overdue_db, max_workers=4)
+    elapsed = time.perf_counter() - started
+    # Ten days overdue is $6.50 per loan, two loans per patron
+    assert sorted(gateway.calls) == [(f"{100000 + p}", 13.0) for p in range(12)]
+    assert result["settled"] == 12
+    assert result["amount_charged"] == 156.0
+    assert gateway.max_in_flight <= 4
+    # Three rounds of 0.1s instead of twelve
+    assert elapsed < 0.8
+
+def test_settlement_reports_declines_and_timeouts(overdue_db):
+    gateway = SlowGateway(decline={"100001"}, hang={"100002"})
+    started = time.perf_counter()
+    result = settle_late_fees(gateway, ["100000", "100001", "100002"], today=overdue_db,
+                              call_timeout=0.2)
+    # Returns at the timeout instead of waiting out the hung call
+    assert time.perf_counter() - started < 0.8
+    by_patron = {item["patron_id"]: item for item in result["results"]}
+    assert by_patron["100000"]["transaction_id"] == "TX-100000"
+    assert by_patron["100001"]["status"] == "Declined"
+    assert "timed out" in by_patron["100002"]["status"]
+    assert (result["settled"], result["failed"], result["timed_out"]) == (1, 1, 1)
+    assert result["amount_unsettled"] == 26.0
+    # Held for reconciliation: a rerun does not charge the timed-out patron again
+    assert database.get_fee_settlements("100002")[0]["status"] == "unknown"
+    rerun = settle_late_fees(SlowGateway(latency=0), ["100000", "100001", "100002"], today=overdue_db)
+    assert [item["patron_id"] for item in rerun["results"]] == ["100001"]
+
+def test_settlement_drops_calls_queued_behind_stuck_workers(overdue_db):
+    gateway = SlowGateway(hang={"100000"})
+    result = settle_late_fees(gateway, ["100000", "100001"], today=overdue_db,
+                              max_workers=1, call_timeout=0.1)
+    assert (result["settled"], result["failed"], result["timed_out"]) == (0, 1, 1)
+    assert gateway.calls == [("100000", 13.0)]
+    # Never sent, so the next run charges it
+    rerun = settle_late_fees(SlowGateway(latency=0), ["100000", "100001"], today=overdue_db)
+    assert [item["patron_id"] for item in rerun["results"]] == ["100001"]
+
+def test_settlement_charges_each_fee_once(overdue_db):
+    gateway = SlowGateway(latency=0, decline={"100001"})
+    first = settle_late_fees(gateway, ["100000", "100001", "100002"], today=overdue_db)
+    assert first["settled"] == 2
+    # A retry only retries the declined charge
+    retry = settle_late_fees(gateway, ["100000", "100001", "100002"], today=overdue_db)
+    assert [(item["patron_id"], item["amount"]) for item in retry["results"]] == [("100001", 13.0)]
+    # Later runs only charge what accrued since: fourteen days is $10.50 per loan, $4.00 more
+    later = settle_late_fees(SlowGateway(latency=0), ["100000"], today=date(2025, 10, 15))
+    assert [(item["patron_id"], item["amount"]) for item in later["results"]] == [("100000", 8.0)]
+    history = database.get_fee_settlements("100001")
+    assert [(row["status"], row["amount"]) for row in history] == [("failed", 13.0), ("failed", 13.0)]
+
+def test_settlement_holds_unknown_outcomes(overdue_db):
+    class BrokenGateway:
+        def process_payment(self, patron_id, amount):
+            raise ConnectionError("connection reset mid-response")
+    result = settle_late_fees(BrokenGateway(), ["100000"], today=overdue_db)
+    assert result["failed"] == 1
+    assert database.get_fee_settlements("100000")[0]["status"] == "unknown"
+    # The charge may have gone through, so it is not attempted again
+    assert settle_late_fees(SlowGateway(latency=0), ["100000"], today=overdue_db)["patron_count"] == 0
+
+def test_settlement_replays_by_idempotency_key(overdue_db):
+    gateway = SlowGateway(latency=0)
+    first = settle_late_fees_idempotent("batch-1", gateway, ["100001", "100000"])
+    second = settle_late_fees_idempotent("batch-1", gateway, ["100000", "100001"])
+    assert len(gateway.calls) == 2
+    assert second["idempotent_replay"] is True
+    assert second["results"] == first["results"]